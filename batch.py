@@ -0,0 +1,278 @@
+"""Headless batch rendering and sampling of many functions.
+
+Each non-empty line of the jobs file holds one function, optionally followed
+by its own range and step size, separated by commas:
+
+    5*x^3 + 2*x
+    sqrt(x)*x^5, 0, 10
+    log10(x), 0.1, 100, 0.01
+
+Lines starting with '#' are ignored, lines whose range or step is not a
+number are reported as invalid jobs. Example:
+
+    python batch.py jobs.txt --out-dir plots --format png csv --workers 8
+
+csv, npy and raw outputs hold every finite sample of the grid, written as
+they are evaluated, with the sampling metadata in a .json file next to them.
+
+Functions sampled on very large grids are better evaluated one at a time,
+each across several processes:
+
+    python batch.py huge.txt --format csv --parallel 32
+"""
+import argparse
+import json
+import logging
+import os
+import sys
+import time
+from collections import namedtuple
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from export import EXPORT_FORMATS, export_samples
+from expression_cache import ExpressionCache
+from interval import insert_breaks
+from parallel import ParallelEvaluator
+from pipeline import Cancelled, DEFAULT_MEMORY_BUDGET, sample_for_display
+from plot_style import style_axes
+
+FORMATS = ("png", "svg") + EXPORT_FORMATS
+HARD_TIMEOUT_GRACE = 5.0  # Seconds past the timeout before the worker of a job is killed, the job's own check goes first
+
+# One function of the jobs file, error is why the line could not be read, None when it could
+Job = namedtuple("Job", ["line", "func", "min_x", "max_x", "step_size", "error"], defaults=(None,))
+# Settings shared by all jobs of a run, parallel is the number of processes evaluating one function
+BatchOptions = namedtuple("BatchOptions", ["out_dir", "formats", "adaptive", "timeout", "theme",
+                                           "width", "height", "dpi", "memory_budget", "parallel"], defaults=(None,))
+
+_expression_cache = None  # Per worker process cache of validated and compiled expressions
+_parallel = None  # ParallelEvaluator of the process running the jobs, when options.parallel is set
+
+
+def parse_jobs(lines, min_x=-10.0, max_x=10.0, step_size=None):
+    """Parse the lines of a jobs file into Job tuples, using the given defaults for missing fields."""
+    jobs = []
+    for number, text in enumerate(lines, start=1):
+        text = text.strip()
+        if not text or text.startswith("#"):
+            continue
+        fields = [field.strip() for field in text.split(",")]
+        try:
+            job_min_x = float(fields[1]) if len(fields) > 1 else min_x
+            job_max_x = float(fields[2]) if len(fields) > 2 else max_x
+            job_step = float(fields[3]) if len(fields) > 3 else step_size
+        except ValueError as e:
+            jobs.append(Job(number, fields[0], min_x, max_x, step_size, f"Invalid range or step: {e}"))
+            continue
+        jobs.append(Job(number, fields[0], job_min_x, job_max_x, job_step))
+    return jobs
+
+
+def run_job(job, options):
+    """Validate, sample and render one function. Returns a summary dict of the outcome."""
+    global _expression_cache, _parallel
+    if _expression_cache is None:
+        _expression_cache = ExpressionCache()
+    if options.parallel and _parallel is None:
+        _parallel = ParallelEvaluator(options.parallel)
+
+    started = time.monotonic()
+    deadline = started + options.timeout if options.timeout else None
+    summary = {"line": job.line, "function": job.func, "status": "ok", "message": "", "outputs": []}
+    if job.error is not None:
+        summary.update(status="invalid", message=job.error, seconds=0.0)
+        return summary
+    try:
+        expression = _expression_cache.lookup(job.func)
+        if not expression.valid:
+            summary.update(status="invalid", message=expression.message)
+            return summary
+        if job.min_x >= job.max_x:
+            summary.update(status="invalid", message="min_x should be less than max_x")
+            return summary
+        step_size = job.step_size if job.step_size is not None else (job.max_x - job.min_x) / 400
+        if step_size <= 0:
+            summary.update(status="invalid", message="step size should be positive")
+            return summary
+
+        def cancelled():
+            return deadline is not None and time.monotonic() > deadline
+
+        base = _output_base(job, options)
+        for ext in (ext for ext in options.formats if ext in EXPORT_FORMATS):
+            metadata = export_samples(expression.compiled, f"{base}.{ext}", job.min_x, job.max_x, step_size,
+                                      memory_budget=options.memory_budget, cancelled=cancelled, parallel=_parallel,
+                                      expression=job.func)
+            summary["removed_points"] = metadata["removed_points"]
+            summary["outputs"].append(f"{base}.{ext}")
+
+        images = [ext for ext in options.formats if ext not in EXPORT_FORMATS]
+        if images:
+            result = sample_for_display(expression.compiled, job.min_x, job.max_x, step_size, options.adaptive,
+                                        n_columns=options.width * options.dpi, memory_budget=options.memory_budget,
+                                        cancelled=cancelled, parallel=_parallel)
+            summary["removed_points"] = int(result.removed_points)
+            if len(result.x) == 0:
+                summary.update(status="empty", message="No valid points to plot.")
+                return summary
+            figure = render(*insert_breaks(result.x, result.y, result.breaks), expression.compiled.text, options,
+                            y_limits=(result.min_y, result.max_y))
+            for ext in images:
+                figure.savefig(f"{base}.{ext}", facecolor=figure.get_facecolor())
+                summary["outputs"].append(f"{base}.{ext}")
+    except Cancelled:
+        summary.update(status="timeout", message=f"Timed out after {options.timeout} s")
+    except Exception as e:
+        summary.update(status="error", message=f"{type(e).__name__}: {e}")
+    finally:
+        summary["seconds"] = round(time.monotonic() - started, 4)
+    return summary
+
+
+def _output_base(job, options):
+    """Path of the outputs of a job, without extension."""
+    return os.path.join(options.out_dir, f"function_{job.line:05d}")
+
+
+def render(x, y, title, options, y_limits=None):
+    """Draw samples on a new Agg-backed figure styled like the GUI.
+
+    y_limits, the (min_y, max_y) of a SampleResult, bounds the y axis where the
+    samples run off towards a pole, matplotlib autoscales when it is not given.
+    """
+    figure = Figure(figsize=(options.width, options.height), dpi=options.dpi)
+    FigureCanvasAgg(figure)
+    ax = figure.add_subplot(111)
+    ax.plot(x, y)
+    if y_limits is not None and y_limits[0] < y_limits[1]:
+        margin = (y_limits[1] - y_limits[0]) * ax.margins()[1]
+        ax.set_ylim(max(ax.get_ylim()[0], y_limits[0] - margin), min(ax.get_ylim()[1], y_limits[1] + margin))
+    ax.set_xlabel("x")
+    ax.set_ylabel("f(x)")
+    ax.set_title(f"Plot of {title}")
+    style_axes(ax, options.theme)
+    return figure
+
+
+def run_batch(jobs, options, workers=None):
+    """Run jobs across a process pool and return their summaries in input order.
+
+    Jobs check options.timeout between evaluation chunks. One still running
+    HARD_TIMEOUT_GRACE seconds later, stuck in a single long computation, has
+    the processes of the pool killed; the other jobs they were running start
+    again on a new pool.
+
+    With options.parallel, jobs run one after the other unless workers is
+    given, each function being evaluated across options.parallel processes.
+    Jobs run in this process, as then or with a single worker, only have the
+    timeout they check themselves.
+    """
+    global _parallel
+    os.makedirs(options.out_dir, exist_ok=True)
+    if workers == 1 or (workers is None and options.parallel):
+        try:
+            return [run_job(job, options) for job in jobs]
+        finally:
+            if _parallel is not None:
+                _parallel.shutdown()
+                _parallel = None
+
+    workers = workers or os.cpu_count() or 1
+    hard_timeout = options.timeout + HARD_TIMEOUT_GRACE if options.timeout else None
+    summaries, queued, running = [], list(jobs), {}  # running maps futures to their job and start time
+    pool = ProcessPoolExecutor(max_workers=workers)
+    try:
+        while queued or running:
+            # No more jobs than workers are submitted, so a job starts when it is submitted
+            while queued and len(running) < workers:
+                job = queued.pop(0)
+                running[pool.submit(run_job, job, options)] = (job, time.monotonic())
+            timeout = None
+            if hard_timeout is not None:
+                timeout = max(min(started for _, started in running.values()) + hard_timeout - time.monotonic(), 0)
+            done, _ = wait(running, timeout, return_when=FIRST_COMPLETED)
+            for future in done:
+                job, _ = running.pop(future)
+                try:
+                    summaries.append(future.result())
+                except Exception as e:  # The worker process itself died
+                    summaries.append({"line": job.line, "function": job.func, "status": "error",
+                                      "message": f"{type(e).__name__}: {e}", "outputs": []})
+            if done or hard_timeout is None:
+                continue
+            now = time.monotonic()
+            overdue = [future for future, (_, started) in running.items() if now - started >= hard_timeout]
+            if not overdue:
+                continue
+            for future in overdue:
+                job, started = running.pop(future)
+                logging.warning("Job on line %d did not stop, killing its worker", job.line)
+                summaries.append({"line": job.line, "function": job.func, "status": "timeout",
+                                  "message": f"Timed out after {options.timeout} s, its worker was killed",
+                                  "outputs": [], "seconds": round(now - started, 4)})
+                for ext in options.formats:  # Partly written by the killed worker
+                    path = f"{_output_base(job, options)}.{ext}"
+                    if os.path.exists(path):
+                        os.unlink(path)
+            # A task cannot be stopped on its own, the whole pool goes and the jobs it was running start over
+            queued = [job for job, _ in running.values()] + queued
+            running = {}
+            _kill(pool)
+            pool = ProcessPoolExecutor(max_workers=workers)
+    finally:
+        pool.shutdown(wait=False, cancel_futures=True)
+    return sorted(summaries, key=lambda summary: summary["line"])
+
+
+def _kill(pool):
+    """Kill the worker processes of a ProcessPoolExecutor and shut it down."""
+    for process in list((pool._processes or {}).values()):  # No public way to stop the workers
+        process.kill()
+    pool.shutdown(wait=True, cancel_futures=True)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Render and sample many functions without a display.")
+    parser.add_argument("jobs", help="file with one function per line, optionally followed by ', min_x, max_x[, step]'")
+    parser.add_argument("--out-dir", default="batch_output", help="directory receiving the outputs")
+    parser.add_argument("--format", nargs="+", choices=FORMATS, default=["png"], dest="formats")
+    parser.add_argument("--min-x", type=float, default=-10.0, help="default min value of x")
+    parser.add_argument("--max-x", type=float, default=10.0, help="default max value of x")
+    parser.add_argument("--step", type=float, default=None, help="default step size, (max_x - min_x) / 400 if omitted")
+    parser.add_argument("--adaptive", action="store_true", help="use adaptive sampling for images")
+    parser.add_argument("--workers", type=int, default=None, help="worker processes, defaults to the CPU count")
+    parser.add_argument("--parallel", type=int, default=None, metavar="N",
+                        help="evaluate each function across N processes, running the jobs one at a time")
+    parser.add_argument("--timeout", type=float, default=60.0, help="per job time limit in seconds, 0 for none")
+    parser.add_argument("--dark", action="store_true", help="render with the dark theme")
+    parser.add_argument("--size", type=float, nargs=2, default=(8.0, 6.0), metavar=("WIDTH", "HEIGHT"),
+                        help="image size in inches")
+    parser.add_argument("--dpi", type=int, default=100)
+    parser.add_argument("--memory-budget", type=int, default=DEFAULT_MEMORY_BUDGET,
+                        help="approximate peak memory per job in bytes")
+    parser.add_argument("--summary", help="write the per job summaries to this JSON file")
+    args = parser.parse_args(argv)
+
+    with open(args.jobs) as file:
+        jobs = parse_jobs(file, args.min_x, args.max_x, args.step)
+    options = BatchOptions(args.out_dir, tuple(args.formats), args.adaptive, args.timeout,
+                           "dark" if args.dark else "light", args.size[0], args.size[1], args.dpi,
+                           args.memory_budget, args.parallel)
+
+    started = time.monotonic()
+    summaries = run_batch(jobs, options, args.workers)
+    failures = [summary for summary in summaries if summary["status"] != "ok"]
+    if args.summary:
+        with open(args.summary, "w") as file:
+            json.dump(summaries, file, indent=2)
+
+    print(f"{len(summaries) - len(failures)}/{len(summaries)} functions rendered in {time.monotonic() - started:.2f} s")
+    for summary in failures:
+        print(f"  line {summary['line']}: {summary['function']!r} {summary['status']}: {summary['message']}")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.WARNING)
+    sys.exit(main())
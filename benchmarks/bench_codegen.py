@@ -0,0 +1,59 @@
+"""Compare the fused evaluation of expressions with plain vectorized NumPy.
+
+Reports the best wall time of a few runs and the peak memory traced while
+evaluating, for each expression and sample count:
+
+    python benchmarks/bench_codegen.py --samples 1e5 1e6 1e7
+"""
+import argparse
+import os
+import sys
+import time
+import tracemalloc
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from evaluator import CompiledFunction  # noqa: E402
+
+EXPRESSIONS = (
+    "5*x^3 + 2*x - sqrt(x)/log10(x)",
+    "3*x^7 - 2*x^5 + x^4 - 7*x^2 + x - 1",
+    "sqrt(x)*x^5 / (x^2 + 1)",
+    "x^2 - 4",
+)
+
+
+def measure(evaluate, x, repeat):
+    """Return the best time of repeat runs and the peak traced memory of one run, in bytes."""
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        evaluate(x)
+        best = min(best, time.perf_counter() - started)
+    tracemalloc.start()
+    evaluate(x)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return best, peak
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--samples", type=float, nargs="+", default=[1e5, 1e6, 1e7])
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args(argv)
+
+    print(f"{'expression':40} {'samples':>9} {'numpy ms':>9} {'fused ms':>9} {'speedup':>8} "
+          f"{'numpy MiB':>10} {'fused MiB':>10}")
+    for func in EXPRESSIONS:
+        compiled = CompiledFunction(func)
+        for n_samples in args.samples:
+            x = np.linspace(0.5, 10.0, int(n_samples))
+            naive_time, naive_peak = measure(compiled.evaluate_vectorized, x, args.repeat)
+            fused_time, fused_peak = measure(compiled.evaluate, x, args.repeat)
+            print(f"{func:40} {int(n_samples):9d} {naive_time * 1e3:9.2f} {fused_time * 1e3:9.2f} "
+                  f"{naive_time / fused_time:7.2f}x {naive_peak / 2 ** 20:10.1f} {fused_peak / 2 ** 20:10.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+"""Measure the cold start of the application against the budgets of thresholds.json.
+
+Each run starts a fresh interpreter that launches the window like main.py and
+reports, in seconds from the process start:
+
+    first_paint   the main window is painted for the first time
+    figure_ready  the matplotlib figure is built, after the first paint
+    first_plot    a function plotted as soon as the window was painted is drawn
+
+    python benchmarks/bench_startup.py --runs 5 --output startup.json
+
+Exits with status 1 when the median of a measure exceeds its budget.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+THRESHOLDS = os.path.join(ROOT, "benchmarks", "thresholds.json")
+MEASURES = ("first_paint", "figure_ready", "first_plot")
+
+# Runs in the child interpreter, argv[1] is the time.time() the parent started it at
+CHILD = """
+import json, sys, time
+started = float(sys.argv[1])
+from PySide2.QtCore import QEvent, QObject
+from PySide2.QtWidgets import QApplication
+from function_plotter import FunctionPlotter
+
+times = {}
+app = QApplication(sys.argv[:1])
+window = FunctionPlotter()
+
+def plotted(event):
+    if window.curves and "first_plot" not in times:
+        times["first_plot"] = time.time() - started
+        print(json.dumps(times), flush=True)
+        app.quit()
+
+class FirstPaint(QObject):
+    def eventFilter(self, watched, event):
+        if event.type() == QEvent.Paint and "first_paint" not in times:
+            times["first_paint"] = time.time() - started
+            window.function_input.setText("5*x^3 + 2*x")
+            window.min_input.setText("-10")
+            window.max_input.setText("10")
+            if window.figure is None:
+                window.figure_timer.timeout.connect(figure_ready)  # After ensure_figure, connected first
+            else:
+                figure_ready()
+        return False
+
+def figure_ready():
+    times["figure_ready"] = time.time() - started
+    window.canvas.mpl_connect("draw_event", plotted)
+    window.plot_button.click()
+
+first_paint = FirstPaint()
+window.installEventFilter(first_paint)
+app.exec_()
+"""
+
+
+def run_once(timeout):
+    env = dict(os.environ)
+    env.setdefault("QT_QPA_PLATFORM", "offscreen")
+    env["PYTHONPATH"] = os.pathsep.join(filter(None, [ROOT, env.get("PYTHONPATH")]))
+    started = time.time()
+    output = subprocess.run([sys.executable, "-c", CHILD, repr(started)], cwd=ROOT, env=env, timeout=timeout,
+                            capture_output=True, text=True, check=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Measure time to first paint and to first plot.")
+    parser.add_argument("--runs", type=int, default=5, help="fresh processes to start, the median is reported")
+    parser.add_argument("--timeout", type=float, default=60.0, help="seconds before a run is abandoned")
+    parser.add_argument("--thresholds", default=THRESHOLDS, help="file holding the startup budgets in seconds")
+    parser.add_argument("--output", help="write the runs and medians to this JSON file")
+    args = parser.parse_args(argv)
+
+    with open(args.thresholds) as file:
+        budgets = json.load(file)["startup"]
+    runs = [run_once(args.timeout) for _ in range(args.runs)]
+    medians = {measure: statistics.median(run[measure] for run in runs) for measure in MEASURES}
+
+    over_budget = []
+    for measure in MEASURES:
+        budget = budgets.get(measure)
+        over = budget is not None and medians[measure] > budget
+        if over:
+            over_budget.append(measure)
+        print(f"{measure:14} {medians[measure] * 1e3:9.1f} ms" +
+              (f"  (budget {budget * 1e3:.0f} ms{', OVER BUDGET' if over else ''})" if budget is not None else ""))
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump({"runs": runs, "median": medians, "budgets": budgets}, file, indent=2)
+    return 1 if over_budget else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
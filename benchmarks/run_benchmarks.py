@@ -0,0 +1,229 @@
+"""Headless benchmarks of the validation, evaluation, filtering and drawing hot paths.
+
+Each benchmark is named "<stage>/<expression>/<samples>" and reports the best
+time of one call over a few repeats. Results are written as JSON and can be
+compared with a baseline run, failing on slowdowns beyond the tolerances of
+thresholds.json:
+
+    python benchmarks/run_benchmarks.py --output baseline.json
+    python benchmarks/run_benchmarks.py --output current.json --compare baseline.json
+
+Stages are validate (Checker.validate_function), evaluate (the compiled
+expression), filter (dropping the non-finite samples), draw (decimating to the
+canvas width and drawing with Agg, as the GUI does), draw_raw (drawing every
+sample) and, with --gui, plot (the Plot button of an offscreen FunctionPlotter
+through to the drawn canvas).
+"""
+import argparse
+import fnmatch
+import json
+import logging
+import os
+import platform
+import sys
+import time
+
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+os.environ.setdefault("MPLBACKEND", "Agg")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import matplotlib  # noqa: E402
+import numpy as np  # noqa: E402
+from matplotlib.backends.backend_agg import FigureCanvasAgg  # noqa: E402
+from matplotlib.figure import Figure  # noqa: E402
+from checker import Checker  # noqa: E402
+from decimation import minmax_decimate  # noqa: E402
+from evaluator import CompiledFunction  # noqa: E402
+from pipeline import finite_samples  # noqa: E402
+
+# Expressions of increasing complexity, over a range where most of them are finite
+EXPRESSIONS = {
+    "simple": "x^2 - 4",
+    "medium": "5*x^3 + 2*x - sqrt(x)/log10(x)",
+    "complex": "sqrt(x)*x^5 / (x^2 + 1) - log10(x^2 + 1)*(3*x^7 - 2*x^5 + x^4) + sqrt(x + 1)^3/(x - 2)",
+    "long": " + ".join(f"{i % 9 + 1}*x^{i % 5}/(x + {i})" for i in range(40)),
+}
+SAMPLES = [10 ** exponent for exponent in range(2, 8)]
+MIN_X, MAX_X = -10.0, 10.0
+CANVAS_SIZE = (8.0, 6.0)  # Inches at 100 dpi, about the size of the GUI canvas
+RAW_DRAW_LIMIT = 10 ** 6  # Drawing every sample beyond this takes seconds and is never done by the GUI
+THRESHOLDS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "thresholds.json")
+
+
+def time_call(call, repeat=5, min_time=0.05):
+    """Return the best time of one call, looping calls until a run lasts at least min_time seconds."""
+    loops = 1
+    while True:
+        started = time.perf_counter()
+        for _ in range(loops):
+            call()
+        elapsed = time.perf_counter() - started
+        if elapsed >= min_time or loops >= 10 ** 6:
+            break
+        loops *= 10 if elapsed < min_time / 10 else 2
+    best = elapsed / loops
+    for _ in range(repeat - 1):
+        started = time.perf_counter()
+        for _ in range(loops):
+            call()
+        best = min(best, (time.perf_counter() - started) / loops)
+    return best, loops
+
+
+def new_canvas():
+    figure = Figure(figsize=CANVAS_SIZE, dpi=100)
+    canvas = FigureCanvasAgg(figure)
+    ax = figure.add_subplot(111)
+    line, = ax.plot([], [])
+    ax.set_xlim(MIN_X, MAX_X)
+    return canvas, ax, line
+
+
+def benchmark_cases(expressions, samples, gui):
+    """Yield (name, call) for every benchmark, building the inputs of each call up front."""
+    checker = Checker()
+    for label, func in expressions.items():
+        yield f"validate/{label}/0", lambda func=func: checker.validate_function(func)
+
+    for label, func in expressions.items():
+        compiled = CompiledFunction(func)
+        for n_samples in samples:
+            x = np.linspace(MIN_X, MAX_X, n_samples)
+            yield f"evaluate/{label}/{n_samples}", lambda compiled=compiled, x=x: compiled.evaluate(x)
+
+            y = compiled.evaluate(x)
+            yield f"filter/{label}/{n_samples}", lambda x=x, y=y: finite_samples(x, y)
+
+            result = finite_samples(x, y)
+            if len(result.x) == 0:
+                continue
+            canvas, ax, line = new_canvas()
+            ax.set_ylim(result.min_y, result.max_y)
+
+            def draw(x=result.x, y=result.y, canvas=canvas, ax=ax, line=line):
+                line.set_data(*minmax_decimate(x, y, ax.bbox.width))
+                canvas.draw()
+            yield f"draw/{label}/{n_samples}", draw
+
+            if n_samples <= RAW_DRAW_LIMIT:
+                def draw_raw(x=result.x, y=result.y, canvas=canvas, line=line):
+                    line.set_data(x, y)
+                    canvas.draw()
+                yield f"draw_raw/{label}/{n_samples}", draw_raw
+
+    if gui:
+        yield from gui_cases(expressions, samples)
+
+
+def gui_cases(expressions, samples):
+    """Yield plot benchmarks driving the Plot button of an offscreen FunctionPlotter."""
+    from PySide2.QtWidgets import QApplication
+    from function_plotter import FunctionPlotter
+
+    app = QApplication.instance() or QApplication([])
+    window = FunctionPlotter()
+    window.is_testing_bot = True  # Plots complete synchronously, errors do not open dialogs
+    window.auto_step_checkbox.setChecked(False)
+    window.min_input.setText(str(MIN_X))
+    window.max_input.setText(str(MAX_X))
+    for label, func in expressions.items():
+        window.function_input.setText(func)
+        for n_samples in samples:
+            window.step_input.setText(repr((MAX_X - MIN_X) / n_samples))
+
+            def plot():
+                window.plot_button.click()
+                window.canvas.draw()
+                app.processEvents()
+            yield f"plot/{label}/{n_samples}", plot
+    window.close()
+
+
+def run(expressions, samples, gui=False, pattern="*", repeat=5, min_time=0.05):
+    """Run the benchmarks whose name matches pattern and return their results by name."""
+    results = {}
+    for name, call in benchmark_cases(expressions, samples, gui):
+        if not fnmatch.fnmatch(name, pattern):
+            continue
+        seconds, loops = time_call(call, repeat, min_time)
+        results[name] = {"seconds": seconds, "loops": loops, "repeat": repeat}
+        print(f"{name:40} {seconds * 1e3:12.4f} ms", flush=True)
+    return results
+
+
+def metadata():
+    return {"time": time.strftime("%Y-%m-%dT%H:%M:%S"), "python": platform.python_version(),
+            "numpy": np.__version__, "matplotlib": matplotlib.__version__, "machine": platform.machine(),
+            "platform": platform.platform(), "processor": platform.processor(), "cpus": os.cpu_count()}
+
+
+def load_thresholds(path):
+    """Return the default tolerance and the (pattern, tolerance) pairs of a thresholds file."""
+    with open(path) as file:
+        thresholds = json.load(file)
+    return thresholds["default"], list(thresholds.get("tolerances", {}).items())
+
+
+def tolerance_for(name, default, tolerances):
+    """Allowed relative slowdown of a benchmark, from the first pattern matching its name."""
+    for pattern, tolerance in tolerances:
+        if fnmatch.fnmatch(name, pattern):
+            return tolerance
+    return default
+
+
+def compare(results, baseline, default, tolerances):
+    """Print how results moved from baseline and return the names of the regressed benchmarks."""
+    regressions = []
+    print(f"\n{'benchmark':40} {'baseline ms':>12} {'current ms':>12} {'change':>8}")
+    for name in sorted(set(results) & set(baseline)):
+        ratio = results[name]["seconds"] / baseline[name]["seconds"]
+        regressed = ratio > 1 + tolerance_for(name, default, tolerances)
+        if regressed:
+            regressions.append(name)
+        print(f"{name:40} {baseline[name]['seconds'] * 1e3:12.4f} {results[name]['seconds'] * 1e3:12.4f} "
+              f"{(ratio - 1) * 100:+7.1f}%{'  REGRESSION' if regressed else ''}")
+    missing = set(baseline) - set(results)
+    if missing:
+        print(f"{len(missing)} benchmark(s) of the baseline were not run")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Headless benchmarks of the Function Plotter hot paths.")
+    parser.add_argument("--output", help="write the results to this JSON file")
+    parser.add_argument("--results", help="compare the results of this JSON file instead of running")
+    parser.add_argument("--compare", metavar="BASELINE", help="JSON results of an earlier run to compare with")
+    parser.add_argument("--thresholds", default=THRESHOLDS, help="allowed relative slowdown per benchmark")
+    parser.add_argument("--filter", default="*", help="only run benchmarks matching this pattern, e.g. 'evaluate/*'")
+    parser.add_argument("--max-samples", type=float, default=1e7, help="largest sample count to run")
+    parser.add_argument("--repeat", type=int, default=5, help="timed runs per benchmark, the best is kept")
+    parser.add_argument("--min-time", type=float, default=0.05, help="minimal duration of one timed run in seconds")
+    parser.add_argument("--gui", action="store_true", help="also time plotting through an offscreen FunctionPlotter")
+    args = parser.parse_args(argv)
+
+    if args.results:
+        with open(args.results) as file:
+            report = json.load(file)
+    else:
+        samples = [n_samples for n_samples in SAMPLES if n_samples <= args.max_samples]
+        report = {"meta": metadata(), "results": run(EXPRESSIONS, samples, args.gui, args.filter,
+                                                     args.repeat, args.min_time)}
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump(report, file, indent=2)
+
+    if args.compare:
+        with open(args.compare) as file:
+            baseline = json.load(file)
+        default, tolerances = load_thresholds(args.thresholds)
+        regressions = compare(report["results"], baseline["results"], default, tolerances)
+        if regressions:
+            print(f"\n{len(regressions)} benchmark(s) regressed beyond their threshold")
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.ERROR)  # The plots of the benchmarks warn about removed points
+    sys.exit(main())
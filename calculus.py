@@ -0,0 +1,221 @@
+import math
+import numpy as np
+from expression_parser import BinaryOp, Call, Number, UnaryOp, Variable, as_float
+from evaluator import evaluate_shared
+from pipeline import SampleResult, finite_samples, split_at_singularities
+
+LN10 = math.log(10)  # Natural logarithms are written with log10, the only logarithm of the expressions
+
+
+def differentiate(node, variable="x"):
+    """Return the tree of the derivative of an expression with respect to variable.
+
+    Terms multiplied by zero and factors of one are left out and constant
+    operands are folded, so the derivative of 5*x^3 + 2*x is 15*x^2 + 2. The
+    derivative keeps the subexpressions of the function as they are, such as
+    sqrt(x) in that of sqrt(x)*x^5, so that evaluate_shared computes them once
+    for both.
+    """
+    if isinstance(node, Number):
+        return Number(0)
+    if isinstance(node, Variable):
+        return Number(1 if node.name == variable else 0)
+    if isinstance(node, UnaryOp):
+        derivative = differentiate(node.operand, variable)
+        return _negate(derivative) if node.op == "-" else derivative
+    if isinstance(node, Call):
+        inner = differentiate(node.argument, variable)
+        if node.name == "sqrt":
+            return _divide(inner, _multiply(Number(2), node))
+        return _divide(inner, _multiply(node.argument, Number(LN10)))
+
+    u, v = node.left, node.right
+    du, dv = differentiate(u, variable), differentiate(v, variable)
+    if node.op == "+":
+        return _add(du, dv)
+    if node.op == "-":
+        return _subtract(du, dv)
+    if node.op == "*":
+        return _add(_multiply(du, v), _multiply(u, dv))
+    if node.op == "/":
+        return _divide(_subtract(_multiply(du, v), _multiply(u, dv)), _power(v, Number(2)))
+    if not _depends(v, variable):  # u^n
+        return _multiply(_multiply(v, _power(u, _subtract(v, Number(1)))), du)
+    if not _depends(u, variable):  # c^v
+        return _multiply(_multiply(node, _log(u)), dv)
+    # u^v = e^(v ln u)
+    return _multiply(node, _add(_multiply(dv, _log(u)), _divide(_multiply(v, du), u)))
+
+
+def derivative_samples(compiled, function, min_x, max_x, sampled=None):
+    """Return the SampleResult of a derivative at the samples of its function, from the SampleResult of the function.
+
+    A derivative can be finite where its function is not, as 1/(x*ln(10)) is
+    for log10(x) at negative x, so it is only kept at the x the function has
+    samples at. sampled, the samples of the derivative on the same uniform grid
+    as the function, is reduced to those x. Without it, or when either was
+    reduced to the canvas columns, the derivative is evaluated at those x; the
+    function is not evaluated again.
+    """
+    if sampled is not None and not (sampled.decimated or function.decimated):
+        if function.removed_points == 0:
+            return sampled
+        keep = np.isin(sampled.x, function.x)
+        x, y = sampled.x[keep], sampled.y[keep]
+    else:
+        x = function.x
+        with np.errstate(all="ignore"):
+            y = compiled.evaluate(x)
+    result = finite_samples(x, y)._replace(decimated=function.decimated)
+    return split_at_singularities(compiled, result, min_x, max_x)
+
+
+def evaluate_on_domain(derivative, function, x):
+    """Evaluate a derivative over x, NaN where its function is undefined or infinite.
+
+    Both are evaluated in one pass by evaluate_shared, so the subexpressions
+    they share are computed once.
+    """
+    y, dy = evaluate_shared([function, derivative], x)
+    return np.where(np.isfinite(y), dy, np.nan)
+
+
+def may_be_undefined(node):
+    """Whether an expression may be undefined or infinite somewhere.
+
+    Only calls of sqrt and log10, divisions and powers that are fractional,
+    negative or of a base that is not a positive constant can be.
+    """
+    if isinstance(node, Call) or isinstance(node, BinaryOp) and node.op == "/":
+        return True
+    if isinstance(node, BinaryOp) and node.op == "^":
+        exponent, base = _value(node.right), _value(node.left)
+        if exponent is None and (base is None or base <= 0):
+            return True
+        if exponent is not None and (exponent < 0 or not as_float(exponent).is_integer()):
+            return True
+    return any(may_be_undefined(child) for child in node[1:] if isinstance(child, tuple))
+
+
+def _depends(node, variable):
+    if isinstance(node, Variable):
+        return node.name == variable
+    return any(_depends(child, variable) for child in node[1:] if isinstance(child, tuple))
+
+
+def _value(node):
+    """Value of a number or of a signed number, None for anything else."""
+    if isinstance(node, Number):
+        return node.value
+    if isinstance(node, UnaryOp) and isinstance(node.operand, Number):
+        return -node.operand.value if node.op == "-" else node.operand.value
+    return None
+
+
+def _log(node):
+    value = _value(node)
+    if value is not None and value > 0:
+        return Number(math.log(value))
+    return _multiply(Number(LN10), Call("log10", node))
+
+
+def _negate(node):
+    value = _value(node)
+    if value is not None:
+        return Number(-value)
+    if isinstance(node, UnaryOp) and node.op == "-":
+        return node.operand
+    if isinstance(node, BinaryOp) and node.op == "*" and _value(node.left) is not None:
+        return _multiply(Number(-_value(node.left)), node.right)
+    return UnaryOp("-", node)
+
+
+def _add(left, right):
+    left_value, right_value = _value(left), _value(right)
+    if left_value is not None and right_value is not None:
+        return Number(left_value + right_value)
+    if left_value == 0:
+        return right
+    if right_value == 0:
+        return left
+    return BinaryOp("+", left, right)
+
+
+def _subtract(left, right):
+    left_value, right_value = _value(left), _value(right)
+    if left_value is not None and right_value is not None:
+        return Number(left_value - right_value)
+    if right_value == 0:
+        return left
+    if left_value == 0:
+        return _negate(right)
+    return BinaryOp("-", left, right)
+
+
+def _multiply(left, right):
+    left_value, right_value = _value(left), _value(right)
+    if left_value is not None and right_value is not None:
+        return Number(left_value * right_value)
+    if left_value == 0 or right_value == 0:
+        return Number(0)
+    if right_value is not None:  # Constant factors first
+        left, right, left_value = right, left, right_value
+    if left_value == 1:
+        return right
+    if left_value is not None and isinstance(right, BinaryOp) and right.op == "*" and _value(right.left) is not None:
+        return _multiply(Number(left_value * _value(right.left)), right.right)
+    return BinaryOp("*", left, right)
+
+
+def _divide(left, right):
+    if _value(left) == 0:
+        return Number(0)
+    if _value(right) == 1:
+        return left
+    return BinaryOp("/", left, right)
+
+
+def _power(base, exponent):
+    value = _value(exponent)
+    if value == 0:
+        return Number(1)
+    if value == 1:
+        return base
+    return BinaryOp("^", base, exponent)
+
+
+def cumulative_integral(x, y, breaks=None):
+    """Return the running integral of the samples y over x by the trapezoid rule, in one vectorized pass.
+
+    The integral starts at zero at the first sample and starts again at zero
+    after each break, such as a pole, where it would not converge. Decimated
+    samples give the integral of the line through the samples kept.
+    """
+    areas = np.zeros(len(x))
+    areas[1:] = (y[1:] + y[:-1]) * np.diff(x) / 2
+    starts = np.zeros(len(x), dtype=bool)
+    if breaks is not None and len(breaks) and len(x):
+        index = np.searchsorted(x, breaks)
+        starts[index[(index > 0) & (index < len(x))]] = True
+    areas[starts] = 0.0  # Nothing is integrated across a break
+    integral = np.cumsum(areas)
+    if starts.any():
+        pieces = np.cumsum(starts)
+        integral -= integral[np.concatenate([[0], np.flatnonzero(starts)])][pieces]
+    return integral
+
+
+def integral_samples(result):
+    """Return the SampleResult of the running integral of a function, computed from its SampleResult alone.
+
+    The integral has the same x as the samples, nothing is evaluated again.
+    Decimated samples cannot be integrated, theirs is the integral carried
+    through the chunks they were streamed in.
+    """
+    if result.integral is not None:
+        return result.integral
+    y = cumulative_integral(result.x, result.y, result.breaks)
+    if len(y) == 0:
+        return result._replace(y=y, removed_points=0)
+    return SampleResult(result.x, y, 0, result.min_x, result.max_x, np.min(y), np.max(y), result.decimated,
+                        result.breaks)
@@ -0,0 +1,248 @@
+import logging
+import numpy as np
+from expression_parser import BINARY_OPERATORS, UNARY_OPERATORS, BinaryOp, Call, Number, UnaryOp, Variable, as_float
+
+BLOCK_SIZE = 8192  # Samples per block, the temporaries of a block stay in the CPU cache
+MAX_MULTIPLY_POWER = 8  # Larger integer exponents are left to np.power
+MAX_HORNER_DEGREE = 16
+
+
+class FusedKernel:
+    """Expression compiled into NumPy calls writing into preallocated block buffers.
+
+    The generated code evaluates x block by block. Every operator writes into a
+    buffer through the ufunc's out argument instead of allocating a temporary.
+    Polynomials in x are evaluated in Horner form, small integer powers by
+    repeated multiplication and constant subexpressions are folded beforehand.
+
+    Parameters
+    ----------
+    tree : tree
+       parsed expression in the variable x
+    namespace : dict
+       ufuncs of the functions the expression may call
+
+    Raises
+    ------
+    ValueError
+       when the expression cannot be fused, such as when folding a constant
+       subexpression fails or does not give a real number
+    """
+    def __init__(self, tree, namespace):
+        self.namespace = namespace
+        self.constants = []
+        self.lines = []
+        self.n_registers = 0
+        self._free = []
+        result = self._emit(_fold(tree, namespace), "out")
+        if result != "out":  # A lone x or constant
+            self.lines.append(f"out[...] = {result}")
+
+        registers = "".join(f", t{i}" for i in range(self.n_registers))
+        self.source = f"def block(x, out{registers}):\n" + "".join(f"    {line}\n" for line in self.lines)
+        scope = dict(np=np, **{f"c{i}": value for i, value in enumerate(self.constants)})
+        scope.update({f"f_{name}": function for name, function in namespace.items()})
+        exec(compile(self.source, "<fused>", "exec"), scope)
+        self.block = scope["block"]
+
+    def __call__(self, x, out=None):
+        """Evaluate over the 1-D array x, into out when given, in the precision of x."""
+        if out is None:
+            out = np.empty(len(x), dtype=x.dtype)
+        buffers = [np.empty(min(BLOCK_SIZE, len(x)), dtype=x.dtype) for _ in range(self.n_registers)]
+        for start in range(0, len(x), BLOCK_SIZE):
+            stop = min(start + BLOCK_SIZE, len(x))
+            self.block(x[start:stop], out[start:stop], *[buffer[:stop - start] for buffer in buffers])
+        return out
+
+    def _constant(self, value):
+        # As Python floats, NumPy scalars would promote float32 blocks to float64 and huge integers overflow NumPy
+        self.constants.append(as_float(value.item() if isinstance(value, np.generic) else value))
+        return f"c{len(self.constants) - 1}"
+
+    def _register(self):
+        if self._free:
+            return self._free.pop()
+        self.n_registers += 1
+        return f"t{self.n_registers - 1}"
+
+    def _release(self, name):
+        if name.startswith("t"):
+            self._free.append(name)
+
+    def _emit(self, node, dest):
+        """Emit the code computing node and return where its value is: dest, x or a constant."""
+        if isinstance(node, Number):
+            return self._constant(node.value)
+        if isinstance(node, Variable):
+            return "x"
+        if isinstance(node, UnaryOp):
+            operand = self._emit(node.operand, dest)
+            if node.op == "+":
+                return operand
+            self.lines.append(f"np.negative({operand}, out={dest})")
+            return dest
+        if isinstance(node, Call):
+            argument = self._emit(node.argument, dest)
+            self.lines.append(f"f_{node.name}({argument}, out={dest})")
+            return dest
+
+        coefficients = _polynomial(node)
+        if coefficients is not None and max(coefficients) >= 2 and len(coefficients) >= 2:
+            return self._emit_horner(coefficients, dest)
+        if node.op == "^" and isinstance(node.right, Number) and _is_small_integer(node.right.value):
+            return self._emit_integer_power(node.left, int(node.right.value), dest)
+
+        left = self._emit(node.left, dest)
+        right_dest = self._register() if left == dest else dest
+        right = self._emit(node.right, right_dest)
+        ufunc = {"+": "add", "-": "subtract", "*": "multiply", "/": "divide", "^": "power"}[node.op]
+        self.lines.append(f"np.{ufunc}({left}, {right}, out={dest})")
+        if right_dest != dest:
+            self._release(right_dest)
+        return dest
+
+    def _emit_horner(self, coefficients, dest):
+        # c_n x^n + ... + c_0 as ((c_n x + c_(n-1)) x + ...) x + c_0
+        degree = max(coefficients)
+        self.lines.append(f"np.multiply(x, {self._constant(coefficients[degree])}, out={dest})")
+        for power in range(degree - 1, -1, -1):
+            if coefficients.get(power):
+                self.lines.append(f"np.add({dest}, {self._constant(coefficients[power])}, out={dest})")
+            if power > 0:
+                self.lines.append(f"np.multiply({dest}, x, out={dest})")
+        return dest
+
+    def _emit_integer_power(self, base_node, exponent, dest):
+        base = self._emit(base_node, dest)
+        if abs(exponent) > 1:
+            if base == dest and abs(exponent) == 2:
+                self.lines.append(f"np.multiply({dest}, {dest}, out={dest})")
+            elif base == dest:
+                # The base must survive the products, they accumulate in a register
+                product = self._register()
+                self.lines.append(f"np.multiply({dest}, {dest}, out={product})")
+                for _ in range(abs(exponent) - 3):
+                    self.lines.append(f"np.multiply({product}, {dest}, out={product})")
+                self.lines.append(f"np.multiply({product}, {dest}, out={dest})")
+                self._release(product)
+            else:
+                self.lines.append(f"np.multiply({base}, {base}, out={dest})")
+                for _ in range(abs(exponent) - 2):
+                    self.lines.append(f"np.multiply({dest}, {base}, out={dest})")
+            base = dest
+        if exponent < 0:
+            self.lines.append(f"np.divide(1.0, {base}, out={dest})")
+            return dest
+        return base
+
+
+def _is_integer(value):
+    # Python integers may be too large to convert to float
+    return isinstance(value, (int, np.integer)) or float(value).is_integer()
+
+
+def _is_small_integer(value):
+    return _is_integer(value) and 1 <= abs(value) <= MAX_MULTIPLY_POWER
+
+
+def _is_real_number(value):
+    return isinstance(value, (int, float, np.integer, np.floating)) and not isinstance(value, bool)
+
+
+def _fold(node, namespace):
+    """Replace the subtrees without x by a Number holding their value.
+
+    Values are computed with the Python operations of the unfused evaluation.
+    A constant that cannot be computed, such as a division by zero, makes the
+    expression unfusable so that the unfused evaluation raises as before.
+    """
+    if isinstance(node, (Number, Variable)):
+        return node
+    if isinstance(node, UnaryOp):
+        folded = UnaryOp(node.op, _fold(node.operand, namespace))
+        if not isinstance(folded.operand, Number):
+            return folded
+        operation, operands = UNARY_OPERATORS[node.op], (folded.operand.value,)
+    elif isinstance(node, BinaryOp):
+        folded = BinaryOp(node.op, _fold(node.left, namespace), _fold(node.right, namespace))
+        if not (isinstance(folded.left, Number) and isinstance(folded.right, Number)):
+            return folded
+        operation, operands = BINARY_OPERATORS[node.op], (folded.left.value, folded.right.value)
+    else:
+        folded = Call(node.name, _fold(node.argument, namespace))
+        if not isinstance(folded.argument, Number):
+            return folded
+        operation, operands = namespace[node.name], (folded.argument.value,)
+    try:
+        with np.errstate(all="ignore"):
+            value = operation(*operands)
+    except Exception as e:
+        raise ValueError(f"constant {node} cannot be folded: {type(e).__name__}: {e}") from e
+    if not _is_real_number(value):
+        raise ValueError(f"constant {node} is not a real number")
+    return Number(value)
+
+
+def _polynomial(node):
+    """Return {power: coefficient} of a sum of monomials c*x^k, or None.
+
+    Products of sums such as (x + 1)^2 are not expanded, their expanded form
+    can lose precision to cancellation the factored form does not have.
+    """
+    if isinstance(node, Number):
+        return {0: node.value} if _is_real_number(node.value) else None
+    if isinstance(node, Variable):
+        return {1: 1}
+    if isinstance(node, UnaryOp):
+        operand = _polynomial(node.operand)
+        if operand is None or node.op == "+":
+            return operand
+        return {power: -coefficient for power, coefficient in operand.items()}
+    if not isinstance(node, BinaryOp) or node.op == "/":
+        return None
+
+    if node.op == "^":
+        exponent = node.right.value if isinstance(node.right, Number) else None
+        if exponent is None or not _is_integer(exponent) or not 0 <= exponent <= MAX_HORNER_DEGREE:
+            return None
+        base = _polynomial(node.left)
+        if base is None or len(base) > 1:
+            return None
+        result = {0: 1}
+        for _ in range(int(exponent)):
+            result = _multiply(result, base)
+            if result is None:
+                return None
+        return result
+
+    left, right = _polynomial(node.left), _polynomial(node.right)
+    if left is None or right is None:
+        return None
+    if node.op == "*":
+        return _multiply(left, right) if min(len(left), len(right)) == 1 else None
+    sign = 1 if node.op == "+" else -1
+    result = dict(left)
+    for power, coefficient in right.items():
+        result[power] = result.get(power, 0) + sign * coefficient
+    return {power: coefficient for power, coefficient in result.items() if coefficient != 0} or {0: 0}
+
+
+def _multiply(left, right):
+    result = {}
+    for left_power, left_coefficient in left.items():
+        for right_power, right_coefficient in right.items():
+            power = left_power + right_power
+            if power > MAX_HORNER_DEGREE:
+                return None
+            result[power] = result.get(power, 0) + left_coefficient * right_coefficient
+    return result
+
+
+def compile_fused(tree, namespace):
+    """Return the FusedKernel of a tree, or None when it cannot be fused."""
+    try:
+        return FusedKernel(tree, namespace)
+    except (ValueError, OverflowError) as e:
+        logging.debug("Expression not fused: %s", e)
+        return None
@@ -0,0 +1,109 @@
+import numpy as np
+from instrumentation import tracer
+
+
+def minmax_decimate(x, y, n_columns, min_x=None, max_x=None):
+    """Reduce a sorted series to what n_columns pixel columns can show.
+
+    Keeps the first, last, lowest and highest sample of every pixel column of
+    the interval [min_x, max_x], so spikes narrower than a pixel stay visible.
+    Only samples in the interval, plus one on each side so the line reaches the
+    border of the view, are returned. The returned points are a subset of the
+    input samples, in their original order.
+
+    Parameters
+    ----------
+    x, y : numpy.ndarray
+       samples sorted by x, with finite y values
+    n_columns : int
+       number of pixel columns of the view
+    min_x, max_x : float
+       visible interval, defaults to the extent of x
+    """
+    if len(x) == 0:
+        return x, y
+    min_x = x[0] if min_x is None else min_x
+    max_x = x[-1] if max_x is None else max_x
+    start = max(np.searchsorted(x, min_x, side="right") - 1, 0)
+    stop = np.searchsorted(x, max_x, side="left") + 1
+    x, y = x[start:stop], y[start:stop]
+    n_columns = max(int(n_columns), 1)
+    if len(x) <= 4 * n_columns or not max_x > min_x:
+        return x, y
+
+    with tracer.span("decimate", samples=len(x)):
+        column = np.floor((x - min_x) * (n_columns / (max_x - min_x))).astype(np.int64)
+        starts, counts, lowest, highest = _column_extremes(column, y)
+        keep = np.unique(np.concatenate([starts, starts + counts - 1, lowest, highest]))
+        return x[keep], y[keep]
+
+
+def _column_extremes(column, y):
+    """Return start, length, first lowest and first highest sample index of each run of equal columns."""
+    starts = np.flatnonzero(np.diff(column, prepend=column[0] - 1))
+    counts = np.diff(starts, append=len(y))
+    index = np.arange(len(y))
+    lowest = np.repeat(np.minimum.reduceat(y, starts), counts)
+    highest = np.repeat(np.maximum.reduceat(y, starts), counts)
+    first_lowest = np.minimum.reduceat(np.where(y == lowest, index, len(y)), starts)
+    first_highest = np.minimum.reduceat(np.where(y == highest, index, len(y)), starts)
+    return starts, counts, first_lowest, first_highest
+
+
+class StreamingDecimator:
+    """Min/max per pixel column decimation of a series fed chunk by chunk.
+
+    Memory use depends on n_columns only, not on the number of samples added.
+
+    Parameters
+    ----------
+    min_x, max_x : float
+       interval covered by the pixel columns
+    n_columns : int
+       number of pixel columns
+    dtype : dtype
+       precision of the samples kept
+    """
+    def __init__(self, min_x, max_x, n_columns, dtype=np.float64):
+        self.min_x = min_x
+        self.max_x = max_x
+        self.n_columns = max(int(n_columns), 1)
+        # (x, y) of the first, last, lowest and highest sample of each column
+        self._points = {name: (np.full(self.n_columns, np.nan, dtype), np.full(self.n_columns, np.nan, dtype))
+                        for name in ("first", "last", "lowest", "highest")}
+
+    def add(self, x, y):
+        """Add a chunk of samples, sorted by x and following the previous chunks."""
+        if len(x) == 0:
+            return
+        with tracer.span("decimate", samples=len(x)):
+            self._add(x, y)
+
+    def _add(self, x, y):
+        scale = self.n_columns / (self.max_x - self.min_x) if self.max_x > self.min_x else 0.0
+        column = np.clip(np.floor((x - self.min_x) * scale), 0, self.n_columns - 1).astype(np.int64)
+        starts, counts, lowest, highest = _column_extremes(column, y)
+        columns = column[starts]
+
+        first_x, first_y = self._points["first"]
+        unset = np.isnan(first_x[columns])
+        first_x[columns[unset]] = x[starts[unset]]
+        first_y[columns[unset]] = y[starts[unset]]
+
+        last_x, last_y = self._points["last"]
+        last_x[columns] = x[starts + counts - 1]
+        last_y[columns] = y[starts + counts - 1]
+
+        for name, candidates, better in (("lowest", lowest, np.less), ("highest", highest, np.greater)):
+            point_x, point_y = self._points[name]
+            replace = np.isnan(point_y[columns]) | better(y[candidates], point_y[columns])
+            point_x[columns[replace]] = x[candidates[replace]]
+            point_y[columns[replace]] = y[candidates[replace]]
+
+    def result(self):
+        """Return the kept samples sorted by x."""
+        x = np.concatenate([point_x for point_x, _ in self._points.values()])
+        y = np.concatenate([point_y for _, point_y in self._points.values()])
+        valid = ~np.isnan(x)
+        x, index = np.unique(x[valid], return_index=True)
+        return x, y[valid][index]
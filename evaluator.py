@@ -0,0 +1,164 @@
+import logging
+import numpy as np
+from codegen import compile_fused
+from expression_parser import (BINARY_OPERATORS, UNARY_OPERATORS, BinaryOp, Number, UnaryOp, Variable,
+                               format_expression, parse, to_python)
+
+# Names available to expressions, shared by the vectorized and the per-point path
+NAMESPACE = {"log10": np.log10, "sqrt": np.sqrt}
+
+
+class CompiledFunction:
+    """Function expression compiled once and evaluated over whole x arrays.
+
+    Parameters
+    ----------
+    func : str or tree
+       expression in the variable x, as typed by the user or already parsed
+    """
+    def __init__(self, func):
+        self.tree = parse(func) if isinstance(func, str) else func
+        self.text = format_expression(self.tree)  # Canonical form in the notation users type
+        self.source = to_python(self.tree)
+        self.code = compile(self.source, "<function>", "eval")
+        self.kernel = compile_fused(self.tree, NAMESPACE)  # None when the expression cannot be fused
+
+    def evaluate(self, x, out=None):
+        """Evaluate the expression over the array x, into out when given.
+
+        Uses the fused kernel when the expression has one, evaluate_vectorized
+        otherwise. Both give the same values as evaluating point by point.
+        float32 arrays are evaluated in float32, anything else in float64.
+        """
+        x = as_float_array(x)
+        if self.kernel is not None and x.ndim == 1:
+            try:
+                with np.errstate(all="ignore"):
+                    return self.kernel(x, out)
+            except Exception as e:
+                logging.debug("Fused evaluation of %s failed (%s)", self.source, e)
+        y = self.evaluate_vectorized(x)
+        if out is None:
+            return y
+        out[...] = y
+        return out
+
+    def evaluate_vectorized(self, x):
+        """Evaluate the expression over the array x in a single vectorized pass.
+
+        Falls back to evaluating point by point when the expression cannot be
+        broadcast over an array, so both paths give the same values.
+        """
+        x = as_float_array(x)
+        with np.errstate(all="ignore"):
+            try:
+                y = np.asarray(eval(self.code, dict(NAMESPACE, x=x)))
+                if y.dtype.kind in "biuf" and y.shape in (x.shape, ()):
+                    return np.broadcast_to(y, x.shape).astype(x.dtype)
+            except Exception as e:
+                logging.debug("Vectorized evaluation of %s failed (%s), evaluating per point", self.source, e)
+            return self.evaluate_per_point(x)
+
+    def evaluate_per_point(self, x):
+        """Evaluate the expression once per sample of x, in float64 whatever the precision of x."""
+        y = np.array([eval(self.code, dict(NAMESPACE, x=xi)) for xi in np.asarray(x, dtype=float)], dtype=float)
+        return y.astype(np.float32) if np.asarray(x).dtype == np.float32 else y
+
+    __call__ = evaluate
+
+
+class CompiledFunction2D:
+    """Expression in the variables x and y compiled once and evaluated over whole arrays of points.
+
+    Parameters
+    ----------
+    func : str or tree
+       expression in x and y, as typed by the user or already parsed
+    """
+    def __init__(self, func):
+        self.tree = parse(func, ("x", "y")) if isinstance(func, str) else func
+        self.text = format_expression(self.tree)
+        self.source = to_python(self.tree)
+        self.code = compile(self.source, "<function>", "eval")
+
+    def evaluate(self, x, y):
+        """Evaluate the expression at the points (x, y), x and y being broadcast against each other.
+
+        Evaluates point by point when the expression cannot be broadcast over
+        arrays, as CompiledFunction does.
+        """
+        x, y = np.broadcast_arrays(as_float_array(x), as_float_array(y))
+        dtype = np.result_type(x, y)
+        with np.errstate(all="ignore"):
+            try:
+                z = np.asarray(eval(self.code, dict(NAMESPACE, x=x, y=y)))
+                if z.dtype.kind in "biuf" and z.shape in (x.shape, ()):
+                    return np.broadcast_to(z, x.shape).astype(dtype)
+            except Exception as e:
+                logging.debug("Vectorized evaluation of %s failed (%s), evaluating per point", self.source, e)
+            z = np.array([eval(self.code, dict(NAMESPACE, x=xi, y=yi))
+                          for xi, yi in zip(x.ravel().astype(float), y.ravel().astype(float))], dtype=float)
+        return z.reshape(x.shape).astype(dtype)
+
+    __call__ = evaluate
+
+
+def as_float_array(x):
+    """Return x as a float32 array when it is one, as a float64 array otherwise."""
+    x = np.asarray(x)
+    return x if x.dtype in (np.float32, np.float64) else x.astype(float)
+
+
+def evaluate_shared(compiled_functions, x):
+    """Evaluate several functions over the same x array, computing each distinct subexpression once.
+
+    Subexpressions such as x^2 or sqrt(x) appearing in more than one function,
+    or more than once in one function, are evaluated a single time. Returns one
+    array per function, equal to what its evaluate method gives.
+    """
+    x = as_float_array(x)
+    if len(compiled_functions) == 1:
+        return [compiled_functions[0].evaluate(x)]
+
+    memo = {}
+    results = []
+    with np.errstate(all="ignore"):
+        for compiled in compiled_functions:
+            try:
+                y = np.asarray(_evaluate_node(compiled.tree, x, memo)[1])
+                if y.dtype.kind in "biuf" and y.shape in (x.shape, ()):
+                    results.append(np.broadcast_to(y, x.shape).astype(x.dtype))
+                    continue
+            except Exception as e:
+                logging.debug("Shared evaluation of %s failed (%s), evaluating it on its own", compiled.source, e)
+            results.append(compiled.evaluate(x))
+    return results
+
+
+def _evaluate_node(node, x, memo):
+    """Return the key and value of a subtree, reusing the value of an equal subtree evaluated before.
+
+    Keys are built from the structure and the number types, so that 2 and 2.0
+    are not mixed up, and the same operations run as in the compiled source.
+    """
+    if isinstance(node, Number):
+        return ("number", type(node.value), node.value), node.value
+    if isinstance(node, Variable):
+        return ("variable", node.name), x
+    if isinstance(node, UnaryOp):
+        operand_key, operand = _evaluate_node(node.operand, x, memo)
+        key = ("unary", node.op, operand_key)
+        if key not in memo:
+            memo[key] = UNARY_OPERATORS[node.op](operand)
+    elif isinstance(node, BinaryOp):
+        left_key, left = _evaluate_node(node.left, x, memo)
+        right_key, right = _evaluate_node(node.right, x, memo)
+        key = ("binary", node.op, left_key, right_key)
+        if key not in memo:
+            memo[key] = BINARY_OPERATORS[node.op](left, right)
+    else:
+        argument_key, argument = _evaluate_node(node.argument, x, memo)
+        key = ("call", node.name, argument_key)
+        if key not in memo:
+            memo[key] = NAMESPACE[node.name](argument)
+    return key, memo[key]
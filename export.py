@@ -0,0 +1,158 @@
+import json
+import os
+import struct
+import numpy as np
+from instrumentation import tracer
+from pipeline import DEFAULT_MEMORY_BUDGET, StreamStats, choose_dtype, sample_function, stream_function
+
+EXPORT_FORMATS = ("csv", "npy", "raw")
+CSV_BLOCK_ROWS = 1 << 16  # Rows formatted at once, bounds the text held in memory
+NPY_HEADER_BYTES = 128  # Room for any row count, the header is rewritten in place once the rows are known
+
+
+class CsvWriter:
+    """Stream sink writing each chunk of samples as x,y rows of a text file.
+
+    A block of rows is formatted by a single % operation, which is several
+    times faster than np.savetxt formatting the rows one by one. Values are
+    written with enough digits to read back the same floats.
+    """
+    def __init__(self, file, dtype=np.float64):
+        self.file = file
+        self.dtype = np.dtype(dtype)
+        self.rows = 0
+        self._format = "%.9g,%.9g\n" if self.dtype.itemsize == 4 else "%.17g,%.17g\n"
+
+    def add(self, x, y):
+        for start in range(0, len(x), CSV_BLOCK_ROWS):
+            block = np.column_stack([x[start:start + CSV_BLOCK_ROWS], y[start:start + CSV_BLOCK_ROWS]])
+            self.file.write(self._format * len(block) % tuple(block.ravel().tolist()))
+        self.rows += len(x)
+
+    def close(self):
+        pass
+
+
+class RawWriter:
+    """Stream sink writing the samples as little-endian x, y pairs with no header.
+
+    Each chunk is interleaved into one buffer and written as it is, the
+    bytes go to the file without any formatting.
+    """
+    def __init__(self, file, dtype=np.float64):
+        self.file = file
+        self.dtype = np.dtype(dtype).newbyteorder("<")
+        self.rows = 0
+
+    def add(self, x, y):
+        block = np.empty((len(x), 2), dtype=self.dtype)
+        block[:, 0] = x
+        block[:, 1] = y
+        self.file.write(block.data)
+        self.rows += len(x)
+
+    def close(self):
+        pass
+
+
+class NpyWriter(RawWriter):
+    """Stream sink writing the samples as the rows of an (n, 2) array in .npy format.
+
+    The header is written for zero rows first, padded to NPY_HEADER_BYTES, and
+    rewritten with the row count by close(), so the rows never need to be
+    known up front. The file must be seekable.
+    """
+    def __init__(self, file, dtype=np.float64):
+        super().__init__(file, dtype)
+        self.file.write(npy_header(0, self.dtype))
+
+    def close(self):
+        self.file.seek(0)
+        self.file.write(npy_header(self.rows, self.dtype))
+        self.file.seek(0, os.SEEK_END)
+
+
+def npy_header(rows, dtype):
+    """Return the version 1.0 .npy header of an (rows, 2) C ordered array, NPY_HEADER_BYTES long."""
+    header = "{'descr': '%s', 'fortran_order': False, 'shape': (%d, 2), }" % (np.dtype(dtype).str, rows)
+    header = header.ljust(NPY_HEADER_BYTES - 11) + "\n"
+    return b"\x93NUMPY\x01\x00" + struct.pack("<H", len(header)) + header.encode("latin1")
+
+
+WRITERS = {"csv": CsvWriter, "npy": NpyWriter, "raw": RawWriter}
+
+
+def export_samples(compiled, path, min_x, max_x, step_size=None, adaptive=False, max_points=4000, tolerance=1e-3,
+                   format=None, precision="float64", memory_budget=DEFAULT_MEMORY_BUDGET, progress=None,
+                   cancelled=None, parallel=None, expression=None):
+    """Write the finite samples of a function to a file as they are evaluated, chunk by chunk.
+
+    The sampling metadata goes to path + ".json": the expression, range, step,
+    number of samples and of non-finite ones removed, and the layout of the
+    file. The file is removed when the export fails or is cancelled.
+
+    Parameters
+    ----------
+    compiled : CompiledFunction
+       function to evaluate
+    path : str
+       file to write
+    min_x, max_x, step_size, adaptive, max_points, tolerance :
+       as in sample_function, the adaptive samples are few and sampled in memory
+    format : str
+       one of EXPORT_FORMATS, taken from the extension of path when not given
+    precision : str
+       one of pipeline.PRECISIONS, exports are not previews so "auto" gives float64
+    memory_budget : int
+       approximate peak memory of the evaluation in bytes
+    progress, cancelled, parallel :
+       as in sample_function
+    expression : str
+       function as the user wrote it, the canonical text of compiled when not given
+
+    Returns
+    -------
+    dict
+       the metadata written along with the file
+    """
+    format = format or os.path.splitext(path)[1].lstrip(".").lower()
+    if format not in WRITERS:
+        raise ValueError("Unknown export format {!r}, expected one of {}".format(format, ", ".join(EXPORT_FORMATS)))
+    dtype = np.float64 if adaptive else choose_dtype([compiled], min_x, max_x, precision)
+    try:
+        with open(path, "w" if format == "csv" else "wb") as file, tracer.span("export", format=format):
+            if format == "csv":
+                file.write(f"# f(x) = {expression or compiled.text}\nx,y\n")
+            writer = WRITERS[format](file, dtype)
+            if adaptive:
+                result = sample_function(compiled, min_x, max_x, adaptive=True, max_points=max_points,
+                                         tolerance=tolerance, cancelled=cancelled)
+                writer.add(result.x, result.y)
+                stats = StreamStats(len(result.x) + result.removed_points, result.removed_points, result.min_x,
+                                    result.max_x, result.min_y, result.max_y)
+            else:
+                stats = stream_function(compiled, min_x, max_x, step_size, [writer], memory_budget, progress,
+                                        cancelled, parallel, dtype)
+            writer.close()
+    except BaseException:
+        _remove(path)
+        raise
+
+    metadata = {"expression": expression or compiled.text, "canonical": compiled.text, "format": format,
+                "dtype": writer.dtype.str, "columns": ["x", "y"], "rows": writer.rows,
+                "header_bytes": NPY_HEADER_BYTES if format == "npy" else 0,
+                "min_x": float(min_x), "max_x": float(max_x), "step_size": None if adaptive else float(step_size),
+                "adaptive": bool(adaptive), "n_samples": int(stats.n_samples),
+                "removed_points": int(stats.removed_points),
+                "x_range": None if stats.min_x is None else [float(stats.min_x), float(stats.max_x)],
+                "y_range": None if stats.min_y is None else [float(stats.min_y), float(stats.max_y)]}
+    with open(path + ".json", "w") as file:
+        json.dump(metadata, file, indent=2)
+    return metadata
+
+
+def _remove(path):
+    try:
+        os.unlink(path)
+    except OSError:
+        pass
@@ -0,0 +1,98 @@
+from collections import OrderedDict, namedtuple
+from checker import Checker
+from evaluator import CompiledFunction
+from expression_parser import ExpressionError, format_expression
+
+# Validation verdict and compiled form of one expression; compiled is None when invalid
+CacheEntry = namedtuple("CacheEntry", ["valid", "message", "compiled"])
+
+
+class ExpressionCache:
+    """Bounded LRU cache of validated and compiled function expressions.
+
+    Parameters
+    ----------
+    checker : Checker
+       checker used to validate expressions on a cache miss
+    maxsize : int
+       maximum number of expressions kept before the least recently used is evicted
+    compiler : callable
+       builds the compiled form of a valid tree, such as CompiledFunction2D for
+       expressions in x and y
+    """
+    def __init__(self, checker=None, maxsize=128, compiler=CompiledFunction):
+        self.checker = checker if checker is not None else Checker()
+        self.maxsize = maxsize
+        self.compiler = compiler
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()  # CacheEntry by canonical text, by normalized text when invalid
+        self._keys = OrderedDict()  # Key of the entry by normalized text, so known spellings are not parsed again
+
+    @staticmethod
+    def normalize(func):
+        """Return the text of an expression with runs of whitespace as one space."""
+        return " ".join(func.split())
+
+    def lookup(self, func):
+        """Return the CacheEntry of func, validating and compiling it on a miss.
+
+        Entries are keyed by the canonical text of the expression, so "5 * x ^ 2"
+        and "5*x^2" share one.
+        """
+        text = self.normalize(func)
+        key, tree = self._keys.get(text), None
+        if key not in self._entries:
+            key, tree = self._canonical(text)
+            self._keys[text] = key
+            if len(self._keys) > self.maxsize:
+                self._keys.popitem(last=False)
+        self._keys.move_to_end(text)
+        entry = self._entries.get(key)
+        if entry is not None:
+            self.hits += 1
+            self._entries.move_to_end(key)
+            return entry
+
+        self.misses += 1
+        entry = self._build_entry(text, tree)
+        self._entries[key] = entry
+        if len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+        return entry
+
+    def _canonical(self, text):
+        """Return the canonical text of an expression and its tree, the text and None when it is invalid."""
+        try:
+            tree = self.checker.parse(text)
+            return format_expression(tree), tree
+        except (ExpressionError, RecursionError):
+            return text, None
+
+    def _build_entry(self, text, tree):
+        # The tree the checker built while validating is compiled as is, only invalid text is parsed again
+        try:
+            if tree is None:
+                tree = self.checker.parse(text)
+            return CacheEntry(True, "", self.compiler(tree))
+        except ExpressionError as e:
+            return CacheEntry(False, e.message, None)
+        except (SyntaxError, RecursionError, MemoryError):
+            # Valid but too large or too deeply nested for Python to compile
+            return CacheEntry(False, "Function is too large or nested too deeply to evaluate.", None)
+
+    def stats(self):
+        """Return the hit, miss and eviction counters along with the current size."""
+        return {"hits": self.hits, "misses": self.misses, "evictions": self.evictions,
+                "size": len(self._entries), "maxsize": self.maxsize}
+
+    def clear(self):
+        """Drop all entries and reset the counters."""
+        self._entries.clear()
+        self._keys.clear()
+        self.hits = self.misses = self.evictions = 0
+
+    def __len__(self):
+        return len(self._entries)
@@ -0,0 +1,305 @@
+import math
+import operator
+import re
+from collections import namedtuple
+
+# Nodes of the expression tree. Being tuples they compare and hash by structure,
+# so equal subexpressions are equal keys.
+Number = namedtuple("Number", ["value"])
+Variable = namedtuple("Variable", ["name"])
+UnaryOp = namedtuple("UnaryOp", ["op", "operand"])
+BinaryOp = namedtuple("BinaryOp", ["op", "left", "right"])
+Call = namedtuple("Call", ["name", "argument"])
+
+Token = namedtuple("Token", ["kind", "text", "position"])
+
+FUNCTIONS = ("log10", "sqrt")
+
+_TOKEN_RE = re.compile(r"""
+    (?P<space>\s+)
+  | (?P<number>(?:\d+\.?\d*|\.\d+)(?:[eE][+-]?\d+)?)
+  | (?P<name>[A-Za-z_]\w*)
+  | (?P<op>[-+*/^])
+  | (?P<lparen>\()
+  | (?P<rparen>\))
+""", re.VERBOSE)
+
+
+class ExpressionError(ValueError):
+    """Invalid expression, position is the 0-based index of the offending character."""
+    def __init__(self, message, position):
+        super().__init__(message)
+        self.message = message
+        self.position = position
+
+
+def tokenize(text, variables=("x",)):
+    """Split an expression into tokens in a single pass."""
+    tokens = []
+    position = 0
+    while position < len(text):
+        match = _TOKEN_RE.match(text, position)
+        if match is None:
+            raise ExpressionError(f"Function contains unsupported character '{text[position]}' at position {position + 1}.",
+                                  position)
+        kind = match.lastgroup
+        if kind == "name" and match.group() not in FUNCTIONS and match.group() not in variables:
+            raise ExpressionError(f"Unknown name '{match.group()}' at position {position + 1}. "
+                                  f"Supported are {', '.join(variables)} and the functions {', '.join(FUNCTIONS)}.",
+                                  position)
+        if kind != "space":
+            tokens.append(Token(kind, match.group(), position))
+        position = match.end()
+    tokens.append(Token("end", "", len(text)))
+    return tokens
+
+
+def parse(text, variables=("x",)):
+    """Parse an expression into its tree, raising ExpressionError on invalid input.
+
+    Operators are +, -, *, / and ^ (right associative, binding tighter than a
+    sign). A sign is accepted at the start of a parenthesized group and of an
+    exponent only, as in "x*(-2)" or "x^-2".
+    """
+    try:
+        return _Parser(tokenize(text, variables)).parse()
+    except RecursionError:
+        raise ExpressionError("Function is nested too deeply.", 0) from None
+
+
+def parse_equation(text, variables=("x", "y")):
+    """Parse an equation "lhs = rhs" into the tree of lhs - rhs, whose zeros are its solutions.
+
+    Text without '=' is parsed as an expression equal to zero. Error positions
+    refer to the whole text.
+    """
+    sides = text.split("=")
+    if len(sides) == 1:
+        return parse(text, variables)
+    equals = len(sides[0])
+    if len(sides) > 2:
+        position = text.index("=", equals + 1)
+        raise ExpressionError(f"Only one '=' is allowed, found another at position {position + 1}.", position)
+    if not sides[0].strip():
+        raise ExpressionError("Missing expression before '='.", equals)
+    if not sides[1].strip():
+        raise ExpressionError(f"Missing expression after '=' at position {equals + 1}.", equals)
+    # The right side is padded to keep the positions of its characters in the whole text
+    return BinaryOp("-", parse(sides[0], variables), parse(" " * (equals + 1) + sides[1], variables))
+
+
+class _Parser:
+    """Recursive descent parser over the token list."""
+    def __init__(self, tokens):
+        self.tokens = tokens
+        self.index = 0
+
+    def peek(self):
+        return self.tokens[self.index]
+
+    def advance(self):
+        token = self.tokens[self.index]
+        self.index += 1
+        return token
+
+    def parse(self):
+        if self.peek().kind == "end":
+            raise ExpressionError("Function is empty.", 0)
+        node = self.expression(signed=False)
+        token = self.peek()
+        if token.kind == "rparen":
+            raise ExpressionError(f"Unmatched closing parenthesis at position {token.position + 1}. "
+                                  "Ensure that all parentheses are properly opened.", token.position)
+        if token.kind != "end":
+            raise ExpressionError(f"Missing operator before '{token.text}' at position {token.position + 1}.",
+                                  token.position)
+        return node
+
+    def expression(self, signed):
+        node = self.term(signed)
+        while self.peek().kind == "op" and self.peek().text in "+-":
+            op = self.advance().text
+            node = BinaryOp(op, node, self.term(signed=False))
+        return node
+
+    def term(self, signed):
+        node = self.factor(signed)
+        while self.peek().kind == "op" and self.peek().text in "*/":
+            op = self.advance().text
+            node = BinaryOp(op, node, self.factor(signed=False))
+        return node
+
+    def factor(self, signed):
+        if signed and self.peek().kind == "op" and self.peek().text in "+-":
+            op = self.advance().text
+            return UnaryOp(op, self.power())
+        return self.power()
+
+    def power(self):
+        node = self.primary()
+        if self.peek().kind == "op" and self.peek().text == "^":
+            self.advance()
+            node = BinaryOp("^", node, self.factor(signed=True))
+        return node
+
+    def primary(self):
+        token = self.advance()
+        if token.kind == "number":
+            return Number(float(token.text) if any(c in token.text for c in ".eE") else int(token.text))
+        if token.kind == "name":
+            if token.text not in FUNCTIONS:
+                return Variable(token.text)
+            opening = self.peek()
+            if opening.kind != "lparen":
+                raise ExpressionError(f"Function {token.text} at position {token.position + 1} must be followed by "
+                                      "an argument in parentheses.", opening.position)
+            self.advance()
+            return Call(token.text, self.group(opening))
+        if token.kind == "lparen":
+            return self.group(token)
+        raise self.missing_operand(token)
+
+    def group(self, opening):
+        """Parse the inside of a parenthesized group whose '(' was just consumed."""
+        if self.peek().kind == "rparen":
+            raise ExpressionError(f"Empty parentheses at position {opening.position + 1}.", opening.position)
+        node = self.expression(signed=True)
+        closing = self.advance()
+        if closing.kind == "rparen":
+            return node
+        if closing.kind == "end":
+            raise ExpressionError(f"Unmatched opening parenthesis at position {opening.position + 1}. "
+                                  "Ensure that all parentheses are properly closed.", opening.position)
+        raise ExpressionError(f"Missing operator before '{closing.text}' at position {closing.position + 1}.",
+                              closing.position)
+
+    def missing_operand(self, token):
+        """Error for a token found where an operand was expected."""
+        previous = self.tokens[self.index - 2] if self.index >= 2 else None
+        if token.kind == "end":
+            if previous is not None and previous.kind == "op":
+                return ExpressionError("Function ends with an operator. "
+                                       "Ensure that the function ends with a valid operand.", previous.position)
+            return ExpressionError("Function ends unexpectedly.", token.position)
+        if token.kind == "op":
+            if previous is None:
+                return ExpressionError("Function starts with an operator. "
+                                       "Ensure that the function starts with a valid operand.", token.position)
+            if previous.kind == "op":
+                return ExpressionError(f"Consecutive operators detected at position {token.position + 1}. "
+                                       "Ensure that operators are correctly placed between operands.",
+                                       token.position)
+        if token.kind == "rparen":
+            return ExpressionError(f"Unexpected closing parenthesis at position {token.position + 1}.",
+                                   token.position)
+        return ExpressionError(f"Unexpected '{token.text}' at position {token.position + 1}.", token.position)
+
+
+_PRECEDENCE = {"+": 1, "-": 1, "*": 2, "/": 2, "^": 4}
+_PYTHON_OPERATORS = {"+": "+", "-": "-", "*": "*", "/": "/", "^": "**"}
+
+MAX_INTEGER_POWER_BITS = 1024  # Integer powers of constants past the float64 range overflow to inf
+
+
+def _power(base, exponent):
+    """base ** exponent, except that integer powers too large for float64 give inf like float powers do.
+
+    Python computes them as exact integers, so "9^9^9" would take hours
+    instead of overflowing.
+    """
+    if (isinstance(base, int) and isinstance(exponent, int) and exponent > 0 and abs(base) > 1
+            and exponent * math.log2(abs(base)) > MAX_INTEGER_POWER_BITS):
+        return math.inf if base > 0 or exponent % 2 == 0 else -math.inf
+    return base ** exponent
+
+
+def as_float(value):
+    """float(value), except that integers past the float64 range give inf like float operations do."""
+    try:
+        return float(value)
+    except OverflowError:
+        return math.inf if value > 0 else -math.inf
+
+
+# Python operations of the operators, those of the to_python source but for integer overflows
+UNARY_OPERATORS = {"+": operator.pos, "-": operator.neg}
+BINARY_OPERATORS = {"+": operator.add, "-": operator.sub, "*": operator.mul, "/": operator.truediv, "^": _power}
+
+
+# Non-finite numbers, from literals past the float64 range or folded constants, are written as
+# literals that parse back to them in both notations
+INF_TEXT = "1e999"
+NAN = BinaryOp("*", Number(0), Number(math.inf))
+
+
+def _number_text(value):
+    return INF_TEXT if value == math.inf else repr(value)
+
+
+def to_python(node):
+    """Return Python source evaluating the tree with the same semantics.
+
+    Only the parentheses Python's precedence needs are written, as the
+    Python compiler rejects sources nested more than 200 parentheses deep.
+    """
+    return _to_python(node)[0]
+
+
+def _to_python(node):
+    """Return the Python source of the tree along with the precedence of its outermost operation.
+
+    Python precedences are 1 for + and -, 2 for * and /, 3 for signs and
+    4 for **; atoms are 5.
+    """
+    if isinstance(node, Number):
+        if node.value != node.value:
+            return _to_python(NAN)
+        if node.value < 0:  # Only built programmatically, written like a sign
+            return _to_python(UnaryOp("-", Number(-node.value)))
+        return _number_text(node.value), 5
+    if isinstance(node, Variable):
+        return node.name, 5
+    if isinstance(node, UnaryOp):
+        return node.op + _python_operand(node.operand, 3), 3
+    if isinstance(node, BinaryOp):
+        precedence = _PRECEDENCE[node.op]
+        if node.op == "^":
+            # ** is right associative and binds looser than a sign on its right only: x**-y**2 is x**(-(y**2))
+            left, right = _python_operand(node.left, 5), _python_operand(node.right, 3)
+        else:
+            left, right = _python_operand(node.left, precedence), _python_operand(node.right, precedence + 1)
+        return f"{left}{_PYTHON_OPERATORS[node.op]}{right}", precedence
+    return f"{node.name}({to_python(node.argument)})", 5
+
+
+def _python_operand(node, min_precedence):
+    """Python source of an operand, parenthesized when it binds looser than min_precedence."""
+    source, precedence = _to_python(node)
+    return source if precedence >= min_precedence else f"({source})"
+
+
+def format_expression(node, parent_precedence=0, right_side=False):
+    """Return the tree in the notation users type, with only the needed parentheses."""
+    if isinstance(node, Number):
+        if node.value != node.value:
+            return format_expression(NAN, parent_precedence, right_side)
+        if node.value < 0:  # Only built programmatically, formatted like a sign
+            return format_expression(UnaryOp("-", Number(-node.value)), parent_precedence, right_side)
+        return _number_text(node.value)
+    if isinstance(node, Variable):
+        return node.name
+    if isinstance(node, Call):
+        return f"{node.name}({format_expression(node.argument)})"
+    if isinstance(node, UnaryOp):
+        # Signs bind looser than ^ but are only accepted at the start of a group or exponent
+        text = f"{node.op}{format_expression(node.operand, 3)}"
+        return text if parent_precedence == 4 and right_side else f"({text})"
+
+    precedence = _PRECEDENCE[node.op]
+    if node.op == "^":
+        text = f"{format_expression(node.left, 5)}^{format_expression(node.right, 4, True)}"
+    else:
+        separator = f" {node.op} " if precedence == 1 else node.op
+        text = (format_expression(node.left, precedence) + separator
+                + format_expression(node.right, precedence + 1))
+    return f"({text})" if precedence < parent_precedence else text
@@ -1,5 +1,14 @@
 from PySide2.QtWidgets import QWidget, QVBoxLayout
 from matplotlib.backends.backend_qt5agg import FigureCanvasQTAgg as FigureCanvas, NavigationToolbar2QT as NavigationToolbar
+from instrumentation import tracer
+
+
+class PlotCanvas(FigureCanvas):
+    """Figure canvas timing its draws as the draw span."""
+    def draw(self):
+        with tracer.span("draw"):
+            super().draw()
+
 
 class FigureWidget(QWidget):
     """Figure widget used by different views
@@ -1,15 +1,61 @@
 import logging
-from PySide2.QtWidgets import QMainWindow, QVBoxLayout, QHBoxLayout, QWidget, QLabel, QLineEdit, QPushButton, QMessageBox, QCheckBox
-from PySide2.QtCore import Qt
-from matplotlib.figure import Figure
-from matplotlib.backends.backend_qt5agg import FigureCanvasQTAgg as FigureCanvas
+import os
+import re
+import time
+from PySide2.QtWidgets import QMainWindow, QVBoxLayout, QHBoxLayout, QWidget, QLabel, QLineEdit, QPushButton, QMessageBox, QCheckBox, QProgressBar, QComboBox, QFileDialog
+from PySide2.QtCore import Qt, QCoreApplication, QObject, QThreadPool, QTimer, Signal
 import numpy as np
 from functools import partial
+from calculus import differentiate, evaluate_on_domain, integral_samples, may_be_undefined
 from checker import Checker
-from figure_widget import FigureWidget
+from expression_cache import ExpressionCache
+from instrumentation import tracer
+from decimation import minmax_decimate
+from evaluator import CompiledFunction2D
+from expression_parser import format_expression
+from interval import insert_breaks
+from pipeline import DEFAULT_MEMORY_BUDGET, PRECISIONS
+from plot_style import THEMES, read_stylesheet, style_axes
+from plot_worker import ExportJob, PlotJob, PlotRequest, SurfaceJob, SurfaceRequest
+from viewport import TileCache
+
+# What the function input holds: f(x) plotted as a line, an equation in x and y plotted as the
+# curve of its solutions, or f(x, y) plotted as a heatmap
+PLOT_MODES = ("f(x)", "g(x, y) = 0", "z = f(x, y)")
+
+
+class Curve:
+    """One of the overlaid functions: its full resolution samples and the line showing them.
+
+    Parameters
+    ----------
+    text : str
+       canonical text of the function
+    line : Line2D
+       line the samples are drawn with
+    """
+    def __init__(self, text, line):
+        self.text = text
+        self.line = line
+        self.x_data = None  # Full resolution samples of the function,
+        self.y_data = None  # the line only gets what the canvas can show
+        self.holds_full_data = False  # True while the line shows x_data/y_data undecimated
+        self.viewport_sampler = None  # TileCache resampling the view in auto step mode
+        self.breaks = None  # x of the poles and domain edges the line is split at
+        self.expression = None  # CacheEntry of the function, None for integrals
+        self.function = None  # Curve of the function of a derivative, None for anything else
+        # (min_x, max_x, step_size, precision) of a grid too large to keep, x_data/y_data then only hold its
+        # reduction to the canvas columns and zooming in samples the view again; None otherwise
+        self.streamed_grid = None
+
+
+class TimingSignals(QObject):
+    """Carries the tracer records from the thread of their span to the GUI thread."""
+    recorded = Signal(object)
+
 
 class FunctionPlotter(QMainWindow):
-    def __init__(self):
+    def __init__(self, sample_cache=None, parallel=None):
         super().__init__()
         logging.debug("Initializing FunctionPlotter")
 
@@ -20,13 +66,44 @@ class FunctionPlotter(QMainWindow):
         self.initial_min_x = self.min_x  # Store initial values
         self.initial_max_x = self.max_x  # Store initial values
         self.step_size = 0.1
+        self.adaptive_max_points = 4000  # Point budget of the adaptive sampler
+        self.adaptive_tolerance = 1e-3  # Interpolation error accepted by the adaptive sampler
+        self.memory_budget = DEFAULT_MEMORY_BUDGET  # Larger grids are streamed and decimated chunk by chunk
         self.func = ""
         self.zoom_x = 1.0
         self.zoom_y = 1.0
         self.is_testing_bot = False
+        self.ax = None  # Axes and lines are created once and updated in place
+        self.lines = []  # Line2D per overlaid function, the first one is never removed
+        self.curves = []  # Curve per plotted function, in input order
+        self.applied_theme = None  # Theme the axes were last styled with
+        self.viewport_samplers = {}  # TileCache per curve label, kept while the curve stays plotted
+        self.sampled_view = None  # (min_x, max_x, spacing) of the samples currently drawn
+        self.curve_grid = None  # Sampling parameters of the last full resolution plot
+        self.curve_results = {}  # SampleResult per function text of that plot, reused when adding a function
+        self.curve_functions = []  # Texts of the functions of that plot, without their derivatives
         
         self.checker = Checker()
+        self.expression_cache = ExpressionCache(self.checker)  # Validated and compiled expressions
+        # Expressions in x and y per plot mode, "lhs = rhs" being accepted for implicit curves
+        self.surface_expression_caches = {
+            mode: ExpressionCache(Checker(("x", "y"), equation=mode == PLOT_MODES[1]), compiler=CompiledFunction2D)
+            for mode in PLOT_MODES[1:]}
+        self.image = None  # AxesImage of the heatmap shown, or None
+        self.surface_shown = False  # True while an implicit curve or a heatmap is drawn
+        self.sample_cache = sample_cache  # SampleCache keeping the samples across plots and sessions, or None
+        self.parallel = parallel  # ParallelEvaluator of large grids, or None to evaluate on the plot worker only
         self.msg_box = None  # Variable to store QMessageBox instance
+        self.thread_pool = QThreadPool(self)  # Evaluates functions off the GUI thread
+        self.current_job = None  # PlotJob whose result will be drawn
+        self.export_job = None  # ExportJob writing samples to files, or None
+        self.view_job = None  # PlotJob sampling the zoomed view of grids too large to keep, or None
+        self.live_debounce_ms = 150  # Quiet time after the last keystroke before a live plot
+        self.live_preview_points = 200  # Samples of the first, quick live plot before refining
+        self.live_latency_budget = 0.05  # Seconds from the debounced keystroke to the preview
+        self.live_started = None  # perf_counter() of the live plot whose preview is pending
+        self.last_live_inputs = None  # Inputs of the last live plot, unchanged inputs are not replotted
+        self.stage_times = {}  # Seconds spent per stage since the last plot started, for the timings readout
 
         self.setWindowTitle("Function Plotter")
         self.setGeometry(100, 100, 800, 600)
@@ -42,12 +119,28 @@ class FunctionPlotter(QMainWindow):
         function_layout = QHBoxLayout()
         self.function_label = QLabel("f(x):")
         self.function_input = QLineEdit()
-        self.function_input.setPlaceholderText("e.g., 5*x^3 + 2*x")
+        self.function_input.setPlaceholderText("e.g., 5*x^3 + 2*x, or several separated by ';'")
+        self.mode_input = QComboBox()
+        self.mode_input.addItems(PLOT_MODES)
+        self.mode_input.currentTextChanged.connect(self.on_mode_changed)
         self.dark_mode_checkbox = QCheckBox("Dark Mode")
         self.dark_mode_checkbox.stateChanged.connect(self.toggle_dark_mode)
+        self.live_checkbox = QCheckBox("Live Plot")
+        self.timings_checkbox = QCheckBox("Timings")
+        self.timings_checkbox.toggled.connect(self.toggle_timings)
+        # Overlays of the derivative and running integral of each function, toggling them samples nothing again
+        self.derivative_checkbox = QCheckBox("Derivative")
+        self.integral_checkbox = QCheckBox("Integral")
+        for checkbox in (self.derivative_checkbox, self.integral_checkbox):
+            checkbox.toggled.connect(self.toggle_overlays)
+        function_layout.addWidget(self.mode_input)
         function_layout.addWidget(self.function_label)
         function_layout.addWidget(self.function_input)
+        function_layout.addWidget(self.derivative_checkbox)
+        function_layout.addWidget(self.integral_checkbox)
+        function_layout.addWidget(self.live_checkbox)
         function_layout.addWidget(self.dark_mode_checkbox)
+        function_layout.addWidget(self.timings_checkbox)
         layout.addLayout(function_layout)
 
         # Min and Max x inputs (Horizontal layout)
@@ -62,6 +155,15 @@ class FunctionPlotter(QMainWindow):
         min_max_layout.addWidget(self.max_label)
         min_max_layout.addWidget(self.max_input)
 
+        # y range of the functions of x and y, hidden when plotting f(x)
+        self.min_y_label = QLabel("min value of y:")
+        self.min_y_input = QLineEdit()
+        self.max_y_label = QLabel("max value of y:")
+        self.max_y_input = QLineEdit()
+        for widget in (self.min_y_label, self.min_y_input, self.max_y_label, self.max_y_input):
+            min_max_layout.addWidget(widget)
+            widget.hide()
+
         layout.addLayout(min_max_layout)
 
         # Step size and checkbox (Horizontal layout)
@@ -70,25 +172,56 @@ class FunctionPlotter(QMainWindow):
         self.auto_step_checkbox.setChecked(True)  # Default to auto step size
         self.step_label = QLabel("Step Size:")
         self.step_input = QLineEdit()
+        self.adaptive_checkbox = QCheckBox("Adaptive Sampling")
+        self.adaptive_checkbox.toggled.connect(self.auto_step_checkbox.setDisabled)  # The sampler picks its own points
+        self.adaptive_checkbox.toggled.connect(self.step_input.setDisabled)
         step_layout.addWidget(self.auto_step_checkbox)
+        step_layout.addWidget(self.adaptive_checkbox)
         step_layout.addWidget(self.step_label)
         step_layout.addWidget(self.step_input)
+        # auto samples the live previews in float32 when it draws the same as float64
+        self.precision_label = QLabel("Precision:")
+        self.precision_input = QComboBox()
+        self.precision_input.addItems(PRECISIONS)
+        self.precision_input.setCurrentText("auto")
+        step_layout.addWidget(self.precision_label)
+        step_layout.addWidget(self.precision_input)
 
         layout.addLayout(step_layout)
 
+        # Live plotting replots a short while after the inputs stop changing
+        self.live_timer = QTimer(self)
+        self.live_timer.setSingleShot(True)
+        self.live_timer.setInterval(self.live_debounce_ms)
+        self.live_timer.timeout.connect(self.live_plot)
+        for line_edit in (self.function_input, self.min_input, self.max_input, self.step_input, self.min_y_input,
+                          self.max_y_input):
+            line_edit.textChanged.connect(self.schedule_live_plot)
+        for checkbox in (self.live_checkbox, self.auto_step_checkbox, self.adaptive_checkbox):
+            checkbox.toggled.connect(self.schedule_live_plot)
+        self.precision_input.currentTextChanged.connect(self.schedule_live_plot)
+        self.mode_input.currentTextChanged.connect(self.schedule_live_plot)
+
         # Plot button
         self.plot_button = QPushButton("Plot")
         self.plot_button.clicked.connect(partial(self.plot_function, new=True))
         layout.addWidget(self.plot_button)
 
-        # Matplotlib Figure
-        self.figure = Figure()
-        self.canvas = FigureCanvas(self.figure)
-
-        # Create the custom FigureWidget with toolbar
-        #remove the Zoom and Subplots and the button next to it
-        figure_widget = FigureWidget(self, self.canvas, exclude_toolbar_items=("Zoom","Customize"))
-        layout.addWidget(figure_widget)
+        # Export button, writes the samples of the plotted functions at full resolution
+        self.export_button = QPushButton("Export Samples")
+        self.export_button.clicked.connect(self.export_dialog)
+        layout.addWidget(self.export_button)
+
+        # Matplotlib Figure, built by ensure_figure once the window is shown since
+        # importing matplotlib takes most of the startup time
+        self.figure = None
+        self.canvas = None
+        self.figure_area = QWidget()
+        QVBoxLayout(self.figure_area).setContentsMargins(0, 0, 0, 0)
+        layout.addWidget(self.figure_area, 1)
+        self.figure_timer = QTimer(self)
+        self.figure_timer.setSingleShot(True)
+        self.figure_timer.timeout.connect(self.ensure_figure)
 
         # Zoom buttons layout
         zoom_layout = QHBoxLayout()
@@ -116,56 +249,179 @@ class FunctionPlotter(QMainWindow):
 
         layout.addLayout(zoom_layout)
 
+        # Evaluation progress of the plot in flight
+        self.progress_bar = QProgressBar()
+        self.progress_bar.setMaximumWidth(200)
+        self.progress_bar.hide()
+        self.statusBar().addPermanentWidget(self.progress_bar)
+
+        # Time spent per stage of the last plot, shown while timings are enabled
+        self.timings_label = QLabel()
+        self.timings_label.hide()
+        self.statusBar().addPermanentWidget(self.timings_label)
+        self.timing_signals = TimingSignals(self)
+        self.timing_signals.recorded.connect(self.on_span_recorded)
+        self.span_listener = self.timing_signals.recorded.emit  # Tracer listener while timings are shown
+
         self.load_stylesheet('light_mode.qss')  # Load default stylesheet
         self.show()
         logging.debug("FunctionPlotter initialized and shown")
 
+    def paintEvent(self, event):
+        super().paintEvent(event)
+        if self.figure is None and not self.figure_timer.isActive():
+            self.figure_timer.start(0)  # The window is painted, the figure comes next
+
+    def ensure_figure(self):
+        """Build the figure, its canvas and toolbar on first use."""
+        if self.figure is not None:
+            return
+        from matplotlib.figure import Figure
+        from figure_widget import FigureWidget, PlotCanvas
+
+        self.figure = Figure()
+        self.canvas = PlotCanvas(self.figure)
+        self.canvas.mpl_connect('resize_event', self.on_resize)
+
+        # Create the custom FigureWidget with toolbar
+        #remove the Zoom and Subplots and the button next to it
+        figure_widget = FigureWidget(self, self.canvas, exclude_toolbar_items=("Zoom","Customize"))
+        self.figure_area.layout().addWidget(figure_widget)
+        self.apply_theme()
+        logging.debug("Figure created")
+
     def load_stylesheet(self, filename):
-        """Load a stylesheet from a file."""
-        with open(filename, 'r') as file:
-            stylesheet = file.read()
-            self.setStyleSheet(stylesheet)
+        """Load a stylesheet from a file, cached after the first read."""
+        self.setStyleSheet(read_stylesheet(filename))
 
     def toggle_dark_mode(self, state):
         if state == Qt.Checked:
             # Apply dark mode stylesheet
             self.load_stylesheet('dark_mode.qss')
-            self.figure.patch.set_facecolor('#333')  # Set figure background color
         else:
             # Apply light mode stylesheet
             self.load_stylesheet('light_mode.qss')
-            self.figure.patch.set_facecolor('white')  # Set figure background color
 
-        # Redraw canvas after setting background color
-        self.plot_function(new=False)
-        self.canvas.draw()
+        # Restyle the figure in place, the plotted samples are kept as they are
+        self.apply_theme()
 
-    def plot_function(self, new=True):
-        self.msg_box = None  # Reset message box
-        
+    def toggle_timings(self, checked):
+        """Record the timing spans of the plotting stages and show them in the status bar."""
+        if checked:
+            tracer.add_listener(self.span_listener)
+        else:
+            tracer.remove_listener(self.span_listener)
+            self.stage_times = {}
+        self.timings_label.setVisible(checked)
+
+    def on_span_recorded(self, record):
+        if record["span"] == "draw":
+            self.stage_times["draw"] = record["seconds"]  # The last draw, not the sum of them
+        else:
+            self.stage_times[record["span"]] = self.stage_times.get(record["span"], 0.0) + record["seconds"]
+        self.timings_label.setText(" | ".join(f"{stage} {self.stage_times[stage] * 1000:.1f} ms" for stage in
+                                              ("validate", "grid", "evaluate", "filter", "decimate", "draw")
+                                              if stage in self.stage_times))
+
+    def closeEvent(self, event):
+        self.timings_checkbox.setChecked(False)  # Stop receiving spans
+        if self.export_job is not None:
+            self.export_job.cancel()  # The partial file is removed
+        self.cancel_view_job()
+        if self.sample_cache is not None:
+            logging.info("Sample cache: %s", self.sample_cache.stats())
+        super().closeEvent(event)
+
+    def show_message(self, icon, title, text):
+        """Show a message box, without blocking when driven by the test bot."""
+        self.msg_box = QMessageBox(self)
+        self.msg_box.setIcon(icon)
+        self.msg_box.setText(text)
+        self.msg_box.setWindowTitle(title)
+        if not self.is_testing_bot:
+            self.msg_box.exec_()
+
+    def report(self, icon, title, text, new, live=False):
+        """Tell the user about a problem: a message box for a new plot, the status bar while typing."""
         if new:
+            self.show_message(icon, title, text)
+        elif live:
+            self.statusBar().showMessage(text, 5000)
+
+    def schedule_live_plot(self):
+        """Restart the live plot debounce timer, dropping the plot in flight which is now stale."""
+        if not self.live_checkbox.isChecked():
+            return
+        self.cancel_plot()
+        self.live_timer.start()
+
+    def live_plot(self):
+        inputs = (self.expression_cache.normalize(self.function_input.text()), self.min_input.text().strip(),
+                  self.max_input.text().strip(), self.step_input.text().strip(),
+                  self.auto_step_checkbox.isChecked(), self.adaptive_checkbox.isChecked(),
+                  self.precision_input.currentText(), self.mode_input.currentText(), self.min_y_input.text().strip(),
+                  self.max_y_input.text().strip())
+        if inputs == self.last_live_inputs and self.curves:
+            return  # Only whitespace changed
+        self.last_live_inputs = inputs
+        self.live_started = time.perf_counter()
+        self.plot_function(new=False, live=True)
+
+    def cancel_plot(self):
+        """Cancel the plot in flight, if any."""
+        if self.current_job is not None:
+            self.current_job.cancel()
+            self.current_job = None
+            self.progress_bar.hide()
+        self.cancel_view_job()
+
+    def cancel_view_job(self):
+        if self.view_job is not None:
+            self.view_job.cancel()
+            self.view_job = None
+
+    def plot_function(self, new=True, live=False):
+        self.msg_box = None  # Reset message box
+        self.cancel_plot()  # A newer request supersedes the one in flight
+        self.stage_times = {}
+        self.ensure_figure()
+        if self.mode_input.currentText() != PLOT_MODES[0]:
+            self.plot_surface(new, live)
+            return
+
+        if new or live:
             self.func = self.function_input.text()
             self.min_x = self.min_input.text()
             self.max_x = self.max_input.text()
-        logging.debug(f"Plotting function: {self.func}")
-        if new:
-        # Validate the function expression
-            validation_result, validation_message = self.checker.validate_function(self.func)
-            if not validation_result:
-                if new:
-                    self.msg_box = QMessageBox(self)
-                    self.msg_box.setIcon(QMessageBox.Critical)
-                    self.msg_box.setText(f"Function validation error: {validation_message}")
-                    self.msg_box.setWindowTitle("Function Error")
-                    if not self.is_testing_bot:
-                        self.msg_box.exec_()
-                logging.error(f"Function validation error: {validation_message}")
-                #clear the plot
-                self.figure.clear()
+        logging.debug("Plotting function: %s", self.func)
+        # Functions separated by ';' are overlaid. Validation verdicts and compiled
+        # forms come from the cache on repeated plots.
+        funcs = [func for func in self.func.split(";") if func.strip()] or [self.func]
+        with tracer.span("validate", functions=len(funcs)):
+            expressions = [self.expression_cache.lookup(func) for func in funcs]
+        for number, expression in enumerate(expressions, start=1):
+            if not expression.valid:
+                message = expression.message if len(funcs) == 1 else f"function {number}: {expression.message}"
+                self.report(QMessageBox.Critical, "Function Error", f"Function validation error: {message}", new, live)
+                logging.error("Function validation error: %s", message)
+                if not live:
+                    #clear the plot, live plotting keeps the last valid one while typing
+                    self.clear_plot()
                 return
 
-        self.func = self.func.replace(" ", "")  # Remove spaces for easier processing
-        self.func = self.func.replace("^", "**") # Replace ^ with ** for power
+        derivative, integral = self.derivative_checkbox.isChecked(), self.integral_checkbox.isChecked()
+        if derivative:
+            # Derivatives follow the functions in the request, the worker draws them where their function is defined
+            with tracer.span("differentiate", functions=len(expressions)):
+                expressions += [self.expression_cache.lookup(format_expression(differentiate(
+                    expression.compiled.tree))) for expression in expressions]
+            for expression in expressions[len(funcs):]:
+                if not expression.valid:
+                    self.report(QMessageBox.Critical, "Function Error", f"Derivative error: {expression.message}",
+                                new, live)
+                    logging.error("Derivative error: %s", expression.message)
+                    return
+
         try:
             # Validate min_x and max_x
             self.min_x = float(self.min_x)
@@ -173,136 +429,501 @@ class FunctionPlotter(QMainWindow):
             if self.min_x >= self.max_x:
                 raise ValueError("min_x should be less than max_x")
         except ValueError as e:
-            if new:
-                self.msg_box = QMessageBox(self)
-                self.msg_box.setIcon(QMessageBox.Critical)
-                self.msg_box.setText(f"Invalid min or max x values: {e}")
-                self.msg_box.setWindowTitle("Input Error")
-                if not self.is_testing_bot:
-                    self.msg_box.exec_()
-            logging.error(f"Invalid min or max x values: {e}")
+            self.report(QMessageBox.Critical, "Input Error", f"Invalid min or max x values: {e}", new, live)
+            logging.error("Invalid min or max x values: %s", e)
             return
 
         # Determine step size
-        if self.auto_step_checkbox.isChecked():
+        adaptive = self.adaptive_checkbox.isChecked()
+        if adaptive:
+            self.step_size = None  # Chosen locally by the adaptive sampler
+        elif self.auto_step_checkbox.isChecked():
             self.step_size = (self.max_x - self.min_x) / 400  # Auto calculate step size
         else:
-            if new:
+            if new or live:
                 self.step_size = self.step_input.text()
 
+        if not adaptive:
+            try:
+                self.step_size = float(self.step_size)
+                if self.step_size <= 0:
+                    raise ValueError("step size should be positive")
+            except (TypeError, ValueError) as e:
+                self.report(QMessageBox.Critical, "Input Error", f"Invalid step size: {e}", new, live)
+                logging.error("Invalid step size: %s", e)
+                return
+
+        # Sampling and evaluation run on a worker, drawing happens in on_plot_finished.
+        # Functions already sampled on the same grid are not evaluated again.
+        grid = (self.min_x, self.max_x, self.step_size, adaptive, self.adaptive_max_points, self.adaptive_tolerance,
+                self.canvas.width(), self.memory_budget)
+        precision = self.precision_input.currentText()
+        # Derivatives are known by their label, their samples depend on the function they are taken of
+        keys = [expression.compiled.text for expression in expressions[:len(funcs)]]
+        keys += [f"d/dx ({key})" for key in keys if derivative]
+        known = tuple(self.curve_results.get(key) if grid + (precision,) == self.curve_grid else None
+                      for key in keys)
+        request = PlotRequest(tuple(expressions), *grid, new, live, known=known, cache=self.sample_cache,
+                              parallel=self.parallel, precision=precision, overlays=(derivative, integral),
+                              n_rows=max(int(self.ensure_axes().bbox.height), 1))
+        if live:
+            # Cheap preview first, the full resolution plot follows once it is drawn
+            preview_step = (self.max_x - self.min_x) / self.live_preview_points
+            if adaptive:
+                request = request._replace(max_points=self.live_preview_points, known=None, refine=request)
+            elif preview_step > self.step_size:
+                request = request._replace(step_size=preview_step, known=None, refine=request)
+        self.start_job(request)
+
+    def toggle_overlays(self):
+        """Replot with the derivatives and integrals checked, the functions already plotted are not sampled again."""
+        if self.curves and self.curve_grid is not None and self.mode_input.currentText() == PLOT_MODES[0]:
+            # The view limits replaced the requested range once drawn, the overlays go on the grid last sampled
+            self.min_x, self.max_x, self.step_size = self.curve_grid[:3]
+            self.plot_function(new=False)
+
+    def on_mode_changed(self, mode):
+        """Show the inputs of a plot mode."""
+        surface = mode != PLOT_MODES[0]
+        self.function_label.setText({PLOT_MODES[0]: "f(x):", PLOT_MODES[1]: "g(x, y):", PLOT_MODES[2]: "f(x, y):"}[mode])
+        self.function_input.setPlaceholderText({PLOT_MODES[0]: "e.g., 5*x^3 + 2*x, or several separated by ';'",
+                                                PLOT_MODES[1]: "e.g., x^2 + y^2 = 1",
+                                                PLOT_MODES[2]: "e.g., x*y/(x^2 + y^2 + 1)"}[mode])
+        for widget in (self.min_y_label, self.min_y_input, self.max_y_label, self.max_y_input):
+            widget.setVisible(surface)
+
+    def plot_surface(self, new, live):
+        """Plot the curve where a function of x and y is zero, or its heatmap, over the x and y ranges."""
+        mode = self.mode_input.currentText()
+        func = self.function_input.text()
+        logging.debug("Plotting %s: %s", mode, func)
+        with tracer.span("validate", functions=1):
+            expression = self.surface_expression_caches[mode].lookup(func)
+        if not expression.valid:
+            self.report(QMessageBox.Critical, "Function Error", f"Function validation error: {expression.message}",
+                        new, live)
+            logging.error("Function validation error: %s", expression.message)
+            if not live:
+                self.clear_plot()
+            return
         try:
-            self.step_size = float(self.step_size)
+            ranges = [float(line_edit.text()) for line_edit in (self.min_input, self.max_input, self.min_y_input,
+                                                                 self.max_y_input)]
+            if ranges[0] >= ranges[1] or ranges[2] >= ranges[3]:
+                raise ValueError("min should be less than max")
         except ValueError as e:
-            if new:
-                self.msg_box = QMessageBox(self)
-                self.msg_box.setIcon(QMessageBox.Critical)
-                self.msg_box.setText(f"Invalid step size: {e}")
-                self.msg_box.setWindowTitle("Input Error")
-                if not self.is_testing_bot:
-                    self.msg_box.exec_()
-            logging.error(f"Invalid step size: {e}")
+            self.report(QMessageBox.Critical, "Input Error", f"Invalid x or y range: {e}", new, live)
+            logging.error("Invalid x or y range: %s", e)
             return
-
-        # Generate x values
-        x = np.arange(self.min_x, self.max_x, self.step_size)
-        initial_x_len = len(x)
-
-        # Evaluate function and filter out infinite, NaN, or problematic values
-        try:
-            y = np.array([eval(self.func, {"x": xi, "np": np, "log10": np.log10, "sqrt": np.sqrt}) for xi in x])
-            
-            # Remove points where y is infinite, NaN, or has division by zero errors
-            finite_mask = np.isfinite(y) & (y != np.inf) & (y != -np.inf)
-            x = x[finite_mask]
-            y = y[finite_mask]
-
-            removed_points = initial_x_len - len(x)
-            if removed_points > 0:
-                if new:
-                    self.msg_box = QMessageBox(self)
-                    self.msg_box.setIcon(QMessageBox.Warning)
-                    self.msg_box.setText(f"Warning: {removed_points} points were removed due to invalid values.")
-                    self.msg_box.setWindowTitle("Warning")
-                    if not self.is_testing_bot:
-                        self.msg_box.exec_()
-                logging.warning(f"Warning: {removed_points} points were removed due to invalid values.")
-            
-            if len(x) == 0:  # Check if x is empty
-                if new:
-                    self.msg_box = QMessageBox(self)
-                    self.msg_box.setIcon(QMessageBox.Warning)
-                    self.msg_box.setText("No valid points to plot.")
-                    self.msg_box.setWindowTitle("Warning")
-                    if not self.is_testing_bot:
-                        self.msg_box.exec_()
+        ax = self.ensure_axes()
+        self.start_job(SurfaceRequest(expression, mode == PLOT_MODES[1], *ranges, max(int(ax.bbox.width), 1),
+                                      max(int(ax.bbox.height), 1), new, live))
+
+    def draw_surface(self, request, result):
+        """Draw the implicit curve or the heatmap a SurfaceJob computed."""
+        new, live = request.new, request.live
+        text = request.expression.compiled.text
+        ax = self.ensure_axes()
+        self.remove_image()
+        self.curves = []  # Nothing to decimate or resample when zooming
+        self.curve_grid, self.curve_results = None, {}
+        self.sampled_view = None
+        line = self.ensure_lines(1)[0]
+        line.set_data([], [])
+        if request.implicit:
+            if len(result.x) == 0:
+                self.report(QMessageBox.Warning, "Warning", "No points of the curve in the range.", new, live)
+                logging.warning("No points of the curve in the range.")
+            line.set_data(result.x, result.y)
+            ax.set_title(f"Plot of {text} = 0")
+            logging.debug("Implicit curve traced with %d evaluations, cells per level %s", result.evaluations,
+                          result.cells)
+        else:
+            if result.min_z is None:
+                self.report(QMessageBox.Warning, "Warning", "No valid points to plot.", new, live)
                 logging.warning("No valid points to plot.")
                 return
-        
-            self.min_x = min(x)
-            self.max_x = max(x)
-            self.min_y = min(y)
-            self.max_y = max(y)
-
-        except ZeroDivisionError as e:
-            if new:
-                self.msg_box = QMessageBox(self)
-                self.msg_box.setIcon(QMessageBox.Critical)
-                self.msg_box.setText(f"Division by zero error in function: {e}")
-                self.msg_box.setWindowTitle("Math Error")
-                if not self.is_testing_bot:
-                    self.msg_box.exec_()
-            logging.error(f"Division by zero error in function: {e}")
+            if result.removed_points > 0:
+                self.report(QMessageBox.Warning, "Warning", f"Warning: {result.removed_points} points were removed due to invalid values.", new, live)
+                logging.warning("Warning: %d points were removed due to invalid values.", result.removed_points)
+            self.image = ax.imshow(result.z, extent=result.extent, origin="lower", aspect="auto",
+                                   interpolation="nearest", vmin=result.min_z, vmax=result.max_z)
+            ax.set_title(f"Plot of z = {text}, from {result.min_z:.4g} to {result.max_z:.4g}")
+        if ax.get_legend() is not None:
+            ax.get_legend().remove()
+        ax.set_ylabel("y")
+        ax.set_visible(True)
+        self.surface_shown = True
+        self.min_x, self.max_x, self.min_y, self.max_y = request[2:6]
+        self.apply_theme()
+        self.apply_zoom()
+
+    def remove_image(self):
+        """Remove the heatmap, if any."""
+        if self.image is not None:
+            self.image.remove()
+            self.image = None
+
+    def start_job(self, request):
+        """Sample a function on a worker, its result is drawn by on_plot_finished."""
+        job = SurfaceJob(request) if isinstance(request, SurfaceRequest) else PlotJob(request)
+        job.signals.progress.connect(self.on_plot_progress)
+        job.signals.finished.connect(self.on_plot_finished)
+        job.signals.failed.connect(self.on_plot_failed)
+        self.current_job = job
+        if self.is_testing_bot:
+            job.run()  # Complete synchronously so the test bot sees the result right after the click
+        else:
+            self.progress_bar.setValue(0)
+            self.progress_bar.show()
+            self.thread_pool.start(job)
+
+    def wait_for_plot(self, msecs=-1):
+        """Block until the plot in flight is computed and drawn."""
+        self.thread_pool.waitForDone(msecs)
+        QCoreApplication.processEvents()
+
+    def on_plot_progress(self, job, percent):
+        if job is self.current_job:
+            self.progress_bar.setValue(percent)
+
+    def on_plot_failed(self, job):
+        if job is not self.current_job:
+            return  # Superseded by a newer request
+        self.current_job = None
+        self.progress_bar.hide()
+        e = job.error
+        new, live = job.request.new, job.request.live
+        if isinstance(e, ZeroDivisionError):
+            self.report(QMessageBox.Critical, "Math Error", f"Division by zero error in function: {e}", new, live)
+            logging.error("Division by zero error in function: %s", e)
+        else:
+            self.report(QMessageBox.Critical, "Function Error", f"Error in function: {e}", new, live)
+            logging.error("Error in function: %s", e)
+
+    def on_plot_finished(self, job):
+        if job is not self.current_job:
+            return  # Superseded by a newer request
+        self.current_job = None
+        self.progress_bar.hide()
+        request, results = job.request, job.result
+        if isinstance(request, SurfaceRequest):
+            self.draw_surface(request, results)
             return
-        except Exception as e:
-            if new:
-                self.msg_box = QMessageBox(self)
-                self.msg_box.setIcon(QMessageBox.Critical)
-                self.msg_box.setText(f"Error in function: {e}")
-                self.msg_box.setWindowTitle("Function Error")
-                if not self.is_testing_bot:
-                    self.msg_box.exec_()
-            logging.error(f"Error in function: {e}")
+        if request.cache is not None and request.refine is None:
+            logging.debug("Sample cache: hits %d, misses %d", request.cache.hits, request.cache.misses)
+        new, live = request.new, request.live and request.refine is None  # Previews report nothing
+        texts = [expression.compiled.text for expression in request.expressions]
+        # The functions come first, then their derivatives; their integrals are computed from their samples
+        derivative, integral = request.overlays
+        n_functions = len(texts) // 2 if derivative else len(texts)
+        functions = texts[:n_functions]
+        labels = functions + [f"d/dx ({text})" for text in functions if derivative]
+        if request.refine is None:
+            # Keep the samples of the plotted functions only, for adding or removing one later
+            self.curve_grid = tuple(request[1:9]) + (request.precision,)
+            self.curve_results = dict(zip(labels, results))
+            self.curve_functions = functions
+
+        samplers = [expression.compiled.evaluate for expression in request.expressions]
+        for number, expression in enumerate(request.expressions[:n_functions] if derivative else []):
+            # Resampled views of derivatives are masked with their function, where it can be undefined
+            if may_be_undefined(expression.compiled.tree):
+                samplers[n_functions + number] = partial(evaluate_on_domain,
+                                                         request.expressions[n_functions + number].compiled,
+                                                         expression.compiled)
+        if integral:
+            with tracer.span("integrate", functions=n_functions):
+                results = list(results) + [integral_samples(result) for result in results[:n_functions]]
+            texts = texts + [f"∫ ({text}) dx" for text in functions]
+            labels = labels + texts[-n_functions:]
+            samplers = samplers + [None] * n_functions  # Only defined over the sampled interval
+
+        removed_points = sum(result.removed_points for result in results[:n_functions])
+        if removed_points > 0:
+            self.report(QMessageBox.Warning, "Warning", f"Warning: {removed_points} points were removed due to invalid values.", new, live)
+            logging.warning("Warning: %d points were removed due to invalid values.", removed_points)
+
+        plotted = [result for result in results if len(result.x)]
+        if not plotted:  # Check if x is empty
+            self.report(QMessageBox.Warning, "Warning", "No valid points to plot.", new, live)
+            logging.warning("No valid points to plot.")
             return
 
-        self.figure.clear()
-        ax = self.figure.add_subplot(111)
-        ax.plot(x, y)
-        ax.set_xlabel("x")
+        self.min_x, self.max_x = min(r.min_x for r in plotted), max(r.max_x for r in plotted)
+        self.min_y, self.max_y = min(r.min_y for r in plotted), max(r.max_y for r in plotted)
+
+        ax = self.ensure_axes()
+        ax.set_visible(True)
+        self.remove_image()
+        self.surface_shown = False
         ax.set_ylabel("f(x)")
-        ax.set_title(f"Plot of {self.func}")
+        self.curves = [Curve(text, line) for text, line in zip(texts, self.ensure_lines(len(texts)))]
+
+        # Auto step plots follow the view: zooming and panning resample the visible interval
+        follow_view = self.auto_step_checkbox.isChecked() and not request.adaptive
+        kept_samplers = self.viewport_samplers if follow_view else {}
+        styles = ["-"] + ["--"] * derivative + [":"] * integral
+        self.viewport_samplers = {}
+        expressions = list(request.expressions) + [None] * (len(results) - len(request.expressions))
+        for number, (curve, label, evaluate, result) in enumerate(zip(self.curves, labels, samplers, results)):
+            curve.expression = expressions[number]
+            if derivative and n_functions <= number < 2 * n_functions:
+                curve.function = self.curves[number - n_functions]
+            if result.decimated and curve.expression is not None:
+                curve.streamed_grid = (request.min_x, request.max_x, request.step_size, request.precision)
+            if follow_view and evaluate is not None:
+                curve.viewport_sampler = kept_samplers.get(label) or TileCache(evaluate)
+                self.viewport_samplers[label] = curve.viewport_sampler
+            curve.x_data, curve.y_data = result.x, result.y  # Already reduced to the canvas width when streamed
+            curve.breaks = result.breaks
+            curve.line.set_data(*insert_breaks(*minmax_decimate(result.x, result.y, ax.bbox.width), curve.breaks))
+            curve.line.set_label(label)
+            # Overlays take the color of their function, dashed for derivatives and dotted for integrals
+            curve.line.set_color(f"C{number % n_functions}")
+            curve.line.set_linestyle(styles[number // n_functions])
+            curve.holds_full_data = len(result.x) <= 4 * ax.bbox.width
+        self.sampled_view = (request.min_x, request.max_x, request.step_size) if follow_view else None
+        ax.set_title(f"Plot of {', '.join(functions)}")
+        if len(self.curves) > 1:
+            ax.legend()
+        elif ax.get_legend() is not None:
+            ax.get_legend().remove()
 
         # Apply dark mode styles if enabled
-        if self.dark_mode_checkbox.isChecked():
-            ax.set_facecolor('#333')
-            ax.tick_params(colors='white')
-            ax.spines['bottom'].set_color('white')
-            ax.spines['top'].set_color('white')
-            ax.spines['right'].set_color('white')
-            ax.spines['left'].set_color('white')
-            ax.title.set_color('white')
-            ax.xaxis.label.set_color('white')
-            ax.yaxis.label.set_color('white')
-        else:
-            ax.set_facecolor('white')
-            ax.tick_params(colors='black')
-            ax.spines['bottom'].set_color('black')
-            ax.spines['top'].set_color('black')
-            ax.spines['right'].set_color('black')
-            ax.spines['left'].set_color('black')
-            ax.title.set_color('black')
-            ax.xaxis.label.set_color('black')
-            ax.yaxis.label.set_color('black')
-        
-        if len(y) > 0:
-            self.min_y = min(y)
-            self.max_y = max(y)
-        
-        # Apply zoom
-        self.apply_zoom()
+        self.apply_theme()
 
-        self.canvas.draw()
+        # Apply zoom, setting the limits refreshes the line data through update_view
+        self.apply_zoom()
+        self.update_view(ax)
         logging.debug("Function plotted")
 
+        if request.refine is not None:
+            latency = time.perf_counter() - self.live_started
+            if latency > self.live_latency_budget:
+                logging.warning("Live preview took %.1f ms, over the %.0f ms budget", latency * 1000,
+                                self.live_latency_budget * 1000)
+            self.start_job(request.refine)
+
+    def export_dialog(self):
+        """Ask for a file and export the samples of the plotted functions to it."""
+        if not self.curves or self.curve_grid is None:
+            self.report(QMessageBox.Warning, "Warning", "Plot a function before exporting its samples.", True)
+            return
+        path, chosen_filter = QFileDialog.getSaveFileName(self, "Export Samples", "",
+                                                          "CSV (*.csv);;NumPy array (*.npy);;Raw binary (*.raw)")
+        if not path:
+            return
+        if not os.path.splitext(path)[1]:
+            path += "." + re.search(r"\*\.(\w+)", chosen_filter).group(1)
+        self.export_samples(path)
+
+    def export_samples(self, path):
+        """Write the samples of the last full resolution plot to path, in the format of its extension.
+
+        The functions are evaluated again chunk by chunk on a worker, so the
+        whole series is never held in memory. Several overlaid functions go to
+        one file each, numbered after path. Each file gets a .json file with
+        its sampling metadata.
+        """
+        texts = self.curve_functions
+        stem, ext = os.path.splitext(path)
+        paths = [path] if len(texts) == 1 else [f"{stem}_{number}{ext}" for number in range(1, len(texts) + 1)]
+        expressions = tuple(self.expression_cache.lookup(text) for text in texts)
+        request = PlotRequest(expressions, *self.curve_grid[:8], True, False, parallel=self.parallel,
+                              precision=self.curve_grid[8])
+        if self.export_job is not None:
+            self.export_job.cancel()
+        job = ExportJob(request, paths)
+        job.signals.progress.connect(self.on_export_progress)
+        job.signals.finished.connect(self.on_export_finished)
+        job.signals.failed.connect(self.on_export_failed)
+        self.export_job = job
+        self.statusBar().showMessage(f"Exporting samples to {path}...")
+        if self.is_testing_bot:
+            job.run()
+        else:
+            self.progress_bar.setValue(0)
+            self.progress_bar.show()
+            self.thread_pool.start(job)
+
+    def on_export_progress(self, job, percent):
+        if job is self.export_job:
+            self.progress_bar.setValue(percent)
+
+    def on_export_failed(self, job):
+        if job is not self.export_job:
+            return
+        self.export_job = None
+        self.progress_bar.hide()
+        self.report(QMessageBox.Critical, "Export Error", f"Could not export the samples: {job.error}", True)
+        logging.error("Could not export the samples: %s", job.error)
+
+    def on_export_finished(self, job):
+        if job is not self.export_job:
+            return
+        self.export_job = None
+        self.progress_bar.hide()
+        rows = sum(metadata["rows"] for metadata in job.result)
+        self.statusBar().showMessage(f"Exported {rows} samples to {', '.join(job.paths)}", 5000)
+        logging.info("Exported %d samples to %s", rows, ", ".join(job.paths))
+
+    def ensure_axes(self):
+        """Return the axes of the plot, creating it and its line on first use."""
+        if self.ax is None:
+            self.ensure_figure()
+            self.ax = self.figure.add_subplot(111)
+            self.ax.set_autoscale_on(False)  # Limits are always set explicitly by apply_zoom
+            self.lines = self.ax.plot([], [], color="C0")
+            self.ax.set_xlabel("x")
+            self.ax.set_ylabel("f(x)")
+            self.ax.callbacks.connect('xlim_changed', self.update_view)
+        return self.ax
+
+    def ensure_lines(self, count):
+        """Return count lines, one per overlaid function, adding and removing lines as needed."""
+        ax = self.ensure_axes()
+        while len(self.lines) < count:
+            self.lines += ax.plot([], [], color=f"C{len(self.lines)}")  # Stable color per position
+        while len(self.lines) > max(count, 1):
+            self.lines.pop().remove()
+        return self.lines[:count]
+
+    def apply_theme(self):
+        """Restyle the figure when the theme differs from the one last applied."""
+        theme = "dark" if self.dark_mode_checkbox.isChecked() else "light"
+        if theme == self.applied_theme or self.figure is None:
+            return  # A figure built later is styled by ensure_figure
+        self.figure.patch.set_facecolor(THEMES[theme]["background"])  # Set figure background color
+        if self.ax is not None:
+            style_axes(self.ax, theme)
+            self.applied_theme = theme  # Otherwise styled along with the axes of the first plot
+        self.canvas.draw_idle()
+
+    def clear_plot(self):
+        """Hide the plot, keeping the axes and line for the next one."""
+        if self.ax is not None:
+            self.curves = []
+            self.viewport_samplers = {}
+            self.remove_image()
+            for line in self.lines:
+                line.set_data([], [])
+            self.ax.set_visible(False)
+            self.canvas.draw_idle()
+
+    def update_view(self, ax):
+        """Refresh the line data for the current view and canvas size."""
+        if not self.curves:
+            return
+        if self.sampled_view is not None:
+            self.resample_view(ax)
+        else:
+            self.decimate_view(ax)
+
+    def decimate_view(self, ax, curves=None):
+        """Draw the full resolution samples of the curves, all by default, reduced to min/max per pixel column."""
+        changed = False
+        streamed = []
+        for curve in self.curves if curves is None else curves:
+            if curve.streamed_grid is not None:
+                streamed.append(curve)
+            if len(curve.x_data) <= 4 * ax.bbox.width:
+                # Few enough samples to draw them all, whatever the view
+                if not curve.holds_full_data:
+                    curve.line.set_data(*insert_breaks(curve.x_data, curve.y_data, curve.breaks))
+                    curve.holds_full_data = changed = True
+                continue
+            min_x, max_x = ax.get_xlim()
+            x, y = minmax_decimate(curve.x_data, curve.y_data, ax.bbox.width, min_x, max_x)
+            curve.line.set_data(*insert_breaks(x, y, curve.breaks))
+            curve.holds_full_data = False
+            changed = True
+        if changed:
+            self.canvas.draw_idle()
+        if streamed:
+            self.stream_view(ax, streamed)
+
+    def stream_view(self, ax, curves):
+        """Sample the visible part of grids too large to keep again, for the full resolution of a zoomed view.
+
+        Only the reduction of such grids to the canvas columns is held, which
+        zoomed in draws as blocks. A worker streams the visible grid points at
+        the step size of the plot and reduces them to the columns of the view,
+        their line data is replaced once done.
+        """
+        self.cancel_view_job()
+        grid_min, grid_max, step_size, precision = curves[0].streamed_grid
+        view_min, view_max = ax.get_xlim()
+        # Grid points of the plot around the view, the samples drawn are those of the full grid
+        min_x = grid_min + max(np.floor((view_min - grid_min) / step_size) - 1, 0) * step_size
+        max_x = min(grid_min + (np.ceil((view_max - grid_min) / step_size) + 1) * step_size, grid_max)
+        if max_x <= min_x or max_x - min_x >= grid_max - grid_min:
+            return  # The whole grid is visible, its reduction to the canvas columns is what is drawn
+        # Derivatives follow their functions, which are streamed along with them, to be kept where those are defined
+        derivatives = [curve for curve in curves if curve.function is not None]
+        curves = [curve for curve in curves if curve.function is None] + derivatives
+        request = PlotRequest(tuple(curve.expression for curve in curves), min_x, max_x, step_size, False,
+                              self.adaptive_max_points, self.adaptive_tolerance, max(int(ax.bbox.width), 1),
+                              self.memory_budget, False, False, parallel=self.parallel, precision=precision,
+                              overlays=(bool(derivatives), False))
+        job = PlotJob(request)
+        job.curves = curves
+        job.signals.finished.connect(self.on_view_finished)
+        job.signals.failed.connect(self.on_view_failed)
+        self.view_job = job
+        if self.is_testing_bot:
+            job.run()
+        else:
+            self.thread_pool.start(job)
+
+    def on_view_finished(self, job):
+        if job is not self.view_job:
+            return  # Superseded by another view or plot
+        self.view_job = None
+        ax = self.ensure_axes()
+        for curve, result in zip(job.curves, job.result):
+            if curve in self.curves:
+                x, y = minmax_decimate(result.x, result.y, ax.bbox.width)
+                curve.line.set_data(*insert_breaks(x, y, curve.breaks))
+                curve.holds_full_data = False
+        self.canvas.draw_idle()
+
+    def on_view_failed(self, job):
+        if job is self.view_job:
+            self.view_job = None
+            logging.debug("Sampling the view failed, keeping the reduced samples: %s", job.error)
+
+    def on_resize(self, event):
+        if self.ax is not None:
+            self.update_view(self.ax)
+
+    def resample_view(self, ax):
+        """Re-evaluate the visible x interval at about screen resolution after a zoom or pan."""
+        if self.sampled_view is None:
+            return
+        min_x, max_x = ax.get_xlim()
+        width = max(int(ax.bbox.width), 1)
+        sampled_min, sampled_max, spacing = self.sampled_view
+        if sampled_min - spacing <= min_x and max_x <= sampled_max + spacing and spacing <= 2 * (max_x - min_x) / width:
+            return  # Samples already drawn are dense enough for this view
+
+        # Integrals have no function to resample, their samples are decimated instead
+        resampled = [curve for curve in self.curves if curve.viewport_sampler is not None]
+        self.decimate_view(ax, [curve for curve in self.curves if curve.viewport_sampler is None])
+        view = None
+        for curve in resampled:
+            x, y = curve.viewport_sampler.sample(min_x, max_x, width)  # Same grid for every function
+            if len(x) < 2:
+                continue
+            view = (x[0], x[-1], x[1] - x[0])
+            finite_mask = np.isfinite(y)
+            curve.line.set_data(*insert_breaks(x[finite_mask], y[finite_mask], curve.breaks))
+            curve.holds_full_data = False
+            logging.debug("Resampled %s over [%s, %s], tiles: %s", curve.text, min_x, max_x,
+                          curve.viewport_sampler.stats())
+        if view is not None:
+            self.sampled_view = view
+        self.canvas.draw_idle()
 
     def update_zoom(self, axis, factor):
         if axis == 'x':
@@ -310,7 +931,7 @@ class FunctionPlotter(QMainWindow):
         elif axis == 'y':
             self.zoom_y *= factor
         self.apply_zoom()
-        logging.debug(f"Zoom {axis} updated to {self.zoom_x if axis == 'x' else self.zoom_y}")
+        logging.debug("Zoom %s updated to %s", axis, self.zoom_x if axis == 'x' else self.zoom_y)
 
     def reset_zoom(self):
         self.zoom_x = 1.0
@@ -319,14 +940,14 @@ class FunctionPlotter(QMainWindow):
         logging.debug("Zoom reset")
 
     def apply_zoom(self, reset=False):
-        ax = self.figure.gca()
+        ax = self.ensure_axes()
         if reset:
             ax.set_xlim(self.min_x, self.max_x)
-            ax.set_ylim(auto=True)
+            if self.surface_shown:
+                ax.set_ylim(self.min_y, self.max_y)
+            else:
+                ax.set_ylim(auto=True)
         else:
-            xlim = ax.get_xlim()
-            ylim = ax.get_ylim()
-
             x_center = (self.max_x + self.min_x) / 2
             y_center = (self.max_y + self.min_y) / 2
 
@@ -336,4 +957,4 @@ class FunctionPlotter(QMainWindow):
             ax.set_xlim(x_center - x_range / 2, x_center + x_range / 2)
             ax.set_ylim(y_center - y_range / 2, y_center + y_range / 2)
 
-        self.canvas.draw()
+        self.canvas.draw_idle()  # Coalesced with the other redraws of this event loop turn
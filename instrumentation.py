@@ -0,0 +1,104 @@
+import json
+import threading
+import time
+
+
+class _Span:
+    """Times the block it wraps and hands the record to its tracer on exit."""
+    __slots__ = ("tracer", "name", "fields", "started", "wall_time")
+
+    def __init__(self, tracer, name, fields):
+        self.tracer = tracer
+        self.name = name
+        self.fields = fields
+
+    def __enter__(self):
+        self.wall_time = time.time()
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        seconds = time.perf_counter() - self.started
+        record = {"span": self.name, "time": self.wall_time, "seconds": seconds,
+                  "thread": threading.current_thread().name}
+        record.update(self.fields)
+        if exc_type is not None:
+            record["error"] = exc_type.__name__
+        self.tracer.record(record)
+        return False
+
+
+class _NoSpan:
+    """Span of a disabled tracer, doing nothing."""
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        return False
+
+
+_NO_SPAN = _NoSpan()
+
+
+class Tracer:
+    """Collects timing spans of the plotting stages.
+
+    Disabled, span() returns a shared no-op context manager and nothing is
+    measured. Enabled, every span produces a record dict with the span name,
+    its start as a Unix time, its duration in seconds, the thread it ran on and
+    the fields given to span(). Records are passed to each listener, from the
+    thread the span ran on.
+    """
+    def __init__(self):
+        self.enabled = False
+        self.listeners = []
+        self.latest = {}  # Last record of each span name
+
+    def span(self, name, **fields):
+        """Return a context manager timing the block it wraps as the span name."""
+        if not self.enabled:
+            return _NO_SPAN
+        return _Span(self, name, fields)
+
+    def record(self, record):
+        self.latest[record["span"]] = record
+        for listener in self.listeners:
+            listener(record)
+
+    def add_listener(self, listener):
+        """Pass the records to listener and enable the tracer."""
+        self.listeners.append(listener)
+        self.enabled = True
+
+    def remove_listener(self, listener):
+        """Stop passing records to listener, the tracer is disabled once no listener is left."""
+        self.listeners.remove(listener)
+        self.enabled = bool(self.listeners)
+
+
+class JsonLinesWriter:
+    """Tracer listener appending each record to a file as one line of JSON.
+
+    Parameters
+    ----------
+    path : str
+       file the records are appended to
+    """
+    def __init__(self, path):
+        self.file = open(path, "a")
+        self._lock = threading.Lock()  # Spans are recorded from worker threads too
+
+    def __call__(self, record):
+        line = json.dumps(record, default=float) + "\n"
+        with self._lock:
+            self.file.write(line)
+            self.file.flush()
+
+    def close(self):
+        self.file.close()
+
+
+# Tracer of the application, shared by the GUI, the pipeline and the workers
+tracer = Tracer()
@@ -0,0 +1,217 @@
+from collections import namedtuple
+import numpy as np
+from expression_parser import BinaryOp, Call, Number, UnaryOp, Variable, as_float
+
+# Where a function cannot be drawn as one connected line over [min_x, max_x]:
+# poles and domain edges as sorted x positions, along with bounds of f away from the poles
+RangeAnalysis = namedtuple("RangeAnalysis", ["poles", "edges", "min_y", "max_y"])
+
+INITIAL_INTERVALS = 256  # Sub-intervals bounded before refining around the singularities
+MAX_CANDIDATES = 64  # More suspected singularities than this are taken as overestimation and ignored
+RELATIVE_WIDTH = 1e-15  # Refinement stops once the sub-intervals are this narrow relative to the range,
+MAX_SUBDIVISIONS = 16  # or after this many subdivisions, when float spacing is reached first
+PIECES = 16  # Each suspected sub-interval is cut into this many per subdivision
+POLE_GROWTH = 10.0  # |f| must grow this much towards a suspected pole for it to be one
+
+
+def bounds(node, lo, hi):
+    """Bound an expression over each sub-interval [lo, hi] of x with interval arithmetic.
+
+    Expressions in several variables take lo and hi as dicts of arrays by
+    variable name, bounding the expression over boxes of the variables.
+
+    Returns lower and upper bound arrays, NaN where the expression is defined
+    nowhere on the sub-interval, and two boolean arrays: pole where the
+    expression may be unbounded because of a division by zero, and partial
+    where it is undefined on part of the sub-interval.
+    """
+    if not isinstance(lo, dict):
+        lo, hi = {"x": lo}, {"x": hi}
+    lo = {name: np.asarray(value, dtype=float) for name, value in lo.items()}
+    hi = {name: np.asarray(value, dtype=float) for name, value in hi.items()}
+    with np.errstate(all="ignore"):
+        return _bounds(node, lo, hi)
+
+
+def _bounds(node, lo, hi):
+    shape = next(iter(lo.values())).shape
+    no = np.zeros(shape, dtype=bool)
+    if isinstance(node, Number):
+        return np.full(shape, as_float(node.value)), np.full(shape, as_float(node.value)), no, no
+    if isinstance(node, Variable):
+        return lo[node.name], hi[node.name], no, no
+    if isinstance(node, UnaryOp):
+        lower, upper, pole, partial = _bounds(node.operand, lo, hi)
+        return (lower, upper, pole, partial) if node.op == "+" else (-upper, -lower, pole, partial)
+    if isinstance(node, Call):
+        lower, upper, pole, partial = _bounds(node.argument, lo, hi)
+        if node.name == "sqrt":
+            outside, partial = upper < 0, partial | (lower < 0) & (upper >= 0)
+        else:
+            outside, partial = upper <= 0, partial | (lower <= 0) & (upper > 0)
+        lower = np.maximum(lower, 0.0)
+        function = np.sqrt if node.name == "sqrt" else np.log10
+        lower, upper = function(lower), function(upper)
+        return np.where(outside, np.nan, lower), np.where(outside, np.nan, upper), pole, partial
+
+    left_lower, left_upper, left_pole, left_partial = _bounds(node.left, lo, hi)
+    right_lower, right_upper, right_pole, right_partial = _bounds(node.right, lo, hi)
+    pole, partial = left_pole | right_pole, left_partial | right_partial
+    if node.op == "+":
+        return left_lower + right_lower, left_upper + right_upper, pole, partial
+    if node.op == "-":
+        return left_lower - right_upper, left_upper - right_lower, pole, partial
+    if node.op == "*":
+        return _multiply(left_lower, left_upper, right_lower, right_upper) + (pole, partial)
+    if node.op == "/":
+        zero = (right_lower <= 0) & (right_upper >= 0)
+        lower, upper = _multiply(left_lower, left_upper, 1 / right_upper, 1 / right_lower)
+        return np.where(zero, -np.inf, lower), np.where(zero, np.inf, upper), pole | zero, partial
+    return _power(left_lower, left_upper, right_lower, right_upper, pole, partial)
+
+
+def _multiply(a_lower, a_upper, b_lower, b_upper):
+    products = np.array([a_lower * b_lower, a_lower * b_upper, a_upper * b_lower, a_upper * b_upper])
+    # 0 * inf is 0 here, only empty operands make the product empty
+    empty = np.isnan(a_lower) | np.isnan(b_lower)
+    products[np.isnan(products) & ~empty] = 0.0
+    lower, upper = products.min(axis=0), products.max(axis=0)
+    return np.where(empty, np.nan, lower), np.where(empty, np.nan, upper)
+
+
+def _power(base_lower, base_upper, exponent_lower, exponent_upper, pole, partial):
+    unknown = (np.full(base_lower.shape, -np.inf), np.full(base_lower.shape, np.inf), pole, partial)
+    if not np.all(exponent_lower == exponent_upper):
+        if np.all(base_lower == base_upper) and np.all(base_lower > 0):  # c^x is monotonic
+            low, high = base_lower ** exponent_lower, base_lower ** exponent_upper
+            return np.minimum(low, high), np.maximum(low, high), pole, partial
+        return unknown
+    exponents = np.unique(exponent_lower)
+    if len(exponents) <= 1:
+        return _constant_power(base_lower, base_upper, exponents[0] if len(exponents) else 0.0, pole, partial)
+    # The exponent is exact on each sub-interval but differs between them, as for x^y over cells of one y
+    lower, upper = np.empty(base_lower.shape), np.empty(base_lower.shape)
+    pole, partial = pole.copy(), partial.copy()
+    for exponent in exponents:
+        where = exponent_lower == exponent
+        lower[where], upper[where], pole[where], partial[where] = _constant_power(
+            base_lower[where], base_upper[where], exponent, pole[where], partial[where])
+    return lower, upper, pole, partial
+
+
+def _constant_power(base_lower, base_upper, exponent, pole, partial):
+    """Bounds of base^exponent for the same exponent on every sub-interval."""
+    if float(exponent).is_integer():
+        n = int(exponent)
+        if n == 0:
+            return np.ones(base_lower.shape), np.ones(base_lower.shape), pole, partial
+        low, high = base_lower ** abs(n), base_upper ** abs(n)
+        if n % 2:
+            lower, upper = low, high
+        else:
+            spans_zero = (base_lower < 0) & (base_upper > 0)
+            lower = np.where(spans_zero, 0.0, np.minimum(low, high))
+            upper = np.maximum(low, high)
+    else:
+        # Negative bases have no real fractional power
+        outside = base_upper < 0
+        partial = partial | (base_lower < 0) & ~outside
+        lower = np.where(outside, np.nan, np.maximum(base_lower, 0.0) ** abs(exponent))
+        upper = np.where(outside, np.nan, base_upper ** abs(exponent))
+    if exponent > 0:
+        return lower, upper, pole, partial
+    # Negative powers are reciprocals, unbounded where the positive power can be zero
+    zero = (lower <= 0) & (upper >= 0)
+    odd = float(exponent).is_integer() and int(exponent) % 2
+    return (np.where(zero, -np.inf if odd else 1 / upper, 1 / upper), np.where(zero, np.inf, 1 / lower),
+            pole | zero, partial)
+
+
+def analyze(compiled, min_x, max_x):
+    """Locate the poles and domain edges of a function over [min_x, max_x].
+
+    Sub-intervals whose bounds show a possible pole or domain edge are
+    subdivided until they are narrow, then checked by evaluating the function
+    around them: a pole needs |f| to grow towards it, so removable
+    singularities such as x/x are not split; a domain edge needs the function
+    to be defined on one side only.
+    """
+    edges_x = np.linspace(min_x, max_x, INITIAL_INTERVALS + 1)
+    lower, upper, pole, partial = bounds(compiled.tree, edges_x[:-1], edges_x[1:])
+    bounded = ~pole & np.isfinite(lower) & np.isfinite(upper)
+    min_y = np.min(lower[bounded]) if np.any(bounded) else None
+    max_y = np.max(upper[bounded]) if np.any(bounded) else None
+
+    poles = _verify_poles(compiled, _refine(compiled.tree, edges_x[:-1][pole], edges_x[1:][pole], "pole",
+                                            (max_x - min_x) * RELATIVE_WIDTH))
+    edges = _verify_edges(compiled, _refine(compiled.tree, edges_x[:-1][partial], edges_x[1:][partial], "partial",
+                                            (max_x - min_x) * RELATIVE_WIDTH))
+    return RangeAnalysis(poles, edges, min_y, max_y)
+
+
+def _refine(tree, lo, hi, flag, width):
+    """Subdivide the sub-intervals keeping the pieces still flagged, until they are narrower than width."""
+    fractions = np.linspace(0.0, 1.0, PIECES + 1)
+    for _ in range(MAX_SUBDIVISIONS):
+        if not len(lo) or len(lo) > MAX_CANDIDATES or np.max(hi - lo) <= width:
+            break
+        cuts = lo[:, None] + (hi - lo)[:, None] * fractions
+        cuts[:, -1] = hi  # Exactly, the pieces must cover the sub-interval
+        lo, hi = cuts[:, :-1].ravel(), cuts[:, 1:].ravel()
+        _, _, pole, partial = bounds(tree, lo, hi)
+        keep = pole if flag == "pole" else partial
+        lo, hi = lo[keep], hi[keep]
+    if len(lo) > MAX_CANDIDATES:
+        return np.empty((0, 2))  # Overestimated everywhere, as in sqrt(x - x)
+    order = np.argsort(lo)
+    return _merge(lo[order], hi[order])
+
+
+def _merge(lo, hi):
+    """Merge touching sub-intervals into (n, 2) array of disjoint intervals."""
+    if len(lo) == 0:
+        return np.empty((0, 2))
+    starts = np.flatnonzero(np.concatenate([[True], lo[1:] > hi[:-1]]))
+    stops = np.concatenate([starts[1:], [len(lo)]]) - 1
+    return np.column_stack([lo[starts], hi[stops]])
+
+
+def _around(compiled, intervals):
+    """Evaluate f at the ends of each interval and a thousand widths beyond them."""
+    lo, hi = intervals[:, 0], intervals[:, 1]
+    reach = 1000 * np.maximum(hi - lo, np.spacing(np.maximum(np.abs(lo), np.abs(hi))))
+    with np.errstate(all="ignore"):
+        return [compiled.evaluate(points) for points in (lo - reach, lo, hi, hi + reach)]
+
+
+def _verify_poles(compiled, intervals):
+    if len(intervals) == 0:
+        return np.empty(0)
+    far_left, left, right, far_right = _around(compiled, intervals)
+    with np.errstate(all="ignore"):
+        near = np.fmax(np.abs(left), np.abs(right))
+        far = np.fmax(np.abs(far_left), np.abs(far_right))
+        is_pole = np.isinf(left) | np.isinf(right) | (near > POLE_GROWTH * far)
+    return intervals[is_pole].mean(axis=1)
+
+
+def _verify_edges(compiled, intervals):
+    if len(intervals) == 0:
+        return np.empty(0)
+    far_left, _, _, far_right = _around(compiled, intervals)
+    return intervals[np.isfinite(far_left) != np.isfinite(far_right)].mean(axis=1)
+
+
+def insert_breaks(x, y, breaks):
+    """Return the samples with a NaN after the last sample before each break, so the line is split there.
+
+    The NaN sample repeats the x of the sample before it, the other samples
+    are unchanged.
+    """
+    if breaks is None or len(breaks) == 0 or len(x) == 0:
+        return x, y
+    index = np.unique(np.searchsorted(x, breaks))
+    index = index[(index > 0) & (index < len(x))]
+    if len(index) == 0:
+        return x, y
+    return np.insert(x, index, x[index - 1]), np.insert(y, index, np.nan)
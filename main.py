@@ -1,13 +1,34 @@
+import argparse
 import sys
 import logging
 from PySide2.QtWidgets import QApplication
 from function_plotter import FunctionPlotter
-
-# Configure logging
-logging.basicConfig(level=logging.DEBUG)
+from instrumentation import JsonLinesWriter, tracer
+from parallel import ParallelEvaluator
+from sample_cache import DEFAULT_MAX_BYTES, SampleCache, default_cache_dir
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Plot functions of x.")
+    parser.add_argument("--log-level", default="WARNING", choices=("DEBUG", "INFO", "WARNING", "ERROR"))
+    parser.add_argument("--trace", metavar="FILE", help="append the timing of each plotting stage to FILE as JSON lines")
+    parser.add_argument("--cache-dir", default=default_cache_dir(), help="directory of the sample cache")
+    parser.add_argument("--cache-size", type=float, default=DEFAULT_MAX_BYTES / 2 ** 20,
+                        help="size of the sample cache in MiB before the least recently used samples are evicted")
+    parser.add_argument("--no-cache", action="store_true", help="sample every plot again, keep nothing on disk")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="processes evaluating large grids, defaults to the CPU count, 1 evaluates in one process")
+    args, qt_args = parser.parse_known_args()
+
+    # Configure logging
+    logging.basicConfig(level=args.log_level)
+    if args.trace:
+        tracer.add_listener(JsonLinesWriter(args.trace))
+
     logging.debug("Starting application")
-    app = QApplication(sys.argv)
-    window = FunctionPlotter()
-    sys.exit(app.exec_())
+    app = QApplication(sys.argv[:1] + qt_args)
+    sample_cache = None if args.no_cache else SampleCache(args.cache_dir, int(args.cache_size * 2 ** 20))
+    parallel = ParallelEvaluator(args.workers)  # Its processes start with the first grid large enough
+    window = FunctionPlotter(sample_cache, parallel)
+    status = app.exec_()
+    parallel.shutdown()
+    sys.exit(status)
@@ -0,0 +1,167 @@
+import logging
+import multiprocessing
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from multiprocessing import shared_memory
+import numpy as np
+from evaluator import CompiledFunction, as_float_array, evaluate_shared
+
+MIN_PARALLEL_SAMPLES = 1 << 18  # Fewer samples per function are evaluated serially, the pool would not pay off
+MIN_PARTITION = 1 << 14  # Smallest slice of x handed to one task
+TASKS_PER_WORKER = 4  # Smaller tasks balance uneven workers and let cancellation and progress through sooner
+
+
+class ParallelEvaluator:
+    """Evaluates functions over large x arrays on a persistent pool of worker processes.
+
+    x and the results live in shared memory buffers that the workers attach
+    to, each task evaluates one slice of x in place. Only the expression texts
+    and the slice bounds are sent to the workers, nothing but exceptions comes
+    back. The pool and the buffers are created on the first call large enough
+    to be worth it and kept for the next ones until shutdown().
+
+    Parameters
+    ----------
+    workers : int
+       worker processes, defaults to the CPU count; 1 always evaluates serially
+    min_samples : int
+       samples per function below which evaluation stays serial
+    """
+    def __init__(self, workers=None, min_samples=MIN_PARALLEL_SAMPLES):
+        self.workers = workers or os.cpu_count() or 1
+        self.min_samples = min_samples
+        self._pool = None
+        self._buffers = []  # SharedMemory holding x then the result of each function
+        self._lock = threading.Lock()  # One evaluation at a time owns the buffers
+
+    def worthwhile(self, n_samples):
+        """Whether evaluating n_samples per function in parallel beats doing it serially."""
+        return self.workers > 1 and n_samples >= self.min_samples
+
+    def evaluate(self, compiled_functions, x, outs=None, check=None, progress=None):
+        """Evaluate the functions over x, serially when not worthwhile, returns one array per function.
+
+        Parameters
+        ----------
+        compiled_functions : sequence of CompiledFunction
+           functions to evaluate, common subexpressions are evaluated once per slice
+        x : ndarray
+           1-D points to evaluate at
+        outs : sequence of ndarray
+           arrays the results are written to, new ones are allocated when not given
+        check : callable
+           called between tasks, raising from it stops the evaluation
+        progress : callable
+           called with the percentage of x evaluated so far
+        """
+        x = as_float_array(x)
+        outs = outs if outs is not None else [np.empty(len(x), dtype=x.dtype) for _ in compiled_functions]
+        if not self.worthwhile(len(x)):
+            for out, y in zip(outs, evaluate_shared(compiled_functions, x)):
+                out[...] = y
+            return outs
+
+        with self._lock:
+            shared = self._shared_arrays(len(x), len(compiled_functions), x.dtype)
+            shared[0][...] = x
+            texts = [compiled.text for compiled in compiled_functions]
+            names = [buffer.name for buffer in self._buffers[:len(compiled_functions) + 1]]
+            partition = max(MIN_PARTITION, -(-len(x) // (self.workers * TASKS_PER_WORKER)))
+            pool = self._ensure_pool()
+            pending = {pool.submit(_evaluate_slice, texts, names, x.dtype.str, len(x), start,
+                                   min(start + partition, len(x))) for start in range(0, len(x), partition)}
+            done_samples = 0
+            try:
+                while pending:
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        done_samples += future.result()  # Raises what the expression raised in the worker
+                    if check is not None:
+                        check()
+                    if progress is not None:
+                        progress(100 * done_samples // len(x))
+            finally:
+                # Tasks still running write into the buffers, the next evaluation must not start before they end
+                for future in pending:
+                    future.cancel()
+                wait(pending)
+            for out, y in zip(outs, shared[1:]):
+                out[...] = y
+        return outs
+
+    def _ensure_pool(self):
+        if self._pool is None:
+            # Forking a process running Qt threads is unsafe, workers start a fresh interpreter
+            self._pool = ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context("spawn"))
+        return self._pool
+
+    def _shared_arrays(self, n_samples, n_functions, dtype):
+        """Return views of x and of each result in the shared buffers, growing the buffers as needed."""
+        nbytes = n_samples * dtype.itemsize
+        while len(self._buffers) < n_functions + 1:
+            self._buffers.append(None)
+        for i in range(n_functions + 1):
+            if self._buffers[i] is None or self._buffers[i].size < nbytes:
+                if self._buffers[i] is not None:
+                    _release(self._buffers[i])
+                self._buffers[i] = shared_memory.SharedMemory(create=True, size=max(nbytes, 1))
+        return [np.ndarray(n_samples, dtype=dtype, buffer=buffer.buf) for buffer in self._buffers[:n_functions + 1]]
+
+    def shutdown(self):
+        """Stop the worker processes and free the shared buffers."""
+        with self._lock:
+            if self._pool is not None:
+                self._pool.shutdown(cancel_futures=True)
+                self._pool = None
+            for buffer in self._buffers:
+                if buffer is not None:
+                    _release(buffer)
+            self._buffers = []
+
+
+def _release(buffer):
+    try:
+        buffer.close()
+        buffer.unlink()
+    except (BufferError, OSError) as e:
+        logging.debug("Shared buffer %s not released: %s", buffer.name, e)
+
+
+# State of a worker process, kept between tasks
+_compiled = OrderedDict()  # CompiledFunction by expression text, least recently used first
+_attached = {}  # SharedMemory by name, the buffers of the last task
+MAX_COMPILED = 64
+
+
+def _compile(text):
+    compiled = _compiled.get(text)
+    if compiled is None:
+        compiled = _compiled[text] = CompiledFunction(text)
+        if len(_compiled) > MAX_COMPILED:
+            _compiled.popitem(last=False)
+    _compiled.move_to_end(text)
+    return compiled
+
+
+def _attach(names):
+    """Return the shared buffers of a task, closing those of earlier tasks so replaced buffers are freed."""
+    for name in set(_attached) - set(names):
+        _attached.pop(name).close()
+    for name in names:
+        if name not in _attached:
+            _attached[name] = shared_memory.SharedMemory(name=name)
+    return [_attached[name] for name in names]
+
+
+def _evaluate_slice(texts, names, dtype, n_samples, start, stop):
+    """Evaluate the functions over x[start:stop] in the shared buffers, returns the number of samples."""
+    x, *ys = [np.ndarray(n_samples, dtype=dtype, buffer=buffer.buf) for buffer in _attach(names)]
+    compiled_functions = [_compile(text) for text in texts]
+    if len(compiled_functions) == 1:
+        compiled_functions[0].evaluate(x[start:stop], out=ys[0][start:stop])
+    else:
+        for y, values in zip(ys, evaluate_shared(compiled_functions, x[start:stop])):
+            y[start:stop] = values
+    return stop - start
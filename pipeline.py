@@ -0,0 +1,442 @@
+import threading
+from collections import OrderedDict, namedtuple
+import numpy as np
+from decimation import StreamingDecimator
+from evaluator import evaluate_shared
+from instrumentation import tracer
+from interval import analyze
+from sampling import adaptive_sample
+
+CHUNK_SIZE = 1 << 18  # Samples evaluated between two progress reports / cancellation checks
+PRECISIONS = ("float64", "float32", "auto")
+GUARD_SAMPLES = 1025  # Samples evaluated in both precisions before trusting float32 in auto mode
+MAX_PIXEL_ERROR = 0.5  # Largest float32 error allowed in auto mode, in pixel rows of the y range
+ANALYSIS_CACHE_SIZE = 64  # Singularity analyses kept, previews and their refinement share one
+
+# Finite samples of a function along with what was removed to get them,
+# decimated is True when only a per pixel column reduction of the samples was kept,
+# breaks holds the x positions the line is split at, see split_at_singularities,
+# integral is the SampleResult of the running integral of a decimated grid, carried through its chunks, or None
+SampleResult = namedtuple("SampleResult", ["x", "y", "removed_points", "min_x", "max_x", "min_y", "max_y",
+                                           "decimated", "breaks", "integral"], defaults=(False, None, None))
+
+
+class Cancelled(Exception):
+    """Raised inside a computation whose result is no longer wanted."""
+
+
+def sample_function(compiled, min_x, max_x, step_size=None, adaptive=False, max_points=4000, tolerance=1e-3,
+                    progress=None, cancelled=None, parallel=None, dtype=np.float64):
+    """Sample a compiled function over [min_x, max_x] and drop the non-finite values.
+
+    Parameters
+    ----------
+    compiled : CompiledFunction
+       function to evaluate
+    min_x, max_x : float
+       sampled range
+    step_size : float
+       spacing of the uniform grid, unused in adaptive mode
+    adaptive : bool
+       use the adaptive sampler instead of a uniform grid
+    max_points, tolerance : int, float
+       point budget and error tolerance of the adaptive sampler
+    progress : callable
+       called with the percentage of the uniform grid evaluated so far
+    cancelled : callable
+       polled between chunks, the computation raises Cancelled once it returns True
+    parallel : ParallelEvaluator
+       evaluates grids large enough to benefit across worker processes, None evaluates serially
+    dtype : dtype
+       precision of the uniform grid and of the evaluation, the adaptive sampler uses float64
+    """
+    def check_cancelled():
+        if cancelled is not None and cancelled():
+            raise Cancelled()
+
+    if adaptive:
+        def evaluate(x):
+            check_cancelled()
+            return compiled.evaluate(x)
+        with tracer.span("evaluate", adaptive=True):
+            x, y = adaptive_sample(evaluate, min_x, max_x, max_points=max_points, tolerance=tolerance)
+    else:
+        with tracer.span("grid"):
+            x = uniform_grid(min_x, max_x, step_size, dtype=dtype)
+            y = np.empty_like(x)
+        with tracer.span("evaluate", samples=len(x)):
+            if parallel is not None and parallel.worthwhile(len(x)):
+                parallel.evaluate([compiled], x, [y], check_cancelled, progress)
+            else:
+                for start in range(0, len(x), CHUNK_SIZE):
+                    check_cancelled()
+                    stop = min(start + CHUNK_SIZE, len(x))
+                    compiled.evaluate(x[start:stop], out=y[start:stop])
+                    if progress is not None:
+                        progress(100 * stop // len(x))
+    check_cancelled()
+    return finite_samples(x, y)
+
+
+def sample_functions(compiled_functions, min_x, max_x, step_size, progress=None, cancelled=None, parallel=None,
+                     dtype=np.float64):
+    """Sample several functions over one uniform grid, evaluating common subexpressions once.
+
+    Returns one SampleResult per function, the same as sample_function gives
+    for it on its own. Arguments are the same as for sample_function.
+    """
+    def check_cancelled():
+        if cancelled is not None and cancelled():
+            raise Cancelled()
+
+    with tracer.span("grid"):
+        x = uniform_grid(min_x, max_x, step_size, dtype=dtype)
+        ys = [np.empty_like(x) for _ in compiled_functions]
+    with tracer.span("evaluate", samples=len(x), functions=len(compiled_functions)):
+        if parallel is not None and parallel.worthwhile(len(x)):
+            parallel.evaluate(compiled_functions, x, ys, check_cancelled, progress)
+        else:
+            for start in range(0, len(x), CHUNK_SIZE):
+                check_cancelled()
+                stop = min(start + CHUNK_SIZE, len(x))
+                for y, chunk in zip(ys, evaluate_shared(compiled_functions, x[start:stop])):
+                    y[start:stop] = chunk
+                if progress is not None:
+                    progress(100 * stop // len(x))
+    check_cancelled()
+    return [finite_samples(x, y) for y in ys]
+
+
+def finite_samples(x, y):
+    """Return the SampleResult of the finite samples of y over x."""
+    # Remove points where y is infinite, NaN, or has division by zero errors
+    with tracer.span("filter", samples=len(x)):
+        finite_mask = np.isfinite(y)
+        if not finite_mask.all():  # Copies only when something is removed
+            x = x[finite_mask]
+            y = y[finite_mask]
+        removed_points = len(finite_mask) - len(x)
+    if len(x) == 0:
+        return SampleResult(x, y, removed_points, None, None, None, None)
+    return SampleResult(x, y, removed_points, x[0], x[-1], np.min(y), np.max(y))
+
+
+# Running statistics of a streamed series
+StreamStats = namedtuple("StreamStats", ["n_samples", "removed_points", "min_x", "max_x", "min_y", "max_y"])
+
+BYTES_PER_SAMPLE = 64  # x, y, finite mask and evaluation temporaries of one sample
+DEFAULT_MEMORY_BUDGET = 64 * 1024 * 1024
+
+
+def grid_size(min_x, max_x, step_size):
+    """Number of samples np.arange(min_x, max_x, step_size) would produce."""
+    return max(int(np.ceil((max_x - min_x) / step_size)), 0)
+
+
+def uniform_grid(min_x, max_x, step_size, start=0, stop=None, dtype=np.float64):
+    """Return the samples start to stop, all by default, of the grid np.arange(min_x, max_x, step_size).
+
+    float32 grids are computed in float32 from the first sample of the slice,
+    without building the float64 grid first.
+    """
+    n_samples = grid_size(min_x, max_x, step_size)
+    stop = n_samples if stop is None else stop
+    if np.dtype(dtype) == np.float64:
+        if start == 0 and stop == n_samples:
+            return np.arange(min_x, max_x, step_size)
+        return min_x + np.arange(start, stop) * step_size
+    x = np.arange(stop - start, dtype=dtype)
+    x *= step_size
+    x += min_x + start * step_size
+    return x
+
+
+def chunk_size_for(memory_budget):
+    """Number of samples per chunk keeping the working set within memory_budget bytes."""
+    return max(int(memory_budget) // BYTES_PER_SAMPLE, 1024)
+
+
+def stream_function(compiled, min_x, max_x, step_size, sinks, memory_budget=DEFAULT_MEMORY_BUDGET,
+                    progress=None, cancelled=None, parallel=None, dtype=np.float64):
+    """Evaluate a function over the uniform grid chunk by chunk, never holding the whole series.
+
+    The finite samples of every chunk are handed to each sink's add(x, y)
+    method, in order, and the chunk is dropped before the next one is built.
+
+    Parameters
+    ----------
+    compiled : CompiledFunction
+       function to evaluate
+    min_x, max_x, step_size : float
+       grid, the same as np.arange(min_x, max_x, step_size)
+    sinks : sequence
+       consumers of the finite samples, such as a StreamingDecimator
+    memory_budget : int
+       approximate peak memory of the evaluation in bytes
+    progress, cancelled : callable
+       as in sample_function
+    parallel : ParallelEvaluator
+       as in sample_function, chunks large enough are evaluated across worker processes
+    dtype : dtype
+       precision of the grid and of the evaluation, float32 chunks hold twice as many samples
+
+    Returns
+    -------
+    StreamStats
+       number of samples, removed points and extent of the finite samples
+    """
+    return stream_functions([compiled], min_x, max_x, step_size, [sinks], memory_budget, progress, cancelled,
+                            parallel, dtype)[0]
+
+
+def stream_functions(compiled_functions, min_x, max_x, step_size, sinks, memory_budget=DEFAULT_MEMORY_BUDGET,
+                     progress=None, cancelled=None, parallel=None, dtype=np.float64):
+    """Stream several functions over one uniform grid, evaluating common subexpressions once.
+
+    sinks holds one sequence of sinks per function, memory_budget is shared by
+    all functions. Returns one StreamStats per function, other arguments are
+    the same as for stream_function.
+    """
+    n_samples = grid_size(min_x, max_x, step_size)
+    chunk_size = chunk_size_for(memory_budget // max(len(compiled_functions), 1)) * (8 // np.dtype(dtype).itemsize)
+    removed_points = [0] * len(compiled_functions)
+    first_x, last_x, min_y, max_y = ([None] * len(compiled_functions) for _ in range(4))
+    def check_cancelled():
+        if cancelled is not None and cancelled():
+            raise Cancelled()
+
+    for start in range(0, n_samples, chunk_size):
+        check_cancelled()
+        stop = min(start + chunk_size, n_samples)
+        with tracer.span("grid", samples=stop - start):
+            grid = uniform_grid(min_x, max_x, step_size, start, stop, dtype)
+        with tracer.span("evaluate", samples=stop - start, functions=len(compiled_functions)):
+            if parallel is not None and parallel.worthwhile(len(grid)):
+                chunks = parallel.evaluate(compiled_functions, grid, check=check_cancelled)
+            else:
+                chunks = evaluate_shared(compiled_functions, grid)
+        for i, y in enumerate(chunks):
+            with tracer.span("filter", samples=stop - start):
+                finite_mask = np.isfinite(y)
+                removed_points[i] += len(grid) - np.count_nonzero(finite_mask)
+                x = grid[finite_mask]
+                y = y[finite_mask]
+            if len(x):
+                first_x[i] = x[0] if first_x[i] is None else first_x[i]
+                last_x[i] = x[-1]
+                min_y[i] = np.min(y) if min_y[i] is None else min(min_y[i], np.min(y))
+                max_y[i] = np.max(y) if max_y[i] is None else max(max_y[i], np.max(y))
+                for sink in sinks[i]:
+                    sink.add(x, y)
+        if progress is not None:
+            progress(100 * stop // n_samples)
+    return [StreamStats(n_samples, *stats) for stats in zip(removed_points, first_x, last_x, min_y, max_y)]
+
+
+class StreamingIntegral:
+    """Running trapezoid integral of a series fed chunk by chunk, decimated per pixel column.
+
+    The integral is the one calculus.cumulative_integral gives over the whole
+    series: it starts at zero at the first sample and again at the first
+    sample past each break, the sum being carried from one chunk to the next.
+    It is accumulated in float64 whatever the precision of the samples.
+
+    Parameters
+    ----------
+    min_x, max_x : float
+       interval covered by the pixel columns
+    n_columns : int
+       number of pixel columns
+    breaks : numpy.ndarray
+       sorted x positions of the poles and domain edges of the function
+    """
+    def __init__(self, min_x, max_x, n_columns, breaks):
+        self.decimator = StreamingDecimator(min_x, max_x, n_columns)
+        self.breaks = breaks
+        self.first_x = self.min_y = self.max_y = None
+        self._last = None  # x, y and integral of the last sample added
+
+    def add(self, x, y):
+        """Add a chunk of finite samples, sorted by x and following the previous chunks."""
+        if len(x) == 0:
+            return
+        with tracer.span("integrate", samples=len(x)):
+            x, y = x.astype(np.float64), y.astype(np.float64)
+            previous_x, previous_y, total = self._last or (x[0], y[0], 0.0)
+            areas = (y + np.concatenate([[previous_y], y[:-1]])) * np.diff(x, prepend=previous_x) / 2
+            # A sample starts again after a break between it and the sample before it
+            index = np.searchsorted(np.concatenate([[previous_x], x]), self.breaks)
+            starts = np.zeros(len(x), dtype=bool)
+            starts[index[(index > 0) & (index <= len(x))] - 1] = True
+            areas[starts] = 0.0
+            integral = total + np.cumsum(areas)
+            if starts.any():
+                integral -= np.concatenate([[0.0], integral[starts]])[np.cumsum(starts)]
+        self._last = (x[-1], y[-1], integral[-1])
+        self.first_x = x[0] if self.first_x is None else self.first_x
+        self.min_y = np.min(integral) if self.min_y is None else min(self.min_y, np.min(integral))
+        self.max_y = np.max(integral) if self.max_y is None else max(self.max_y, np.max(integral))
+        self.decimator.add(x, integral)
+
+    def result(self):
+        """Return the SampleResult of the decimated integral."""
+        x, y = self.decimator.result()
+        last_x = self._last[0] if self._last is not None else None
+        return SampleResult(x, y, 0, self.first_x, last_x, self.min_y, self.max_y, True, self.breaks)
+
+
+def float32_is_accurate(compiled_functions, min_x, max_x, n_columns, n_rows):
+    """Whether float32 samples of the functions over [min_x, max_x] draw the same as float64 ones.
+
+    float32 must tell apart x positions a quarter of a pixel column apart, and
+    on GUARD_SAMPLES points spread over the range the functions must be finite
+    at the same points in both precisions, with errors below MAX_PIXEL_ERROR
+    pixel rows of the y range of the float64 values drawn n_rows pixels high.
+    """
+    if np.spacing(np.float32(max(abs(min_x), abs(max_x)))) > (max_x - min_x) / (4 * n_columns):
+        return False
+    with tracer.span("guard", samples=GUARD_SAMPLES, functions=len(compiled_functions)):
+        x = np.linspace(min_x, max_x, GUARD_SAMPLES).astype(np.float32)
+        exact = evaluate_shared(compiled_functions, x.astype(np.float64))
+        approximate = evaluate_shared(compiled_functions, x)
+    for y, y32 in zip(exact, approximate):
+        finite = np.isfinite(y)
+        if not np.array_equal(finite, np.isfinite(y32)):
+            return False  # Overflow, or values rounded to or away from the domain edges
+        if not finite.any():
+            continue
+        y_range = np.ptp(y[finite]) or max(abs(np.max(y[finite])), 1.0)
+        if np.max(np.abs(y32[finite] - y[finite])) > MAX_PIXEL_ERROR * y_range / n_rows:
+            return False
+    return True
+
+
+def choose_dtype(compiled_functions, min_x, max_x, precision="float64", n_columns=1000, preview=False, n_rows=1000):
+    """Return the dtype to sample the functions in for a precision mode.
+
+    "float64" and "float32" are used as they are. "auto" samples previews in
+    float32 when float32_is_accurate allows it for a plot n_columns by n_rows
+    pixels, and everything else in float64.
+    """
+    if precision not in PRECISIONS:
+        raise ValueError("Unknown precision {!r}, expected one of {}".format(precision, ", ".join(PRECISIONS)))
+    if precision == "float32" or precision == "auto" and preview and float32_is_accurate(
+            compiled_functions, min_x, max_x, n_columns, n_rows):
+        return np.float32
+    return np.float64
+
+
+def sample_for_display(compiled, min_x, max_x, step_size=None, adaptive=False, max_points=4000, tolerance=1e-3,
+                       n_columns=1000, memory_budget=DEFAULT_MEMORY_BUDGET, progress=None, cancelled=None,
+                       parallel=None, precision="float64", preview=False, n_rows=1000, integral=False):
+    """Sample a function for drawing n_columns pixel columns wide and n_rows high.
+
+    Grids whose full series would not fit in memory_budget are streamed through
+    a StreamingDecimator and only the decimated samples are returned, along
+    with their StreamingIntegral as the integral of the result when integral
+    is True, since the decimated samples cannot be integrated. Uniform
+    grids are sampled in the dtype choose_dtype gives for precision and
+    preview, the adaptive sampler always uses float64. Other arguments are the
+    same as for sample_function.
+    """
+    dtype = np.float64 if adaptive else choose_dtype([compiled], min_x, max_x, precision, n_columns, preview, n_rows)
+    if adaptive or grid_size(min_x, max_x, step_size) * BYTES_PER_SAMPLE <= memory_budget:
+        result = sample_function(compiled, min_x, max_x, step_size, adaptive, max_points, tolerance,
+                                 progress=progress, cancelled=cancelled, parallel=parallel, dtype=dtype)
+    else:
+        decimator = StreamingDecimator(min_x, max_x, n_columns, dtype=dtype)
+        integrals = _streaming_integrals([compiled], min_x, max_x, n_columns, integral)
+        stats = stream_function(compiled, min_x, max_x, step_size, [decimator] + integrals, memory_budget,
+                                progress=progress, cancelled=cancelled, parallel=parallel, dtype=dtype)
+        x, y = decimator.result()
+        result = SampleResult(x, y, stats.removed_points, stats.min_x, stats.max_x, stats.min_y, stats.max_y, True,
+                              integral=integrals[0].result() if integrals else None)
+    return split_at_singularities(compiled, result, min_x, max_x)
+
+
+def sample_functions_for_display(compiled_functions, min_x, max_x, step_size=None, adaptive=False, max_points=4000,
+                                 tolerance=1e-3, n_columns=1000, memory_budget=DEFAULT_MEMORY_BUDGET, progress=None,
+                                 cancelled=None, parallel=None, precision="float64", preview=False, n_rows=1000,
+                                 integrals=False):
+    """Sample several functions for drawing them overlaid, one SampleResult per function.
+
+    Uniform grids are shared by all functions along with their common
+    subexpressions, the adaptive sampler picks its own points per function.
+    Arguments are the same as for sample_for_display, integrals being its integral.
+    """
+    if len(compiled_functions) <= 1 or adaptive:
+        return [sample_for_display(compiled, min_x, max_x, step_size, adaptive, max_points, tolerance, n_columns,
+                                   memory_budget, progress, cancelled, parallel, precision, preview, n_rows, integrals)
+                for compiled in compiled_functions]
+    dtype = choose_dtype(compiled_functions, min_x, max_x, precision, n_columns, preview, n_rows)
+    if grid_size(min_x, max_x, step_size) * BYTES_PER_SAMPLE * len(compiled_functions) <= memory_budget:
+        results = sample_functions(compiled_functions, min_x, max_x, step_size, progress=progress, cancelled=cancelled,
+                                   parallel=parallel, dtype=dtype)
+    else:
+        decimators = [StreamingDecimator(min_x, max_x, n_columns, dtype=dtype) for _ in compiled_functions]
+        integral_sinks = _streaming_integrals(compiled_functions, min_x, max_x, n_columns, integrals)
+        all_stats = stream_functions(compiled_functions, min_x, max_x, step_size,
+                                     [[decimator] + integral_sinks[i:i + 1] for i, decimator in enumerate(decimators)],
+                                     memory_budget, progress=progress, cancelled=cancelled, parallel=parallel,
+                                     dtype=dtype)
+        results = [SampleResult(*decimator.result(), stats.removed_points, stats.min_x, stats.max_x, stats.min_y,
+                                stats.max_y, True, integral=integral_sinks[i].result() if integrals else None)
+                   for i, (decimator, stats) in enumerate(zip(decimators, all_stats))]
+    return [split_at_singularities(compiled, result, min_x, max_x)
+            for compiled, result in zip(compiled_functions, results)]
+
+
+def _streaming_integrals(compiled_functions, min_x, max_x, n_columns, integrals):
+    """One StreamingIntegral per function when integrals is True, restarting at its breaks; none otherwise."""
+    if not integrals:
+        return []
+    return [StreamingIntegral(min_x, max_x, n_columns, _breaks(compiled, min_x, max_x))
+            for compiled in compiled_functions]
+
+
+def _breaks(compiled, min_x, max_x):
+    analysis = cached_analysis(compiled, min_x, max_x)
+    return np.union1d(analysis.poles, analysis.edges)
+
+
+def split_at_singularities(compiled, result, min_x, max_x):
+    """Return the SampleResult with the poles and domain edges of the function over [min_x, max_x] as breaks.
+
+    The samples on both sides of a break are not to be joined by the line. As
+    the samples next to a pole grow without bound, the y range is then limited
+    to the interval bounds of the function away from its poles.
+    """
+    if len(result.x) == 0:
+        return result
+    analysis = cached_analysis(compiled, min_x, max_x)
+    min_y, max_y = result.min_y, result.max_y
+    if len(analysis.poles) and analysis.min_y is not None:
+        min_y, max_y = max(min_y, analysis.min_y), min(max_y, analysis.max_y)
+        if min_y >= max_y:  # Only samples close to the poles
+            min_y, max_y = result.min_y, result.max_y
+    return result._replace(min_y=min_y, max_y=max_y, breaks=_breaks(compiled, min_x, max_x))
+
+
+_analyses = OrderedDict()  # RangeAnalysis by (canonical text, min_x, max_x), least recently used first
+_analyses_lock = threading.Lock()  # Workers of several plots may analyze at once
+
+
+def cached_analysis(compiled, min_x, max_x):
+    """Return interval.analyze of the function over [min_x, max_x], reusing the last ANALYSIS_CACHE_SIZE ones.
+
+    The analysis depends on the range only, not on the step size or the
+    precision, so a live preview and its full resolution plot share it.
+    """
+    key = (compiled.text, float(min_x), float(max_x))
+    with _analyses_lock:
+        analysis = _analyses.get(key)
+        if analysis is not None:
+            _analyses.move_to_end(key)
+            return analysis
+    with tracer.span("analyze"):
+        analysis = analyze(compiled, min_x, max_x)
+    with _analyses_lock:
+        _analyses[key] = analysis
+        if len(_analyses) > ANALYSIS_CACHE_SIZE:
+            _analyses.popitem(last=False)
+    return analysis
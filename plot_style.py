@@ -0,0 +1,28 @@
+import os
+from functools import lru_cache
+
+# Colors of the figure in each theme, shared by the GUI and the headless batch renderer
+THEMES = {
+    "light": {"background": "white", "foreground": "black"},
+    "dark": {"background": "#333", "foreground": "white"},
+}
+
+
+def style_axes(ax, theme="light"):
+    """Apply the colors of a theme to the axes, its spines, ticks and labels."""
+    colors = THEMES[theme]
+    ax.figure.patch.set_facecolor(colors["background"])
+    ax.set_facecolor(colors["background"])
+    ax.tick_params(colors=colors["foreground"])
+    for spine in ax.spines.values():
+        spine.set_color(colors["foreground"])
+    ax.title.set_color(colors["foreground"])
+    ax.xaxis.label.set_color(colors["foreground"])
+    ax.yaxis.label.set_color(colors["foreground"])
+
+
+@lru_cache(maxsize=None)
+def read_stylesheet(filename):
+    """Return the contents of a Qt stylesheet next to this module, read from disk only once."""
+    with open(os.path.join(os.path.dirname(os.path.abspath(__file__)), filename), 'r') as file:
+        return file.read()
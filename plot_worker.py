@@ -0,0 +1,165 @@
+import threading
+from collections import namedtuple
+from PySide2.QtCore import QObject, QRunnable, Signal
+from calculus import derivative_samples
+from export import export_samples
+from pipeline import Cancelled, sample_functions_for_display
+from surface import implicit_curve, sample_surface
+
+# Everything a worker needs to sample the overlaid functions, captured on the GUI thread.
+# live requests come from typing, refine is the full resolution request following a preview,
+# known holds per function the SampleResult of an earlier plot on the same grid, or None,
+# cache is the SampleCache the samples are looked up in and stored to, or None,
+# parallel is the ParallelEvaluator sharing large grids between processes, or None,
+# precision is one of pipeline.PRECISIONS, previews being the requests with a refine,
+# overlays is (derivative, integral): with derivative the expressions are followed by their derivatives,
+# which are only kept where their function has samples,
+# with integral the running integrals are drawn from the samples of the functions,
+# n_rows is the height of the plot in pixels, as n_columns is its width.
+PlotRequest = namedtuple("PlotRequest", ["expressions", "min_x", "max_x", "step_size", "adaptive",
+                                         "max_points", "tolerance", "n_columns", "memory_budget", "new",
+                                         "live", "refine", "known", "cache", "parallel", "precision", "overlays",
+                                         "n_rows"],
+                         defaults=(False, None, None, None, None, "float64", (False, False), 1000))
+
+# A function of x and y to draw over the rectangle [min_x, max_x] x [min_y, max_y] of width by height pixels,
+# as the curve where it is zero when implicit, as a heatmap otherwise
+SurfaceRequest = namedtuple("SurfaceRequest", ["expression", "implicit", "min_x", "max_x", "min_y", "max_y",
+                                               "width", "height", "new", "live"])
+
+
+class PlotJobSignals(QObject):
+    """Signals of a PlotJob, each carrying the job that emitted it."""
+    progress = Signal(object, int)
+    finished = Signal(object)
+    failed = Signal(object)
+
+
+class PlotJob(QRunnable):
+    """Samples functions off the GUI thread, skipping those whose samples are already known.
+
+    Parameters
+    ----------
+    request : PlotRequest
+       functions and sampling parameters
+    """
+    def __init__(self, request):
+        super().__init__()
+        self.request = request
+        self.signals = PlotJobSignals()
+        self.result = None  # One SampleResult per function once finished
+        self.error = None  # Exception raised by the evaluation once failed
+        self._cancel_event = threading.Event()
+
+    def cancel(self):
+        """Stop the job at the next chunk boundary, nothing is emitted afterwards."""
+        self._cancel_event.set()
+
+    def is_cancelled(self):
+        return self._cancel_event.is_set()
+
+    def run(self):
+        request = self.request
+        known = list(request.known or (None,) * len(request.expressions))
+        n_functions = len(known) // 2 if request.overlays[0] else len(known)
+        cache = request.cache if request.refine is None else None  # Previews are not worth keeping
+        keys = [None] * len(known)
+        if cache is not None:
+            for i, expression in enumerate(request.expressions[:n_functions]):
+                if known[i] is None:
+                    keys[i] = cache.key(expression.compiled.text, *request[1:7])
+                    known[i] = cache.get(keys[i], request.n_columns, request.precision)
+        if request.overlays[1]:
+            # The reduction of a grid streamed without its integral cannot be integrated, it is streamed again
+            known[:n_functions] = [None if result is not None and result.decimated and result.integral is None
+                                   else result for result in known[:n_functions]]
+        # Derivatives are sampled in the same pass as their function when it is sampled too, so the subexpressions
+        # they share are computed once; otherwise they are evaluated at the samples of their function
+        missing = [i for i, result in enumerate(known) if result is None and (
+            i < n_functions or not request.adaptive and known[i - n_functions] is None)]
+        try:
+            sampled = sample_functions_for_display([request.expressions[i].compiled for i in missing], request.min_x,
+                                                   request.max_x, request.step_size, request.adaptive,
+                                                   request.max_points, request.tolerance, request.n_columns,
+                                                   request.memory_budget,
+                                                   progress=lambda percent: self.signals.progress.emit(self, percent),
+                                                   cancelled=self.is_cancelled, parallel=request.parallel,
+                                                   precision=request.precision,
+                                                   preview=request.refine is not None, n_rows=request.n_rows,
+                                                   integrals=request.overlays[1])
+            self.result = list(known)
+            for i, result in zip(missing, sampled):
+                self.result[i] = result
+            for i in range(n_functions, len(known)):
+                if known[i] is None:
+                    self.result[i] = derivative_samples(request.expressions[i].compiled,
+                                                        self.result[i - n_functions], request.min_x, request.max_x,
+                                                        self.result[i])
+            if cache is not None:
+                for key, cached, result in zip(keys, known, self.result):
+                    if key is not None and cached is None:  # Missed, sampled now
+                        cache.put(key, request.n_columns, result)
+        except Cancelled:
+            return
+        except Exception as e:
+            self.error = e
+            self.signals.failed.emit(self)
+            return
+        self.signals.finished.emit(self)
+
+
+class ExportJob(PlotJob):
+    """Writes the full resolution samples of functions to files off the GUI thread, one file per function.
+
+    Parameters
+    ----------
+    request : PlotRequest
+       functions and sampling parameters
+    paths : sequence of str
+       file of each function, in the format its extension names
+    """
+    def __init__(self, request, paths):
+        super().__init__(request)
+        self.paths = paths
+
+    def run(self):
+        request = self.request
+        metadata = []
+        try:
+            for number, (expression, path) in enumerate(zip(request.expressions, self.paths)):
+                def progress(percent, number=number):
+                    self.signals.progress.emit(self, (100 * number + percent) // len(self.paths))
+                metadata.append(export_samples(expression.compiled, path, *request[1:7],
+                                               precision=request.precision, memory_budget=request.memory_budget,
+                                               progress=progress, cancelled=self.is_cancelled,
+                                               parallel=request.parallel))
+        except Cancelled:
+            return
+        except Exception as e:
+            self.error = e
+            self.signals.failed.emit(self)
+            return
+        self.result = metadata  # Metadata dict per file
+        self.signals.finished.emit(self)
+
+
+class SurfaceJob(PlotJob):
+    """Traces an implicit curve or samples a heatmap off the GUI thread.
+
+    Parameters
+    ----------
+    request : SurfaceRequest
+       function and rectangle to draw it over
+    """
+    def run(self):
+        request = self.request
+        sample = implicit_curve if request.implicit else sample_surface
+        try:
+            self.result = sample(request.expression.compiled, *request[2:8], cancelled=self.is_cancelled)
+        except Cancelled:
+            return
+        except Exception as e:
+            self.error = e
+            self.signals.failed.emit(self)
+            return
+        self.signals.finished.emit(self)
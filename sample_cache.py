@@ -0,0 +1,187 @@
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+import numpy as np
+from pipeline import SampleResult
+
+CACHE_VERSION = 1  # Part of every key, bumped when the sampling changes what a key gives
+DEFAULT_MAX_BYTES = 512 << 20
+STALE_TEMPORARY_SECONDS = 3600  # Left by a writer that died, removed when evicting
+
+
+def default_cache_dir():
+    """Directory of the sample cache of the user, under XDG_CACHE_HOME or ~/.cache."""
+    root = os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache")
+    return os.path.join(root, "function-plotter", "samples")
+
+
+class SampleCache:
+    """Disk cache of sampled functions shared by the running instances of the application.
+
+    Each entry is a pair of files named after the hash of its key: a JSON file
+    with the SampleResult fields besides the samples, and a .npy file holding x
+    and y as the two rows of one array. The .npy file is memory-mapped on a hit
+    so loading takes about the same time whatever the number of samples.
+
+    Files are written under a temporary name and renamed into place, an entry
+    is therefore either complete or missing to the other instances. The
+    modification time of the .npy file is its last use, once the files exceed
+    max_bytes the least recently used entries are deleted.
+
+    Parameters
+    ----------
+    directory : str
+       directory of the cache files, created when missing
+    max_bytes : int
+       size of the cache files beyond which entries are evicted
+    """
+    def __init__(self, directory=None, max_bytes=DEFAULT_MAX_BYTES):
+        self.directory = directory if directory is not None else default_cache_dir()
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.evictions = 0
+        self._lock = threading.Lock()  # Counters are updated from the plot workers
+        os.makedirs(self.directory, exist_ok=True)
+
+    @staticmethod
+    def key(text, min_x, max_x, step_size=None, adaptive=False, max_points=4000, tolerance=1e-3):
+        """Return the key of the samples of a function, text being the canonical form of its expression."""
+        mode = ["adaptive", max_points, repr(float(tolerance))] if adaptive else ["grid", repr(float(step_size))]
+        fields = [CACHE_VERSION, text, repr(float(min_x)), repr(float(max_x))] + mode
+        return hashlib.sha256(json.dumps(fields).encode()).hexdigest()
+
+    def _paths(self, key):
+        base = os.path.join(self.directory, key)
+        return base + ".json", base + ".npy"
+
+    def get(self, key, n_columns, precision="float64"):
+        """Return the SampleResult stored under key, or None.
+
+        Results reduced to pixel columns when they were sampled only match
+        requests for the same number of columns, float32 results only match
+        requests for the "float32" precision.
+        """
+        meta_path, data_path = self._paths(key)
+        try:
+            with open(meta_path) as file:
+                meta = json.load(file)
+            data = np.load(data_path, mmap_mode="r")
+            if data.shape != (2, meta["n_samples"]) or (meta["decimated"] and meta["n_columns"] != n_columns):
+                raise ValueError("entry does not match the request")
+            if data.dtype == np.float32 and precision != "float32":
+                raise ValueError("entry was sampled in float32")
+            os.utime(data_path)  # Marks the entry as recently used
+        except (OSError, ValueError, KeyError) as e:
+            if not isinstance(e, FileNotFoundError):
+                logging.debug("Sample cache entry %s not used: %s", key, e)
+            self._count("misses")
+            return None
+        self._count("hits")
+        breaks = np.array(meta["breaks"]) if meta["breaks"] is not None else None
+        return SampleResult(data[0], data[1], meta["removed_points"], meta["min_x"], meta["max_x"], meta["min_y"],
+                            meta["max_y"], meta["decimated"], breaks)
+
+    def put(self, key, n_columns, result):
+        """Store a SampleResult under key, then evict entries if the cache grew too large.
+
+        Results larger than half of max_bytes are not stored, they would evict
+        most of the other entries.
+        """
+        data = np.stack([result.x, result.y])
+        if data.nbytes > self.max_bytes // 2:
+            return
+        meta = {"n_samples": len(result.x), "removed_points": int(result.removed_points),
+                "min_x": _to_json(result.min_x), "max_x": _to_json(result.max_x),
+                "min_y": _to_json(result.min_y), "max_y": _to_json(result.max_y),
+                "decimated": bool(result.decimated), "n_columns": n_columns,
+                "breaks": None if result.breaks is None else [float(x) for x in result.breaks]}
+        meta_path, data_path = self._paths(key)
+        try:
+            self._write(meta_path, lambda file: file.write(json.dumps(meta).encode()))
+            self._write(data_path, lambda file: np.save(file, data))
+        except OSError as e:  # Such as a full disk, or a file mapped by another instance on Windows
+            logging.warning("Could not store samples in the cache: %s", e)
+            return
+        self._count("stores")
+        self.evict()
+
+    def _write(self, path, write):
+        descriptor, temporary = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        try:
+            with os.fdopen(descriptor, "wb") as file:
+                write(file)
+            os.replace(temporary, path)
+        except BaseException:
+            os.unlink(temporary)
+            raise
+
+    def _entries(self):
+        """Return {key: [last use, size in bytes]} of the entries, removing stale temporary files."""
+        entries = {}
+        now = time.time()
+        for item in os.scandir(self.directory):
+            try:
+                stat = item.stat()
+            except FileNotFoundError:
+                continue  # Evicted by another instance meanwhile
+            key, extension = os.path.splitext(item.name)
+            if extension == ".tmp":
+                if now - stat.st_mtime > STALE_TEMPORARY_SECONDS:
+                    _remove(item.path)
+                continue
+            if extension not in (".json", ".npy"):
+                continue
+            entry = entries.setdefault(key, [0.0, 0])
+            entry[1] += stat.st_size
+            if extension == ".npy" or entry[0] == 0.0:
+                entry[0] = stat.st_mtime
+        return entries
+
+    def evict(self):
+        """Delete the least recently used entries until the cache fits in max_bytes."""
+        entries = self._entries()
+        total = sum(size for _, size in entries.values())
+        for key, (_, size) in sorted(entries.items(), key=lambda item: item[1][0]):
+            if total <= self.max_bytes:
+                break
+            meta_path, data_path = self._paths(key)
+            _remove(data_path)
+            _remove(meta_path)
+            total -= size
+            self._count("evictions")
+
+    def _count(self, counter):
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+    def stats(self):
+        """Return the hit, miss, store and eviction counters along with the entries and bytes on disk."""
+        entries = self._entries()
+        return {"hits": self.hits, "misses": self.misses, "stores": self.stores, "evictions": self.evictions,
+                "entries": len(entries), "bytes": sum(size for _, size in entries.values()),
+                "max_bytes": self.max_bytes}
+
+    def clear(self):
+        """Delete all entries and reset the counters."""
+        for key in self._entries():
+            for path in self._paths(key):
+                _remove(path)
+        with self._lock:
+            self.hits = self.misses = self.stores = self.evictions = 0
+
+
+def _to_json(value):
+    return None if value is None else float(value)
+
+
+def _remove(path):
+    try:
+        os.unlink(path)
+    except OSError:
+        pass  # Already removed by another instance, or still mapped on Windows
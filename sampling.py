@@ -0,0 +1,81 @@
+import numpy as np
+
+
+def adaptive_sample(evaluate, min_x, max_x, max_points=4000, tolerance=1e-3, initial_points=65, max_depth=16):
+    """Sample a function on [min_x, max_x], refining only where it bends or jumps.
+
+    Starts from a coarse uniform grid and repeatedly bisects the intervals whose
+    midpoint deviates from the straight line through their endpoints by more
+    than tolerance times the vertical extent of the curve. Intervals with a
+    finite and a non-finite endpoint (domain edges, poles) are always refined.
+    Every level evaluates all of its midpoints in one vectorized call.
+
+    Parameters
+    ----------
+    evaluate : callable
+       vectorized function mapping an array of x values to an array of y values
+    min_x, max_x : float
+       sampled range
+    max_points : int
+       budget on the total number of evaluated points
+    tolerance : float
+       accepted interpolation error, relative to the vertical extent of the curve
+    initial_points : int
+       size of the initial uniform grid
+    max_depth : int
+       maximum number of bisections of an initial interval
+
+    Returns
+    -------
+    x, y : numpy.ndarray
+       sorted sample positions and the (possibly non-finite) values there
+    """
+    initial_points = max(2, min(initial_points, max_points))
+    x = np.linspace(min_x, max_x, initial_points)
+    y = np.asarray(evaluate(x), dtype=float)
+    xs, ys = [x], [y]
+    total = len(x)
+
+    # Candidate intervals to test, given by their endpoints
+    left_x, right_x = x[:-1], x[1:]
+    left_y, right_y = y[:-1], y[1:]
+    for _ in range(max_depth):
+        if len(left_x) == 0 or total >= max_points:
+            break
+        finite = y[np.isfinite(y)]
+        scale = np.ptp(finite) if len(finite) > 1 else 0.0
+        scale = scale if scale > 0 else 1.0
+
+        mid_x = (left_x + right_x) / 2
+        # Stop at floating point resolution
+        resolvable = (mid_x > left_x) & (mid_x < right_x)
+        left_x, right_x, left_y, right_y, mid_x = (a[resolvable] for a in (left_x, right_x, left_y, right_y, mid_x))
+
+        remaining = max_points - total
+        if len(mid_x) > remaining:
+            # Not enough budget for the whole level: keep the largest chords first
+            chord = np.abs(right_y - left_y)
+            chord[~np.isfinite(chord)] = np.inf
+            keep = np.sort(np.argsort(-chord, kind="stable")[:remaining])
+            left_x, right_x, left_y, right_y, mid_x = (a[keep] for a in (left_x, right_x, left_y, right_y, mid_x))
+
+        mid_y = np.asarray(evaluate(mid_x), dtype=float)
+        xs.append(mid_x)
+        ys.append(mid_y)
+        total += len(mid_x)
+
+        with np.errstate(invalid="ignore"):
+            error = np.abs(mid_y - (left_y + right_y) / 2)
+        finite_left, finite_mid, finite_right = np.isfinite(left_y), np.isfinite(mid_y), np.isfinite(right_y)
+        jump = (finite_left != finite_mid) | (finite_mid != finite_right)
+        refine = jump | (finite_left & finite_mid & finite_right & (error > tolerance * scale))
+
+        # Both halves of a refined interval become candidates of the next level
+        left_x, right_x = np.concatenate([left_x[refine], mid_x[refine]]), np.concatenate([mid_x[refine], right_x[refine]])
+        left_y, right_y = np.concatenate([left_y[refine], mid_y[refine]]), np.concatenate([mid_y[refine], right_y[refine]])
+        y = np.concatenate([y, mid_y])
+
+    x = np.concatenate(xs)
+    y = np.concatenate(ys)
+    order = np.argsort(x, kind="stable")
+    return x[order], y[order]
@@ -0,0 +1,162 @@
+from collections import namedtuple
+import numpy as np
+from instrumentation import tracer
+from interval import bounds
+from pipeline import Cancelled
+
+BASE_CELL_PIXELS = 32  # Cells of the initial grid
+FINAL_CELL_PIXELS = 1  # Cells the curve is traced through
+HEATMAP_CELL_PIXELS = 2  # Heatmap cells along each axis
+MAX_GRID_SAMPLES = 1 << 20  # Heatmap samples evaluated at once, bounding the temporaries
+OUTLIER_SPREAD = 100.0  # z ranges this many times wider than their central 99% are taken as running off to poles
+
+# Segments of an implicit curve, the two points of each followed by NaN in x and y so that
+# one line draws them all, along with the function evaluations and the cells kept per level
+ContourResult = namedtuple("ContourResult", ["x", "y", "evaluations", "cells"])
+# Values of z = f(x, y) over a grid of cells, row i along y; extent is (min_x, max_x, min_y, max_y)
+# and min_z, max_z bound the color scale, leaving out the values running off to poles
+SurfaceResult = namedtuple("SurfaceResult", ["z", "extent", "removed_points", "min_z", "max_z"])
+
+
+def implicit_curve(compiled, min_x, max_x, min_y, max_y, width, height, cancelled=None):
+    """Trace the curve g(x, y) = 0 over a rectangle drawn width by height pixels.
+
+    The rectangle is cut into cells of about BASE_CELL_PIXELS. Each level
+    keeps the cells whose corners change sign, or whose interval bounds of g
+    contain zero or a pole, and splits them in four, until they are
+    FINAL_CELL_PIXELS wide. The bounds catch the curves that do not cross the
+    edges of a cell, such as small closed curves or steep branches next to a
+    pole. Only the corners of kept cells are evaluated, so the cost grows with
+    the length of the curve rather than with the area. Marching squares then
+    draws one or two segments through each final cell. Final cells where the
+    bounds show a pole change sign without a zero, and are dropped.
+
+    Parameters
+    ----------
+    compiled : CompiledFunction2D
+       g, the function of x and y whose zeros are traced
+    min_x, max_x, min_y, max_y : float
+       rectangle the curve is traced over
+    width, height : int
+       size of the rectangle on screen in pixels
+    cancelled : callable
+       polled between levels, the computation raises Cancelled once it returns True
+    """
+    n_x = max(int(np.ceil(width / BASE_CELL_PIXELS)), 1)
+    n_y = max(int(np.ceil(height / BASE_CELL_PIXELS)), 1)
+    levels = max(int(np.ceil(np.log2(BASE_CELL_PIXELS / FINAL_CELL_PIXELS))), 0)
+    i, j = (index.ravel() for index in np.meshgrid(np.arange(n_x), np.arange(n_y)))
+    evaluations, cells = 0, []
+    for level in range(levels + 1):
+        if cancelled is not None and cancelled():
+            raise Cancelled()
+        if level:
+            # Each kept cell becomes four cells of half its size
+            i = np.concatenate([2 * i, 2 * i + 1, 2 * i, 2 * i + 1])
+            j = np.concatenate([2 * j, 2 * j, 2 * j + 1, 2 * j + 1])
+            n_x, n_y = 2 * n_x, 2 * n_y
+        with tracer.span("evaluate", level=level, cells=len(i)):
+            x_step, y_step = (max_x - min_x) / n_x, (max_y - min_y) / n_y
+            values, n_corners = _corner_values(compiled, i, j, n_y, min_x, min_y, x_step, y_step)
+        evaluations += n_corners
+        keep = (values > 0).any(axis=0) & (values <= 0).any(axis=0)
+        if level < levels:
+            x0, y0 = min_x + i * x_step, min_y + j * y_step
+            lower, upper, pole, _ = bounds(compiled.tree, {"x": x0, "y": y0}, {"x": x0 + x_step, "y": y0 + y_step})
+            keep |= (lower <= 0) & (upper >= 0) | pole
+        i, j, values = i[keep], j[keep], values[:, keep]
+        cells.append(len(i))
+
+    x0, y0 = min_x + i * x_step, min_y + j * y_step
+    _, _, pole, _ = bounds(compiled.tree, {"x": x0, "y": y0}, {"x": x0 + x_step, "y": y0 + y_step})
+    with tracer.span("contour", cells=len(i)):
+        x, y = _marching_squares(values[:, ~pole], x0[~pole], y0[~pole], x_step, y_step)
+    return ContourResult(x, y, evaluations, cells)
+
+
+def _corner_values(compiled, i, j, n_y, min_x, min_y, x_step, y_step):
+    """Return g at the corners (i, j), (i + 1, j), (i, j + 1), (i + 1, j + 1) of each cell as a (4, n) array.
+
+    Corners shared by several cells are evaluated once, the number of
+    evaluated corners is returned along with the values.
+    """
+    corner_i = np.concatenate([i, i + 1, i, i + 1])
+    corner_j = np.concatenate([j, j, j + 1, j + 1])
+    keys, inverse = np.unique(corner_i * (n_y + 1) + corner_j, return_inverse=True)
+    z = compiled.evaluate(min_x + keys // (n_y + 1) * x_step, min_y + keys % (n_y + 1) * y_step)
+    return z[inverse].reshape(4, len(i)), len(keys)
+
+
+# Edges of a cell as pairs of corners, numbered as in _corner_values: bottom, right, top, left
+_EDGES = ((0, 1), (1, 3), (2, 3), (0, 2))
+_CORNER_OFFSETS = ((0, 0), (1, 0), (0, 1), (1, 1))
+
+
+def _marching_squares(values, x0, y0, x_step, y_step):
+    """Return the segments of the zero line of g through each cell, as NaN separated x and y arrays.
+
+    The zero crossing on an edge is interpolated linearly between its
+    corners. Cells crossed on all four edges are saddles, the sign of the mean
+    of the corners tells which corners the zero lines separate.
+    """
+    crossings_x, crossings_y, crossed = [], [], []
+    with np.errstate(all="ignore"):
+        for a, b in _EDGES:
+            t = values[a] / (values[a] - values[b])
+            crossed.append(((values[a] > 0) != (values[b] > 0)) & np.isfinite(values[a]) & np.isfinite(values[b]))
+            crossings_x.append(x0 + (_CORNER_OFFSETS[a][0] + t * (_CORNER_OFFSETS[b][0] - _CORNER_OFFSETS[a][0]))
+                               * x_step)
+            crossings_y.append(y0 + (_CORNER_OFFSETS[a][1] + t * (_CORNER_OFFSETS[b][1] - _CORNER_OFFSETS[a][1]))
+                               * y_step)
+    crossings_x, crossings_y, crossed = np.array(crossings_x), np.array(crossings_y), np.array(crossed)
+    count = crossed.sum(axis=0)
+
+    # Two crossed edges, one segment between them
+    single = np.flatnonzero(count == 2)
+    edges = np.argsort(~crossed[:, single], axis=0, kind="stable")[:2]
+    # Four crossed edges: when the center has the sign of the lower left corner the segments cut off the
+    # lower right and upper left corners, bottom to right and top to left, otherwise the lower left and
+    # upper right ones, left to bottom and top to right
+    saddle = np.flatnonzero(count == 4)
+    center_like_first = (values[:, saddle].mean(axis=0) > 0) == (values[0, saddle] > 0)
+    start_edges = [edges[0], np.where(center_like_first, 0, 3), np.full(len(saddle), 2)]
+    stop_edges = [edges[1], np.where(center_like_first, 1, 0), np.where(center_like_first, 3, 1)]
+    cells = [single, saddle, saddle]
+    start = (np.concatenate(start_edges), np.concatenate(cells))
+    stop = (np.concatenate(stop_edges), np.concatenate(cells))
+    gap = np.full(len(start[0]), np.nan)
+    x = np.column_stack([crossings_x[start], crossings_x[stop], gap]).ravel()
+    y = np.column_stack([crossings_y[start], crossings_y[stop], gap]).ravel()
+    return x, y
+
+
+def sample_surface(compiled, min_x, max_x, min_y, max_y, width, height, cancelled=None):
+    """Evaluate z = f(x, y) over a rectangle drawn width by height pixels, for a heatmap.
+
+    f is evaluated at the centers of cells of HEATMAP_CELL_PIXELS, rows of
+    cells in bands of at most MAX_GRID_SAMPLES points. Other arguments are the
+    same as for implicit_curve.
+    """
+    n_x = max(int(width) // HEATMAP_CELL_PIXELS, 1)
+    n_y = max(int(height) // HEATMAP_CELL_PIXELS, 1)
+    x = min_x + (np.arange(n_x) + 0.5) * ((max_x - min_x) / n_x)
+    y = min_y + (np.arange(n_y) + 0.5) * ((max_y - min_y) / n_y)
+    z = np.empty((n_y, n_x))
+    rows = max(MAX_GRID_SAMPLES // n_x, 1)
+    with tracer.span("evaluate", samples=n_x * n_y):
+        for start in range(0, n_y, rows):
+            if cancelled is not None and cancelled():
+                raise Cancelled()
+            stop = min(start + rows, n_y)
+            z[start:stop] = compiled.evaluate(x[None, :], y[start:stop, None])
+    with tracer.span("filter", samples=n_x * n_y):
+        z[~np.isfinite(z)] = np.nan  # Left blank when drawn
+        finite = z[~np.isnan(z)]
+    extent = (min_x, max_x, min_y, max_y)
+    if len(finite) == 0:
+        return SurfaceResult(z, extent, z.size, None, None)
+    min_z, max_z = np.min(finite), np.max(finite)
+    low, high = np.percentile(finite, [0.5, 99.5])
+    if max_z - min_z > OUTLIER_SPREAD * (high - low):
+        min_z, max_z = low, high
+    return SurfaceResult(z, extent, z.size - len(finite), min_z, max_z)
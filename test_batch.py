@@ -0,0 +1,43 @@
+import os
+import time
+import batch
+from batch import BatchOptions, main, parse_jobs, run_batch, run_job
+
+def test_parse_jobs_defaults_and_overrides():
+    jobs = parse_jobs(["# comment", "", "x^2", "sqrt(x), 0, 4", "log10(x), 1, 10, 0.5"], -2.0, 2.0)
+    assert [(job.line, job.func, job.min_x, job.max_x, job.step_size) for job in jobs] == [
+        (3, "x^2", -2.0, 2.0, None), (4, "sqrt(x)", 0.0, 4.0, None), (5, "log10(x)", 1.0, 10.0, 0.5)]
+
+def test_run_batch_renders_and_reports_failures(tmp_path):
+    options = BatchOptions(str(tmp_path), ("png", "svg", "csv"), False, 30.0, "dark", 4.0, 3.0, 50,
+                           1 << 20)
+    jobs = parse_jobs(["5*x^3 + 2*x", "5*x^", "sqrt(x), -1, 1", "sqrt(x), -2, -1", "5/0 + x"])
+    summaries = run_batch(jobs, options, workers=2)
+    assert [summary["status"] for summary in summaries] == ["ok", "invalid", "ok", "empty", "error"]
+    for ext in ("png", "svg", "csv"):
+        assert os.path.getsize(tmp_path / f"function_00001.{ext}") > 0
+    assert summaries[2]["removed_points"] > 0
+
+def test_main_exit_code(tmp_path):
+    jobs_file = tmp_path / "jobs.txt"
+    jobs_file.write_text("x + 1\nx^*2\n")
+    assert main([str(jobs_file), "--out-dir", str(tmp_path / "out"), "--workers", "1"]) == 1
+
+def test_malformed_lines_are_reported_as_invalid():
+    jobs = parse_jobs(["x^2, 0, ten", "x^2, 0, 1"])
+    assert jobs[0].error.startswith("Invalid range or step") and jobs[1].error is None
+    options = BatchOptions("unused", ("csv",), False, 30.0, "light", 4.0, 3.0, 50, 1 << 20)
+    summary = run_job(jobs[0], options)
+    assert summary["status"] == "invalid" and "ten" in summary["message"]
+
+def test_stuck_job_has_its_worker_killed(tmp_path, monkeypatch):
+    # One chunk of 40M samples runs far past the 10 ms timeout, which is only checked between chunks
+    monkeypatch.setattr(batch, "HARD_TIMEOUT_GRACE", 0.2)
+    options = BatchOptions(str(tmp_path), ("csv",), False, 0.01, "light", 4.0, 3.0, 50, 1 << 31)
+    jobs = parse_jobs(["sqrt(x)*log10(x) + x^3, 1, 2, 2.5e-8", "x^2"])
+    started = time.monotonic()
+    summaries = run_batch(jobs, options, workers=2)
+    assert time.monotonic() - started < 10
+    assert summaries[0]["status"] == "timeout" and "killed" in summaries[0]["message"]
+    assert not os.path.exists(tmp_path / "function_00001.csv")
+    assert summaries[1]["status"] == "ok"
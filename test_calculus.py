@@ -0,0 +1,83 @@
+import numpy as np
+import pytest
+import evaluator
+from calculus import (cumulative_integral, derivative_samples, differentiate, evaluate_on_domain, integral_samples,
+                      may_be_undefined)
+from evaluator import CompiledFunction, evaluate_shared
+from expression_parser import format_expression, parse
+from pipeline import sample_function, sample_functions_for_display, split_at_singularities
+
+def derivative(text):
+    return CompiledFunction(format_expression(differentiate(parse(text))))
+
+def test_derivatives_are_simplified():
+    assert derivative("5*x^3 + 2*x").text == "15*x^2 + 2"
+    assert derivative("(-x^2)").text == "(-2)*x"
+    assert derivative("3").text == "0"
+
+@pytest.mark.parametrize("func", [
+    "5*x^3 + 2*x",
+    "sqrt(x)*x^5 - 3*x^2",
+    "log10(x^2 + 1)",
+    "2^x",
+    "x^x",
+    "x^2/(1 + x^2)",
+    "(x + 1)^(1/3)",
+    "x^-2",
+])
+def test_derivatives_match_finite_differences(func):
+    compiled = CompiledFunction(func)
+    x, h = np.linspace(1.1, 3, 20), 1e-6
+    expected = (compiled.evaluate(x + h) - compiled.evaluate(x - h)) / (2 * h)
+    np.testing.assert_allclose(derivative(func).evaluate(x), expected, rtol=1e-6, atol=1e-8)
+
+def test_derivative_shares_subexpressions_with_function(monkeypatch):
+    calls = []
+    def counting_sqrt(x):
+        calls.append(x)
+        return np.sqrt(x)
+    monkeypatch.setitem(evaluator.NAMESPACE, "sqrt", counting_sqrt)
+
+    function = CompiledFunction("sqrt(x)*x^5")
+    evaluate_shared([function, derivative("sqrt(x)*x^5")], np.linspace(0, 10, 101))
+    assert len(calls) == 1
+
+def test_derivative_is_kept_where_function_is_defined(monkeypatch):
+    function, slope = CompiledFunction("log10(x^2 - 1)"), derivative("log10(x^2 - 1)")
+    outside = lambda x: np.abs(x) > 1
+    sampled = sample_functions_for_display([function, slope], -3.005, 3.0, 0.01)
+    # Sampled on the grid of the function, or evaluated at its samples without evaluating it again
+    on_grid = derivative_samples(slope, sampled[0], -3.005, 3.0, sampled[1])
+    monkeypatch.setattr(function, "evaluate", None)
+    at_samples = derivative_samples(slope, sampled[0], -3.005, 3.0)
+    for result in (on_grid, at_samples):
+        assert len(result.x) > 300 and outside(result.x).all()
+        np.testing.assert_array_equal(result.x, sampled[0].x)
+        np.testing.assert_allclose(result.y, slope.evaluate(result.x))
+    assert not outside(sampled[1].x).all()  # The derivative alone is finite inside (-1, 1)
+
+    x = np.array([-2.0, -0.5, 0.5, 2.0])
+    np.testing.assert_array_equal(np.isfinite(evaluate_on_domain(slope, function, x)), outside(x))
+    assert all(may_be_undefined(parse(func)) for func in ("sqrt(x)", "1/x", "x^0.5", "x^-2", "x^x", "(-2)^x"))
+    assert not any(may_be_undefined(parse(func)) for func in ("5*x^3 + 2*x", "2^x", "(x + 1)^3"))
+
+def test_cumulative_integral():
+    x = np.linspace(0, 1, 1001)
+    integral = cumulative_integral(x, x ** 2)
+    assert integral[0] == 0
+    np.testing.assert_allclose(integral, x ** 3 / 3, atol=1e-6)
+    assert len(cumulative_integral(np.empty(0), np.empty(0))) == 0
+
+def test_integral_starts_again_after_break():
+    compiled = CompiledFunction("1/x")
+    result = split_at_singularities(compiled, sample_function(compiled, -1.0005, 1, 0.001), -1.0005, 1)
+    integral = integral_samples(result)
+    np.testing.assert_allclose(integral.breaks, [0], atol=1e-12)
+    right = np.flatnonzero(integral.x > 0)
+    assert integral.y[right[0]] == 0
+    assert integral.y[right[0] - 1] < 0  # The integral of 1/x from -1 runs off to minus infinity
+    # Away from the pole the integral grows as ln(x)
+    away = right[integral.x[right] >= 0.5]
+    np.testing.assert_allclose(integral.y[away] - integral.y[away[0]], np.log(integral.x[away] / integral.x[away[0]]),
+                               atol=1e-6)
+    assert integral.removed_points == 0
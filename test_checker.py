@@ -0,0 +1,48 @@
+import math
+import pytest
+from checker import Checker
+from expression_parser import BinaryOp, Number, UnaryOp, Variable, format_expression, parse
+
+@pytest.mark.parametrize("func", [
+    "5*x^3 + 2*x", "sqrt(x)*x^5", "log10(x) - 1", "x*(-2)", "x^-2", "5*x^ + 2*x", "(x - 1)/(x + 1)",
+    "1.5e3*x", ".5*x", "  x  ",
+])
+def test_valid_functions(func):
+    assert Checker().validate_function(func) == (True, "")
+
+@pytest.mark.parametrize("func, message, position", [
+    ("5*x^", "Function ends with an operator", 3),
+    ("5*x^*2", "Consecutive operators detected at position 5", 4),
+    ("-x", "Function starts with an operator", 0),
+    ("x**2", "Consecutive operators detected at position 3", 2),
+    ("(x+1", "Unmatched opening parenthesis at position 1", 0),
+    ("x+1)", "Unmatched closing parenthesis at position 4", 3),
+    ("2x", "Missing operator before 'x' at position 2", 1),
+    ("np.sin(x)", "Unknown name 'np' at position 1", 0),
+    ("x % 2", "unsupported character '%' at position 3", 2),
+    ("sqrt x", "must be followed by an argument in parentheses", 5),
+    ("", "Function is empty", 0),
+])
+def test_invalid_functions_report_position(func, message, position):
+    valid, checker_message = Checker().validate_function(func)
+    assert not valid and message in checker_message
+    with pytest.raises(ValueError) as error:
+        parse(func)
+    assert error.value.position == position
+
+def test_tree_structure_and_round_trip():
+    tree = parse("5*x^-2^2 - (x - 1)")
+    assert tree == BinaryOp("-", BinaryOp("*", Number(5), BinaryOp("^", Variable("x"), UnaryOp(
+        "-", BinaryOp("^", Number(2), Number(2))))), BinaryOp("-", Variable("x"), Number(1)))
+    assert parse(format_expression(tree)) == tree
+
+def test_numbers_past_the_float_range_round_trip():
+    tree = parse("x^-1e999 + 1e999")
+    assert tree == BinaryOp("+", BinaryOp("^", Variable("x"), UnaryOp("-", Number(math.inf))), Number(math.inf))
+    assert format_expression(tree) == "x^-1e999 + 1e999"
+    nan = format_expression(BinaryOp("*", Variable("x"), Number(math.nan)))
+    assert nan == "x*(0*1e999)" and Checker().validate_function(nan) == (True, "")
+
+def test_deeply_nested_functions_are_invalid():
+    assert Checker().validate_function("(" * 300 + "x" + ")" * 300) == (False, "Function is nested too deeply.")
+    assert not Checker().validate_function("x^" * 600 + "x")[0]
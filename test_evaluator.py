@@ -0,0 +1,110 @@
+import numpy as np
+import pytest
+import evaluator
+from evaluator import CompiledFunction, evaluate_shared
+from expression_cache import ExpressionCache
+
+@pytest.mark.parametrize("func", [
+    "5*x^3 + 2*x",
+    "x / 2",
+    "sqrt(x)*x^5",
+    "log10(x) - 1",
+    "5*x / (x - x)",
+    "sqrt(-5)+x",
+    "5*x^ + 2*x",
+    "3",
+])
+def test_vectorized_matches_per_point(func):
+    """The vectorized pass must give the same values as evaluating point by point (up to rounding)."""
+    compiled = CompiledFunction(func)
+    x = np.arange(-10, 10, 0.05)
+    with np.errstate(all="ignore"):
+        expected = compiled.evaluate_per_point(x)
+    y = compiled.evaluate(x)
+    assert y.shape == x.shape
+    np.testing.assert_allclose(y, expected, rtol=1e-12)
+
+def test_division_by_zero_constant_raises():
+    with pytest.raises(ZeroDivisionError):
+        CompiledFunction("5/0 + x").evaluate(np.arange(3.0))
+
+def test_expression_cache_hits_and_evictions():
+    cache = ExpressionCache(maxsize=2)
+    assert cache.lookup("5*x^2").valid
+    assert cache.lookup("5 * x ^ 2") is cache.lookup("5*x^2")
+    assert not cache.lookup("5*x^").valid
+    cache.lookup("sqrt(x)")
+    assert cache.stats() == {"hits": 2, "misses": 3, "evictions": 1, "size": 2, "maxsize": 2}
+
+def test_long_and_deeply_nested_functions():
+    cache = ExpressionCache()
+    entry = cache.lookup("+".join(["x"] * 250))
+    assert entry.valid and entry.compiled.source == "+".join(["x"] * 250)
+    np.testing.assert_array_equal(entry.compiled.evaluate(np.arange(3.0)), 250 * np.arange(3.0))
+    assert CompiledFunction("(-2)^x - x^-(x^2)").source == "(-2)**x-x**-x**2"
+    for func in ("1+(" * 250 + "x" + ")" * 250, "+".join(["x"] * 5000)):
+        entry = cache.lookup(func)
+        assert not entry.valid and "nested too deeply" in entry.message
+
+def test_shared_evaluation_reuses_subexpressions(monkeypatch):
+    calls = []
+    def counting_sqrt(x):
+        calls.append(x)
+        return np.sqrt(x)
+    monkeypatch.setitem(evaluator.NAMESPACE, "sqrt", counting_sqrt)
+
+    functions = [CompiledFunction(func) for func in ("sqrt(x) + x^2", "x^2 * sqrt(x)", "2/sqrt(x)")]
+    x = np.linspace(0, 10, 101)
+    ys = evaluate_shared(functions, x)
+    assert len(calls) == 1
+    for compiled, y in zip(functions, ys):
+        np.testing.assert_array_equal(y, compiled.evaluate(x))
+
+def test_shared_evaluation_keeps_errors():
+    with pytest.raises(ZeroDivisionError):
+        evaluate_shared([CompiledFunction("x"), CompiledFunction("5/0 + x")], np.arange(3.0))
+
+@pytest.mark.parametrize("func", [
+    "3*x^7 - 2*x^5 + x^4 - 7*x^2 + x - 1",
+    "(x^2 + 1)^3*x",
+    "sqrt(x)^3 - x^-2",
+    "2^x + x^x",
+    "(2 + 3)*x^2",
+])
+def test_fused_kernel_matches_vectorized(func):
+    compiled = CompiledFunction(func)
+    assert compiled.kernel is not None
+    x = np.linspace(0.1, 3.0, 20000)  # Spans several blocks
+    out = np.empty_like(x)
+    assert compiled.evaluate(x, out=out) is out
+    np.testing.assert_allclose(out, compiled.evaluate_vectorized(x), rtol=1e-12, atol=1e-12 * np.max(np.abs(out)))
+
+def test_fused_kernel_code():
+    source = CompiledFunction("5*x^3 + 2*x").kernel.source
+    assert "power" not in source  # Horner form, multiplications only
+    assert source.count("np.multiply") == 3
+    assert "power" not in CompiledFunction("sqrt(x)^5").kernel.source
+    assert CompiledFunction("(-8)^(1/3) + x").kernel is None  # Complex constant, left to the plain path
+
+def test_huge_integer_powers_overflow_to_inf():
+    # Exact integer powers would take hours, they overflow like float powers instead
+    cache = ExpressionCache()
+    x = np.arange(1.0, 4.0)
+    np.testing.assert_array_equal(cache.lookup("9^9^9 + x").compiled.evaluate(x), np.inf)
+    np.testing.assert_array_equal(cache.lookup("x*(-2)^(2^11 + 1)").compiled.evaluate(x), -np.inf)
+    shared = evaluate_shared([CompiledFunction("9^9^9*x"), CompiledFunction("x")], x)
+    np.testing.assert_array_equal(shared[0], np.inf)
+
+def test_integers_past_the_float_range_overflow_to_inf():
+    cache = ExpressionCache()
+    huge = "1" + "0" * 400
+    x = np.array([0.5, 1.0, 2.0])
+    for func, expected in ((f"x^{huge}", [0.0, 1.0, np.inf]), (f"x^(-{huge})", [np.inf, 1.0, 0.0]),
+                           (f"{huge}*x^2 + x", np.inf), ("x^(2^1000*2^1000)", [0.0, 1.0, np.inf])):
+        entry = cache.lookup(func)
+        assert entry.valid
+        np.testing.assert_array_equal(entry.compiled.evaluate(x), expected)
+    # Unfused evaluation compiles the canonical text of float literals past the range too
+    compiled = cache.lookup("x^-1e999 + 1e999").compiled
+    assert compiled.text == "x^-1e999 + 1e999"
+    np.testing.assert_array_equal(compiled.evaluate_vectorized(x), np.inf)
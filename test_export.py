@@ -0,0 +1,38 @@
+import json
+import numpy as np
+import pytest
+from evaluator import CompiledFunction
+from export import export_samples
+from pipeline import Cancelled, sample_function
+
+def test_formats_hold_the_finite_samples(tmp_path):
+    compiled = CompiledFunction("sqrt(x)*x^5 - 3*x^2")
+    expected = sample_function(compiled, -1.0, 2.0, 2.0 ** -12)
+    loaders = {"npy": np.load, "raw": lambda path: np.fromfile(path, dtype="<f8").reshape(-1, 2),
+               "csv": lambda path: np.loadtxt(path, delimiter=",", skiprows=2)}
+    for format, load in loaders.items():
+        path = str(tmp_path / f"samples.{format}")
+        metadata = export_samples(compiled, path, -1.0, 2.0, 2.0 ** -12, memory_budget=64 * 5000)  # Several chunks
+        samples = load(path)
+        np.testing.assert_array_equal(samples[:, 0], expected.x)
+        np.testing.assert_array_equal(samples[:, 1], expected.y)
+        with open(path + ".json") as file:
+            assert json.load(file) == metadata
+        assert metadata["rows"] == len(expected.x) and metadata["removed_points"] == expected.removed_points
+        assert metadata["n_samples"] == len(expected.x) + expected.removed_points
+
+def test_npy_export_in_float32_is_memory_mappable(tmp_path):
+    path = str(tmp_path / "samples.npy")
+    metadata = export_samples(CompiledFunction("x^2"), path, 0.0, 1.0, 0.001, precision="float32")
+    samples = np.load(path, mmap_mode="r")
+    assert samples.shape == (1000, 2) and samples.dtype == np.float32 and metadata["dtype"] == "<f4"
+    np.testing.assert_allclose(samples[:, 1], samples[:, 0] ** 2, rtol=1e-6)
+
+def test_failed_export_leaves_no_file(tmp_path):
+    path = tmp_path / "samples.csv"
+    with pytest.raises(Cancelled):
+        export_samples(CompiledFunction("x^2"), str(path), 0.0, 1.0, 1e-6, memory_budget=1 << 20,
+                       cancelled=lambda: True)
+    assert not path.exists() and not (tmp_path / "samples.csv.json").exists()
+    with pytest.raises(ValueError):
+        export_samples(CompiledFunction("x^2"), str(tmp_path / "samples.parquet"), 0.0, 1.0, 0.1)
@@ -184,3 +184,200 @@ def test_arithmetic_operations(app, qtbot, func, min_x, max_x):
             closest_index = np.argmin(np.abs(x_data - x_val))
             plot_y_val = y_data[closest_index]
             assert np.isclose(expected_y, plot_y_val, atol=1e-5), f"Function value mismatch for x={x_val}: expected {expected_y}, got {plot_y_val}"
+
+def test_live_plot_keeps_last_plot_while_typing(app, qtbot):
+    app.is_testing_bot = True
+    app.live_checkbox.setChecked(True)
+    app.min_input.setText("-5")
+    app.max_input.setText("5")
+    app.function_input.setText("x^2")
+    qtbot.waitUntil(lambda: bool(app.curves))
+    x_data, y_data = app.figure.axes[0].lines[0].get_data()
+    assert np.allclose(y_data, x_data ** 2)
+
+    # An incomplete expression reports in the status bar and leaves the last plot in place
+    app.function_input.setText("x^2 +")
+    qtbot.wait(2 * app.live_debounce_ms)
+    assert app.msg_box is None
+    assert "operator" in app.statusBar().currentMessage()
+    assert np.allclose(app.figure.axes[0].lines[0].get_ydata(), y_data)
+
+def test_overlaid_functions_reuse_existing_curves(app, qtbot, monkeypatch):
+    app.is_testing_bot = True
+    app.min_input.setText("0")
+    app.max_input.setText("4")
+    app.function_input.setText("x^2; sqrt(x)")
+    app.plot_button.click()
+    lines = app.figure.axes[0].lines
+    assert len(lines) == 2
+    assert np.allclose(lines[0].get_ydata(), lines[0].get_xdata() ** 2)
+    assert np.allclose(lines[1].get_ydata(), np.sqrt(lines[1].get_xdata()))
+
+    # Adding a function only evaluates the new one, removing one evaluates nothing
+    import plot_worker
+    evaluated = []
+    original = plot_worker.sample_functions_for_display
+    def spy(functions, *args, **kwargs):
+        evaluated.append([compiled.text for compiled in functions])
+        return original(functions, *args, **kwargs)
+    monkeypatch.setattr(plot_worker, "sample_functions_for_display", spy)
+    app.function_input.setText("x^2; sqrt(x); 2*x")
+    app.plot_button.click()
+    assert len(app.figure.axes[0].lines) == 3
+    app.function_input.setText("x^2; 2*x")
+    app.plot_button.click()
+    lines = app.figure.axes[0].lines
+    assert len(lines) == 2
+    assert np.allclose(lines[1].get_ydata(), 2 * lines[1].get_xdata())
+    assert evaluated == [["2*x"], []]
+
+def test_timings_readout(app, qtbot):
+    app.is_testing_bot = True
+    app.timings_checkbox.setChecked(True)
+    app.function_input.setText("x^2")
+    app.min_input.setText("-1")
+    app.max_input.setText("1")
+    app.plot_button.click()
+    app.canvas.draw()
+    qtbot.waitUntil(lambda: "draw" in app.stage_times)
+    for stage in ("validate", "grid", "evaluate", "filter", "draw"):
+        assert stage in app.timings_label.text()
+    app.timings_checkbox.setChecked(False)
+
+def test_figure_built_after_first_paint(app, qtbot):
+    assert app.isVisible()
+    qtbot.waitUntil(lambda: app.figure is not None)  # Without any plot being requested
+    assert app.canvas.parent() is not None
+
+def test_export_plotted_functions(app, qtbot, tmp_path):
+    app.is_testing_bot = True
+    app.min_input.setText("0")
+    app.max_input.setText("4")
+    app.function_input.setText("x^2; sqrt(x)")
+    app.plot_button.click()
+    app.export_samples(str(tmp_path / "samples.npy"))
+    for number, func in ((1, np.square), (2, np.sqrt)):
+        samples = np.load(tmp_path / f"samples_{number}.npy")
+        assert len(samples) == 400
+        assert np.allclose(samples[:, 1], func(samples[:, 0]))
+    assert "Exported 800 samples" in app.statusBar().currentMessage()
+
+def test_implicit_curve_and_heatmap_modes(app, qtbot):
+    app.is_testing_bot = True
+    app.mode_input.setCurrentText("g(x, y) = 0")
+    assert app.min_y_input.isVisible()
+    for line_edit, text in ((app.min_input, "-2"), (app.max_input, "2"), (app.min_y_input, "-1.5"),
+                            (app.max_y_input, "1.5"), (app.function_input, "x^2 + y^2 = 1")):
+        line_edit.setText(text)
+    app.plot_button.click()
+    x, y = app.figure.axes[0].lines[0].get_data()
+    assert np.nanmax(np.abs(np.hypot(x, y) - 1)) < 1e-3
+    assert app.figure.axes[0].get_ylim() == (-1.5, 1.5)
+
+    app.mode_input.setCurrentText("z = f(x, y)")
+    app.function_input.setText("x*y")
+    app.plot_button.click()
+    assert len(app.figure.axes[0].images) == 1 and len(app.figure.axes[0].lines[0].get_xdata()) == 0
+
+    app.mode_input.setCurrentText("f(x)")
+    app.function_input.setText("x^2")
+    app.plot_button.click()
+    assert len(app.figure.axes[0].images) == 0 and not app.min_y_input.isVisible()
+    x, y = app.figure.axes[0].lines[0].get_data()
+    assert np.allclose(y, x ** 2)
+
+def test_derivative_and_integral_overlays(app, qtbot, monkeypatch):
+    app.is_testing_bot = True
+    app.min_input.setText("0")
+    app.max_input.setText("2")
+    app.function_input.setText("x^3")
+    app.plot_button.click()
+
+    # Toggling the overlays never samples f again, the derivative is evaluated at its samples
+    import plot_worker
+    evaluated = []
+    original = plot_worker.sample_functions_for_display
+    def spy(functions, *args, **kwargs):
+        evaluated.append([compiled.text for compiled in functions])
+        return original(functions, *args, **kwargs)
+    monkeypatch.setattr(plot_worker, "sample_functions_for_display", spy)
+    app.derivative_checkbox.setChecked(True)
+    app.integral_checkbox.setChecked(True)
+    assert evaluated == [[], []]
+
+    lines = app.figure.axes[0].lines
+    assert [line.get_label() for line in lines] == ["x^3", "d/dx (x^3)", "∫ (x^3) dx"]
+    assert [line.get_linestyle() for line in lines] == ["-", "--", ":"]
+    x, y = lines[1].get_data()
+    assert np.allclose(y, 3 * x ** 2)
+    x, y = lines[2].get_data()
+    assert np.allclose(y, (x ** 4 - x[0] ** 4) / 4, atol=1e-3)
+
+    app.derivative_checkbox.setChecked(False)
+    assert evaluated[-1] == []
+    assert [line.get_label() for line in app.figure.axes[0].lines] == ["x^3", "∫ (x^3) dx"]
+
+def test_derivative_is_drawn_where_function_is_defined(app, qtbot):
+    app.is_testing_bot = True
+    app.min_input.setText("-3")
+    app.max_input.setText("3")
+    app.function_input.setText("log10(x^2 - 1)")
+    app.plot_button.click()
+    app.derivative_checkbox.setChecked(True)
+    x, y = app.figure.axes[0].lines[1].get_data()
+    assert np.all(np.abs(x[np.isfinite(y)]) > 1)
+
+    app.figure.axes[0].set_xlim(-1.5, 1.5)  # The view is resampled, the derivative stays masked
+    x, y = app.figure.axes[0].lines[1].get_data()
+    assert np.sum(np.isfinite(y)) > 100 and np.all(np.abs(x[np.isfinite(y)]) > 1)
+
+def test_zooming_into_a_streamed_grid_samples_the_view(app, qtbot):
+    # 200k samples are over the budget, only their reduction to the canvas columns is kept
+    app.is_testing_bot = True
+    app.memory_budget = 1 << 16
+    app.auto_step_checkbox.setChecked(False)
+    app.step_input.setText("0.0001")
+    app.min_input.setText("0")
+    app.max_input.setText("20")
+    app.function_input.setText("sqrt(x)*x^2")
+    app.plot_button.click()
+    curve = app.curves[0]
+    assert curve.streamed_grid is not None and len(curve.x_data) < 10000
+
+    app.figure.axes[0].set_xlim(3.0, 3.1)  # About a tenth of a column of the whole range
+    x, y = app.figure.axes[0].lines[0].get_data()
+    visible = (x >= 3.0) & (x <= 3.1)
+    assert np.sum(visible) > 500  # Every grid point, the view is 1000 steps wide
+    assert np.allclose(np.diff(x[visible]), 1e-4)
+    assert np.allclose(y, np.sqrt(x) * x ** 2)
+
+def test_curves_resample_when_another_curve_has_no_samples(app, qtbot, monkeypatch):
+    app.is_testing_bot = True
+    app.min_input.setText("0")
+    app.max_input.setText("10")
+    app.function_input.setText("x^2; 2*x")
+    app.plot_button.click()
+    first, second = app.curves
+    monkeypatch.setattr(first.viewport_sampler, "sample", lambda min_x, max_x, width: (np.empty(0), np.empty(0)))
+
+    app.figure.axes[0].set_xlim(2.0, 2.5)
+    x, y = second.line.get_data()
+    assert x[0] <= 2.0 and 2.5 <= x[-1] and np.max(np.diff(x)) < 0.5 / 100
+    assert np.allclose(y, 2 * x)
+    assert app.sampled_view == (x[0], x[-1], x[1] - x[0])
+
+def test_integral_of_a_streamed_grid_runs_through_every_sample(app, qtbot):
+    app.is_testing_bot = True
+    app.memory_budget = 1 << 16
+    app.auto_step_checkbox.setChecked(False)
+    app.step_input.setText("0.0001")
+    app.min_input.setText("-2")
+    app.max_input.setText("2")
+    app.function_input.setText("x^3 - 3*x")
+    app.plot_button.click()
+    assert app.curves[0].streamed_grid is not None
+
+    app.integral_checkbox.setChecked(True)
+    x, y = app.figure.axes[0].lines[1].get_data()
+    antiderivative = x ** 4 / 4 - 3 * x ** 2 / 2
+    np.testing.assert_allclose(y, antiderivative - antiderivative[0], atol=1e-6)
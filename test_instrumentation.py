@@ -0,0 +1,26 @@
+import json
+from evaluator import CompiledFunction
+from instrumentation import JsonLinesWriter, Tracer, tracer
+from pipeline import sample_function
+
+def test_disabled_tracer_records_nothing():
+    disabled = Tracer()
+    assert disabled.span("evaluate") is disabled.span("filter")  # Shared no-op, nothing allocated
+    with disabled.span("evaluate"):
+        pass
+    assert disabled.latest == {}
+
+def test_spans_written_as_json_lines(tmp_path):
+    path = tmp_path / "trace.jsonl"
+    writer = JsonLinesWriter(str(path))
+    tracer.add_listener(writer)
+    try:
+        sample_function(CompiledFunction("sqrt(x)"), -1.0, 1.0, 0.01)
+    finally:
+        tracer.remove_listener(writer)
+        writer.close()
+    assert not tracer.enabled
+    records = [json.loads(line) for line in path.read_text().splitlines()]
+    assert [record["span"] for record in records] == ["grid", "evaluate", "filter"]
+    assert records[1]["samples"] == 200
+    assert all(record["seconds"] >= 0 for record in records)
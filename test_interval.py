@@ -0,0 +1,67 @@
+import numpy as np
+import pytest
+from evaluator import CompiledFunction
+from expression_parser import parse
+from interval import analyze, bounds, insert_breaks
+from pipeline import sample_for_display
+
+@pytest.mark.parametrize("func", ["x^2 - 4", "5*x^3 + 2*x", "sqrt(x)*x^5", "1/(x - 2)", "x^-2", "log10(x^2 + 1)",
+                                  "x^1.5 - x", "2^x", "(x - 1)*(x + 3)/(x^2 + 1)"])
+def test_bounds_enclose_samples(func):
+    """Every finite sample lies within the bounds of its sub-interval."""
+    edges = np.linspace(-3.0, 3.0, 61)
+    lower, upper, _, _ = bounds(parse(func), edges[:-1], edges[1:])
+    compiled = CompiledFunction(func)
+    for lo, hi, low, high in zip(edges[:-1], edges[1:], lower, upper):
+        with np.errstate(all="ignore"):
+            y = compiled.evaluate(np.linspace(lo, hi, 50))
+        y = y[np.isfinite(y)]
+        assert np.all(y >= low - 1e-9 * abs(low)) and np.all(y <= high + 1e-9 * abs(high))
+
+@pytest.mark.parametrize("func, poles, edges", [
+    ("1/(x - 2)", [2.0], []),
+    ("1/(x - 2) + 1/(x + 3)", [-3.0, 2.0], []),
+    ("x^-2", [0.0], []),
+    ("x/x", [], []),  # Removable, nothing to split
+    ("(x - 1)/(x^2 - 1)", [-1.0], []),
+    ("sqrt(x^2 - 1)", [], [-1.0, 1.0]),
+    ("log10(x)", [], [0.0]),
+    ("x^2 - 4", [], []),
+])
+def test_analyze_finds_poles_and_domain_edges(func, poles, edges):
+    analysis = analyze(CompiledFunction(func), -10.0, 10.0)
+    np.testing.assert_allclose(analysis.poles, poles, atol=1e-6)
+    np.testing.assert_allclose(analysis.edges, edges, atol=1e-6)
+
+def test_poles_split_the_line_and_bound_the_y_range():
+    result = sample_for_display(CompiledFunction("1/(x - 2)"), -10.0, 10.0, 0.003)
+    assert result.max_y < 1e3 and result.min_y > -1e3
+    x, y = insert_breaks(result.x, result.y, result.breaks)
+    assert len(x) == len(result.x) + 1
+    (gap,) = np.flatnonzero(np.isnan(y))
+    assert x[gap] == x[gap - 1] < 2.0 < x[gap + 1]
+
+def test_insert_breaks_outside_samples():
+    x, y = np.arange(5.0), np.arange(5.0)
+    assert insert_breaks(x, y, np.array([-1.0, 10.0])) == (x, y)
+    assert insert_breaks(x, y, None) == (x, y)
+
+def test_power_bounds_with_exponents_differing_between_cells():
+    tree = parse("x^y", ("x", "y"))
+    lower, upper, _, partial = bounds(tree, {"x": np.array([2.0, 2.0, -1.0]), "y": np.array([2.0, 3.0, 0.5])},
+                                      {"x": np.array([3.0, 3.0, 1.0]), "y": np.array([2.0, 3.0, 0.5])})
+    assert list(lower) == [4.0, 8.0, 0.0] and list(upper) == [9.0, 27.0, 1.0] and list(partial) == [False, False, True]
+
+def test_analysis_is_shared_by_plots_of_the_same_range(monkeypatch):
+    import pipeline
+    calls = []
+    def counting_analyze(*args):
+        calls.append(args)
+        return analyze(*args)
+    monkeypatch.setattr(pipeline, "analyze", counting_analyze)
+    compiled = CompiledFunction("1/(x - 0.123)")
+    preview = sample_for_display(compiled, -1.0, 1.0, 0.01)
+    full = sample_for_display(compiled, -1.0, 1.0, 0.0001)
+    assert len(calls) == 1 and list(preview.breaks) == list(full.breaks)
+    sample_for_display(compiled, -1.0, 2.0, 0.01)
+    assert len(calls) == 2
@@ -0,0 +1,58 @@
+import numpy as np
+import pytest
+from decimation import StreamingDecimator
+from evaluator import CompiledFunction, evaluate_shared
+from parallel import ParallelEvaluator
+from pipeline import Cancelled, sample_function, sample_functions, stream_function
+
+@pytest.fixture(scope="module")
+def parallel():
+    evaluator = ParallelEvaluator(workers=2, min_samples=1000)
+    yield evaluator
+    evaluator.shutdown()
+
+def test_matches_serial_evaluation(parallel):
+    functions = [CompiledFunction(func) for func in ("sqrt(x)*x^5 - 3*x^2", "x^2 + sqrt(x)", "1/x")]
+    x = np.linspace(-1.0, 2.0, 200001)
+    for y, expected in zip(parallel.evaluate(functions, x), evaluate_shared(functions, x)):
+        np.testing.assert_array_equal(y, expected)
+    # Fewer functions, then a larger grid, reuse and grow the shared buffers
+    x = np.linspace(-1.0, 2.0, 300001)
+    np.testing.assert_array_equal(parallel.evaluate(functions[:1], x)[0], functions[0].evaluate(x))
+
+def test_sampling_through_the_pool(parallel):
+    compiled = CompiledFunction("sqrt(x)*x^5 - 3*x^2")
+    percents = []
+    result = sample_function(compiled, -1.0, 2.0, 1e-5, progress=percents.append, parallel=parallel)
+    expected = sample_function(compiled, -1.0, 2.0, 1e-5)
+    np.testing.assert_array_equal(result.y, expected.y)
+    assert result.removed_points == expected.removed_points and percents[-1] == 100
+
+    functions = [compiled, CompiledFunction("x^2")]
+    results = sample_functions(functions, -1.0, 2.0, 1e-5, parallel=parallel)
+    for result, expected in zip(results, sample_functions(functions, -1.0, 2.0, 1e-5)):
+        np.testing.assert_array_equal(result.y, expected.y)
+
+    decimators = [StreamingDecimator(-1.0, 2.0, 300) for _ in range(2)]
+    stats = [stream_function(compiled, -1.0, 2.0, 1e-5, [decimator], memory_budget=64 * 50000, parallel=evaluator)
+             for decimator, evaluator in zip(decimators, (parallel, None))]
+    assert stats[0] == stats[1]
+    np.testing.assert_array_equal(decimators[0].result()[1], decimators[1].result()[1])
+
+def test_errors_and_cancellation(parallel):
+    x = np.linspace(0.0, 1.0, 100000)
+    with pytest.raises(ZeroDivisionError):
+        parallel.evaluate([CompiledFunction("5/0 + x")], x)
+
+    def cancel():
+        raise Cancelled()
+    with pytest.raises(Cancelled):
+        parallel.evaluate([CompiledFunction("x^2")], x, check=cancel)
+    np.testing.assert_array_equal(parallel.evaluate([CompiledFunction("x^2")], x)[0], x ** 2)
+
+def test_small_or_single_process_stays_serial():
+    assert not ParallelEvaluator(workers=1).worthwhile(10 ** 9)
+    evaluator = ParallelEvaluator(workers=2)
+    assert not evaluator.worthwhile(1000)
+    evaluator.evaluate([CompiledFunction("x")], np.arange(1000.0))
+    assert evaluator._pool is None
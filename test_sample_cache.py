@@ -0,0 +1,81 @@
+import os
+import numpy as np
+import plot_worker
+from evaluator import CompiledFunction
+from expression_cache import ExpressionCache
+from pipeline import sample_for_display
+from plot_worker import PlotJob, PlotRequest
+from sample_cache import SampleCache
+
+def sampled(func, step_size=0.01):
+    compiled = CompiledFunction(func)
+    return SampleCache.key(compiled.text, -1.0, 2.0, step_size), sample_for_display(compiled, -1.0, 2.0, step_size)
+
+def test_round_trip_through_memory_map(tmp_path):
+    cache = SampleCache(str(tmp_path))
+    key, result = sampled("1/x + sqrt(x)")
+    assert cache.get(key, 300) is None
+    cache.put(key, 300, result)
+
+    loaded = SampleCache(str(tmp_path)).get(key, 300)  # Another instance sharing the directory
+    assert isinstance(loaded.x, np.memmap)
+    np.testing.assert_array_equal(loaded.x, result.x)
+    np.testing.assert_array_equal(loaded.y, result.y)
+    np.testing.assert_array_equal(loaded.breaks, result.breaks)
+    assert loaded[2:8] == result[2:8]
+    assert cache.stats()["hits"] == 0 and cache.stats()["misses"] == 1 and cache.stats()["stores"] == 1
+
+def test_key_tells_sampling_modes_apart():
+    assert SampleCache.key("x", 0, 1, 0.1) == SampleCache.key("x", 0.0, 1.0, 0.1)
+    keys = {SampleCache.key("x", 0, 1, 0.1), SampleCache.key("x", 0, 1, 0.2), SampleCache.key("x", 0, 2, 0.1),
+            SampleCache.key("x", 0, 1, adaptive=True), SampleCache.key("x", 0, 1, adaptive=True, max_points=10),
+            SampleCache.key("x^2", 0, 1, 0.1)}
+    assert len(keys) == 6
+
+def test_decimated_entries_need_the_same_columns(tmp_path):
+    cache = SampleCache(str(tmp_path))
+    key, result = sampled("x^2")
+    cache.put(key, 300, result._replace(decimated=True))
+    assert cache.get(key, 400) is None
+    assert cache.get(key, 300) is not None
+
+def test_least_recently_used_entries_are_evicted(tmp_path):
+    entries = [sampled(func) for func in ("x", "x^2", "x^3")]
+    cache = SampleCache(str(tmp_path))
+    cache.put(entries[0][0], 300, entries[0][1])
+    entry_bytes = cache.stats()["bytes"]
+    cache.max_bytes = 2 * entry_bytes + entry_bytes // 2  # Room for two entries
+    cache.put(entries[1][0], 300, entries[1][1])
+
+    # Explicit use times, coarse file system timestamps could tie the two puts
+    for number, (key, _) in enumerate(entries[:2]):
+        os.utime(os.path.join(str(tmp_path), key + ".npy"), (number, number))
+    assert cache.get(entries[0][0], 300) is not None
+    cache.put(entries[2][0], 300, entries[2][1])
+
+    assert cache.get(entries[1][0], 300) is None
+    assert cache.get(entries[0][0], 300) is not None and cache.get(entries[2][0], 300) is not None
+    assert cache.stats()["evictions"] == 1 and cache.stats()["bytes"] <= cache.max_bytes
+
+def test_plot_job_samples_once(tmp_path, qtbot, monkeypatch):
+    calls = []
+    sample = plot_worker.sample_functions_for_display
+    monkeypatch.setattr(plot_worker, "sample_functions_for_display",
+                        lambda functions, *args, **kwargs: calls.append(functions) or sample(functions, *args, **kwargs))
+    expressions = tuple(ExpressionCache().lookup(func) for func in ("x^2", "sqrt(x)"))
+    request = PlotRequest(expressions, -1.0, 2.0, 0.01, False, 4000, 1e-3, 300, 1 << 26, True,
+                          cache=SampleCache(str(tmp_path)))
+    jobs = [PlotJob(request), PlotJob(request)]
+    for job in jobs:
+        job.run()
+    assert [len(functions) for functions in calls] == [2, 0]
+    for first, second in zip(*(job.result for job in jobs)):
+        np.testing.assert_array_equal(first.y, second.y)
+
+def test_float32_entries_only_serve_float32_requests(tmp_path):
+    cache = SampleCache(str(tmp_path))
+    compiled = CompiledFunction("x^2")
+    key = SampleCache.key(compiled.text, -1.0, 2.0, 0.01)
+    cache.put(key, 300, sample_for_display(compiled, -1.0, 2.0, 0.01, precision="float32"))
+    assert cache.get(key, 300) is None
+    assert cache.get(key, 300, "float32").y.dtype == np.float32
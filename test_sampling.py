@@ -0,0 +1,150 @@
+import tracemalloc
+import numpy as np
+import pytest
+from calculus import cumulative_integral
+from decimation import StreamingDecimator, minmax_decimate
+from evaluator import CompiledFunction
+from pipeline import (Cancelled, float32_is_accurate, sample_for_display, sample_function, sample_functions_for_display,
+                      stream_function)
+from sampling import adaptive_sample
+from viewport import TileCache
+
+def max_interpolation_error(evaluate, x, y, reference_x):
+    """Largest deviation of the polyline (x, y) from the function on reference_x."""
+    return np.max(np.abs(np.interp(reference_x, x, y) - evaluate(reference_x)))
+
+def test_adaptive_sampling_beats_uniform_grid():
+    """The same number of evaluations gives a smaller error than a uniform grid."""
+    evaluate = CompiledFunction("sqrt(x)*x^5").evaluate
+    x, y = adaptive_sample(evaluate, 0, 10, max_points=2000, tolerance=1e-5)
+    assert len(x) <= 2000
+    assert np.all(np.diff(x) > 0)
+
+    uniform_x = np.linspace(0, 10, len(x))
+    reference_x = np.linspace(0, 10, 100001)
+    adaptive_error = max_interpolation_error(evaluate, x, y, reference_x)
+    uniform_error = max_interpolation_error(evaluate, uniform_x, evaluate(uniform_x), reference_x)
+    assert adaptive_error < uniform_error / 2
+
+def test_adaptive_sampling_refines_domain_edges():
+    x, y = adaptive_sample(CompiledFunction("sqrt(x)").evaluate, -10, 10, max_points=500)
+    finite_x = x[np.isfinite(y)]
+    # The first valid sample is much closer to the domain edge than the initial grid spacing
+    assert finite_x[0] < 1e-3
+
+def test_tile_cache_reuses_tiles():
+    compiled = CompiledFunction("x^2 - 4")
+    calls = []
+    cache = TileCache(lambda x: calls.append(len(x)) or compiled.evaluate(x))
+    x, y = cache.sample(-3.0, 5.0, 600)
+    assert x[0] <= -3.0 and x[-1] >= 5.0
+    assert len(x) >= 600
+    np.testing.assert_allclose(y, x ** 2 - 4)
+
+    evaluations = len(calls)
+    cache.sample(-1.0, 2.0, 300)  # Zoomed in view at the same resolution
+    cache.sample(-3.0, 5.0, 600)  # Back to the first view
+    assert len(calls) == evaluations
+
+def test_minmax_decimation_keeps_spikes():
+    x = np.linspace(0, 1, 1000001)
+    y = np.sin(20 * x)
+    y[123457] = 50.0  # Spike much narrower than a pixel column
+    dx, dy = minmax_decimate(x, y, 500)
+    assert len(dx) <= 4 * 500
+    assert dy.max() == 50.0 and dy.min() == y.min()
+    # Only original samples, in order
+    assert np.all(np.diff(dx) > 0)
+    np.testing.assert_array_equal(dy, y[np.searchsorted(x, dx)])
+
+def test_minmax_decimation_of_a_view():
+    x = np.arange(1000000.0)
+    dx, dy = minmax_decimate(x, x, 100, 5000.0, 6000.0)
+    assert dx[0] <= 5000.0 and dx[-1] >= 6000.0
+    assert dx[1] > 5000.0 and dx[-2] < 6000.0
+
+def test_sample_function_filters_and_reports():
+    percents = []
+    result = sample_function(CompiledFunction("sqrt(x)"), -1.0, 1.0, 0.001, progress=percents.append)
+    assert result.removed_points == 1000
+    assert result.min_x >= 0.0 and result.min_y == np.min(result.y)
+    assert np.all(np.isfinite(result.y))
+    assert percents[-1] == 100
+
+def test_sample_function_cancellation():
+    with pytest.raises(Cancelled):
+        sample_function(CompiledFunction("x"), 0.0, 1.0, 1e-7, cancelled=lambda: True)
+
+@pytest.mark.parametrize("memory_budget", [1 << 26, 64 * 5000])
+def test_overlaid_functions_match_single_sampling(memory_budget):
+    functions = [CompiledFunction(func) for func in ("sqrt(x)", "x^2 - sqrt(x)", "1/x")]
+    results = sample_functions_for_display(functions, -1.0, 2.0, 2.0 ** -12, n_columns=300, memory_budget=memory_budget)
+    for compiled, result in zip(functions, results):
+        expected = sample_for_display(compiled, -1.0, 2.0, 2.0 ** -12, n_columns=300, memory_budget=memory_budget // 3)
+        assert result.removed_points == expected.removed_points
+        assert result.decimated == expected.decimated
+        np.testing.assert_allclose(result.x, expected.x, rtol=1e-9)
+        np.testing.assert_allclose(result.y, expected.y, rtol=1e-9)
+
+def test_streaming_matches_in_memory_decimation():
+    compiled = CompiledFunction("sqrt(x)*x^5 - 3*x^2")
+    decimator = StreamingDecimator(-1.0, 2.0, 300)
+    stats = stream_function(compiled, -1.0, 2.0, 2.0 ** -16, [decimator], memory_budget=64 * 5000)
+
+    result = sample_function(compiled, -1.0, 2.0, 2.0 ** -16)
+    assert stats.n_samples == result.removed_points + len(result.x)
+    assert stats.removed_points == result.removed_points
+    assert (stats.min_y, stats.max_y) == (result.min_y, result.max_y)
+    x, y = decimator.result()
+    expected_x, expected_y = minmax_decimate(result.x, result.y, 300, -1.0, 2.0)
+    np.testing.assert_allclose(x, expected_x, rtol=1e-9)
+    np.testing.assert_allclose(y, expected_y, rtol=1e-9)
+
+def test_streamed_integral_matches_in_memory_integral():
+    functions = [CompiledFunction("1/(x - 0.5) + sqrt(x + 2)"), CompiledFunction("x^3 - x")]
+    streamed = sample_functions_for_display(functions, -3.0, 3.0, 2.0 ** -14, n_columns=300,
+                                            memory_budget=64 * 5000, integrals=True)
+    for compiled, result in zip(functions, streamed):
+        full = sample_for_display(compiled, -3.0, 3.0, 2.0 ** -14)
+        expected = cumulative_integral(full.x, full.y, full.breaks)
+        assert result.decimated and result.integral.decimated
+        np.testing.assert_array_equal(result.integral.breaks, full.breaks)
+        # The running sum goes through every grid point, not only the ones kept per column
+        np.testing.assert_allclose(result.integral.y, expected[np.searchsorted(full.x, result.integral.x)],
+                                   rtol=1e-9, atol=1e-9)
+        assert (result.integral.min_y, result.integral.max_y) == pytest.approx((expected.min(), expected.max()))
+    assert sample_functions_for_display(functions, -3.0, 3.0, 2.0 ** -14, memory_budget=64 * 5000)[0].integral is None
+
+def test_streaming_memory_does_not_grow_with_samples():
+    compiled = CompiledFunction("x^2")
+    peaks = []
+    for step in (1e-4, 1e-6):
+        tracemalloc.start()
+        stream_function(compiled, 0.0, 1.0, step, [StreamingDecimator(0.0, 1.0, 500)], memory_budget=1 << 20)
+        peaks.append(tracemalloc.get_traced_memory()[1])
+        tracemalloc.stop()
+    assert peaks[1] < 2 * peaks[0]
+
+def test_float32_sampling_follows_the_float64_grid():
+    compiled = CompiledFunction("sqrt(x)*x^5 - 3*x^2")
+    expected = sample_function(compiled, -1.0, 2.0, 2.0 ** -12)
+    for memory_budget in (1 << 26, 64 * 5000):  # In memory, then streamed
+        result = sample_for_display(compiled, -1.0, 2.0, 2.0 ** -12, n_columns=300, memory_budget=memory_budget,
+                                    precision="float32")
+        assert result.x.dtype == result.y.dtype == np.float32
+        assert result.removed_points == expected.removed_points
+        np.testing.assert_allclose(result.max_y, expected.max_y, rtol=1e-6)
+    np.testing.assert_allclose(sample_function(compiled, -1.0, 2.0, 2.0 ** -12, dtype=np.float32).x, expected.x)
+
+def test_auto_precision_falls_back_to_float64():
+    assert float32_is_accurate([CompiledFunction("x^3 - 2*x")], -2.0, 2.0, 800, 600)
+    assert not float32_is_accurate([CompiledFunction("x^40")], -10.0, 10.0, 800, 600)  # Overflows float32
+    assert not float32_is_accurate([CompiledFunction("x")], 1e6, 1e6 + 1.0, 800, 600)  # x steps below float32 spacing
+    # float32 rounds 1e5 + sqrt(x) by about 0.004, over half a pixel row once the plot is 150 pixels high
+    assert float32_is_accurate([CompiledFunction("100000 + sqrt(x)")], 0.0, 1.0, 800, 50)
+    assert not float32_is_accurate([CompiledFunction("100000 + sqrt(x)")], 0.0, 1.0, 50, 800)
+    compiled = CompiledFunction("x^3 - 2*x")
+    assert sample_for_display(compiled, -2.0, 2.0, 0.01, precision="auto", preview=True).y.dtype == np.float32
+    assert sample_for_display(compiled, -2.0, 2.0, 0.01, precision="auto").y.dtype == np.float64
+    assert sample_for_display(CompiledFunction("x^40"), -10.0, 10.0, 0.01, precision="auto",
+                              preview=True).y.dtype == np.float64
@@ -0,0 +1,67 @@
+import numpy as np
+import pytest
+from checker import Checker
+from evaluator import CompiledFunction2D
+from expression_parser import parse, parse_equation
+from interval import bounds
+from surface import implicit_curve, sample_surface
+
+def curve(text, ranges=(-2.0, 2.0, -2.0, 2.0), width=800, height=600):
+    compiled = CompiledFunction2D(parse_equation(text))
+    result = implicit_curve(compiled, *ranges, width, height)
+    points = ~np.isnan(result.x)
+    return result, result.x[points], result.y[points]
+
+def test_equations_and_their_errors():
+    assert parse_equation("x^2 + y^2 = 1") == parse("x^2 + y^2 - (1)", ("x", "y"))
+    assert Checker(("x", "y"), equation=True).validate_function("y = sqrt(x)") == (True, "")
+    for text, position in (("x = y = 1", 6), ("= 1", 0), ("x^2 =", 4), ("x = 2z", 5)):
+        with pytest.raises(ValueError) as error:
+            parse_equation(text)
+        assert error.value.position == position
+    assert not Checker().validate_function("x + y")[0]
+
+def test_circle_is_traced_at_pixel_resolution():
+    result, x, y = curve("x^2 + y^2 = 1", width=800, height=800)
+    assert np.all(np.abs(np.hypot(x, y) - 1) < 1e-4)
+    angles = np.sort(np.arctan2(y, x))
+    assert np.max(np.diff(angles)) < 4 * 2 * np.pi / 800 and angles[0] < -3.1 and angles[-1] > 3.1  # No gap
+
+def test_curves_smaller_than_a_cell():
+    _, x, y = curve("x^2 + y^2 = 0.25", (-10.0, 10.0, -10.0, 10.0))  # 40 pixels across
+    assert len(x) > 100 and np.all(np.abs(np.hypot(x, y) - 0.5) < 1e-3)
+
+def test_cost_grows_with_curve_length_not_area():
+    small, _, _ = curve("x^2 + y^2 = 1", width=960, height=540)
+    large, _, _ = curve("x^2 + y^2 = 1", width=3840, height=2160)
+    assert large.evaluations < 0.01 * 3840 * 2160
+    assert large.evaluations < 6 * small.evaluations  # 4 times the length, 16 times the area
+
+def test_saddles_poles_and_domain_edges():
+    _, x, y = curve("x^2 - y^2")  # Two lines crossing at the origin
+    assert np.all(np.abs(np.abs(x) - np.abs(y)) < 1e-2)
+    assert np.sum((x > 0) & (y > 0)) > 0 and np.sum((x < 0) & (y > 0)) > 0
+    _, x, y = curve("y = 1/x", (-10.0, 10.0, -10.0, 10.0))  # The sign change across x = 0 is not part of the curve
+    assert np.all(np.abs(x) > 0.09) and np.all(np.minimum(np.abs(x - 1 / y), np.abs(y - 1 / x)) < 1e-2)
+    for side in (x > 0, x < 0):  # Each branch goes up to the top or bottom edge, where |x| = 0.1
+        assert np.min(np.abs(x[side])) < 0.11 and np.max(np.abs(y[side])) > 9.9
+    _, x, y = curve("y = sqrt(x)")
+    assert np.all(x >= 0) and np.all(y >= 0)
+
+def test_bounds_of_two_variables():
+    tree = parse("x*y - 1/y", ("x", "y"))
+    lower, upper, pole, _ = bounds(tree, {"x": np.array([1.0, 1.0]), "y": np.array([1.0, -1.0])},
+                                   {"x": np.array([2.0, 2.0]), "y": np.array([2.0, 1.0])})
+    assert (lower[0], upper[0]) == (0.0, 3.5) and list(pole) == [False, True]
+
+def test_heatmap_values_and_color_scale():
+    compiled = CompiledFunction2D("x*y + sqrt(x)")
+    result = sample_surface(compiled, -1.0, 1.0, 0.0, 2.0, 400, 300)
+    assert result.z.shape == (150, 200) and result.extent == (-1.0, 1.0, 0.0, 2.0)
+    x, y = 0.005, 1.0 + 1 / 150  # Cell centers of column 100, row 75
+    assert result.z[75, 100] == pytest.approx(x * y + np.sqrt(x))
+    assert result.removed_points == 150 * 100 and np.all(np.isnan(result.z[:, :100]))
+    assert result.max_z == pytest.approx(np.nanmax(result.z))
+
+    result = sample_surface(CompiledFunction2D("1/((x - 0.004)^2 + (y - 0.004)^2)"), -1.0, 1.0, -1.0, 1.0, 400, 400)
+    assert result.max_z < np.nanmax(result.z) / 100  # The pole does not wash the colors out
@@ -0,0 +1,69 @@
+import math
+from collections import OrderedDict
+import numpy as np
+
+
+class TileCache:
+    """Samples of one function over fixed x tiles, reused across zooms and pans.
+
+    The x axis is cut into tiles of tile_points samples with a power-of-two
+    spacing, so a tile is identified by (spacing exponent, tile index) and the
+    same region viewed again at a similar resolution is served from the cache.
+
+    Parameters
+    ----------
+    evaluate : callable
+       vectorized function mapping an array of x values to an array of y values
+    tile_points : int
+       number of samples per tile
+    maxsize : int
+       maximum number of tiles kept before the least recently used is evicted
+    """
+    def __init__(self, evaluate, tile_points=256, maxsize=512):
+        self.evaluate = evaluate
+        self.tile_points = tile_points
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._tiles = OrderedDict()
+
+    def sample(self, min_x, max_x, n_points):
+        """Return samples covering [min_x, max_x] with at least n_points samples.
+
+        Values are returned as evaluated, non-finite ones included.
+        """
+        if not (np.isfinite(min_x) and np.isfinite(max_x) and max_x > min_x):
+            return np.empty(0), np.empty(0)
+        spacing_exp = math.floor(math.log2((max_x - min_x) / max(n_points, 1)))
+        spacing = 2.0 ** spacing_exp
+        width = spacing * self.tile_points
+        first, last = math.floor(min_x / width), math.floor(max_x / width)
+
+        keys = [(spacing_exp, index) for index in range(first, last + 1)]
+        missing = [key for key in keys if key not in self._tiles]
+        self.hits += len(keys) - len(missing)
+        self.misses += len(missing)
+        if missing:
+            # Evaluate all missing tiles in a single vectorized call
+            offsets = np.arange(self.tile_points) * spacing
+            x = np.concatenate([index * width + offsets for _, index in missing])
+            y = np.asarray(self.evaluate(x), dtype=float)
+            for i, key in enumerate(missing):
+                tile = slice(i * self.tile_points, (i + 1) * self.tile_points)
+                self._tiles[key] = (x[tile], y[tile])
+
+        for key in keys:
+            self._tiles.move_to_end(key)
+        x = np.concatenate([self._tiles[key][0] for key in keys])
+        y = np.concatenate([self._tiles[key][1] for key in keys])
+        while len(self._tiles) > self.maxsize:
+            self._tiles.popitem(last=False)
+
+        # Keep one sample beyond each edge so the line reaches the border of the view
+        start = max(np.searchsorted(x, min_x, side="right") - 1, 0)
+        stop = np.searchsorted(x, max_x, side="left") + 1
+        return x[start:stop], y[start:stop]
+
+    def stats(self):
+        """Return the tile hit and miss counters along with the current size."""
+        return {"hits": self.hits, "misses": self.misses, "size": len(self._tiles), "maxsize": self.maxsize}